@@ -1,25 +1,106 @@
 import gradio as gr
 import asyncio
+import os
+import time
 from agents import Runner
-from error_handling import robust_agent_execution
+from error_handling import robust_agent_execution, stream_agent_execution
 from vehicle_agents import vehicle_recommendation_agent
 from inventory_cache import inventory_cache
+from inventory_shards import inventory_shards
+from inventory_sqlite import inventory_sqlite
+from quick_answers import quick_answers
+from response_cache import ResponseCache
+from tools import inventory_version
 
-# Ensure inventory is loaded at startup
+# The in-memory inventory serves the tools unless SQLite or the shards are selected
+IN_MEMORY_BACKEND = inventory_sqlite is None and inventory_shards is None
+
+# Agent answers to fresh questions, reused for repeated and near-identical ones until the inventory the
+# tools read changes; without the in-memory index, similar questions must use the same words to match
+_response_cache_size = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+response_cache = ResponseCache(
+    version=inventory_version,
+    index=inventory_cache.get_index if IN_MEMORY_BACKEND else None,
+    maxsize=_response_cache_size,
+    threshold=float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.9')),
+) if _response_cache_size > 0 else None
+
+# Stream agent tokens and tool status into the chat; STREAM_RESPONSES=0 waits for the full answer instead
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', '1') != '0'
+
+# Ensure the inventory of the selected backend is loaded at startup
 def ensure_inventory():
-    cached_df = inventory_cache.get_inventory()
-    return f"<span style='color:#ff9800;font-weight:bold'>Inventory loaded: {len(cached_df)} vehicles available.</span>"
+    if inventory_sqlite is not None:
+        inventory_sqlite.get_version()
+        count = inventory_sqlite.stats["rows"]
+    elif inventory_shards is not None:
+        inventory_shards.get_version()
+        count = sum(inventory_shards.stats["rows_per_shard"])
+    else:
+        count = len(inventory_cache.get_inventory())
+    return f"<span style='color:#ff9800;font-weight:bold'>Inventory loaded: {count} vehicles available.</span>"
+
+def _format_history(history):
+    formatted_history = []
+    for user_msg, agent_msg in history or []:
+        formatted_history.append({"role": "user", "content": user_msg})
+        formatted_history.append({"role": "assistant", "content": agent_msg})
+    return formatted_history or None
+
+def _local_answer(user_input, history=None):
+    # Count, list, availability and color questions are answered locally when the parser is confident
+    answer = quick_answers.answer(user_input)
+    if answer is not None:
+        return answer
+    # Follow-ups depend on the conversation, so only questions without history use the response cache
+    if response_cache is not None and not history:
+        found, response = response_cache.get(user_input)
+        if found:
+            return response
+    return None
 
 async def agent_response_async(user_input, history=None):
-    if history is not None and len(history) > 0:
-        formatted_history = []
-        for user_msg, agent_msg in history:
-            formatted_history.append({"role": "user", "content": user_msg})
-            formatted_history.append({"role": "assistant", "content": agent_msg})
-        result = await robust_agent_execution(vehicle_recommendation_agent, user_input, history=formatted_history)
-    else:
-        result = await robust_agent_execution(vehicle_recommendation_agent, user_input)    
-    return result if isinstance(result, str) else result.final_output
+    answer = _local_answer(user_input, history)
+    if answer is not None:
+        return answer
+
+    start = time.perf_counter()
+    result = await robust_agent_execution(vehicle_recommendation_agent, user_input, history=_format_history(history))
+    if isinstance(result, str):
+        # Fallback text after failed attempts: never cached
+        return result
+    if response_cache is not None and not history:
+        response_cache.put(user_input, result.final_output, seconds=time.perf_counter() - start)
+    return result.final_output
+
+async def agent_response_stream(user_input, history=None):
+    """ Yields (status, text so far) while the agent works; the last text is the validated answer """
+    answer = _local_answer(user_input, history)
+    if answer is not None:
+        yield "", answer
+        return
+
+    start = time.perf_counter()
+    status, text = "Thinking...", ""
+    async for kind, value in stream_agent_execution(vehicle_recommendation_agent, user_input,
+                                                    history=_format_history(history)):
+        if kind == "status":
+            status = value
+        elif kind == "text":
+            text = value
+        elif kind == "reset":
+            # Preamble before a tool call, or output of a failed attempt, is withdrawn
+            text = ""
+        elif kind == "final":
+            if response_cache is not None and not history:
+                response_cache.put(user_input, value, seconds=time.perf_counter() - start)
+            yield "", value
+            return
+        elif kind == "fallback":
+            # Fallback text after failed attempts: never cached
+            yield "", value
+            return
+        yield status, text
 
 def agent_response(user_input, history=None):
     return asyncio.run(agent_response_async(user_input, history))
@@ -90,11 +171,30 @@ with gr.Blocks(theme=gr.themes.Base(), css="""
         history.append((user_message, response))
         return history, "", loading, error
 
+    async def respond_stream(history, user_message):
+        if not user_message.strip():
+            yield history, "", "", ""
+            return
+        history = history or []
+        history.append((user_message, ""))
+        loading = "<span style='color:#ff9800;'>Thinking...</span>"
+        yield history, "", loading, ""
+        try:
+            async for status_text, partial in agent_response_stream(user_message, history[:-1]):
+                # Until the first token arrives the bubble shows which agent or tool is running
+                history[-1] = (user_message, partial or (f"*{status_text}*" if status_text else ""))
+                loading = f"<span style='color:#ff9800;'>{status_text}</span>" if status_text else ""
+                yield history, "", loading, ""
+        except Exception as e:
+            history[-1] = (user_message, "Sorry, something went wrong.")
+            yield history, "", "", f"Error: {str(e)}"
+
     def clear_chat():
         return [], "", "", ""
 
-    send_btn.click(respond, inputs=[chatbot, user_input], outputs=[chatbot, user_input, loading_box, error_box])
-    user_input.submit(respond, inputs=[chatbot, user_input], outputs=[chatbot, user_input, loading_box, error_box])
+    handler = respond_stream if STREAM_RESPONSES else respond
+    send_btn.click(handler, inputs=[chatbot, user_input], outputs=[chatbot, user_input, loading_box, error_box])
+    user_input.submit(handler, inputs=[chatbot, user_input], outputs=[chatbot, user_input, loading_box, error_box])
     clear_btn.click(clear_chat, outputs=[chatbot, user_input, loading_box, error_box])
 
     gr.Markdown("""
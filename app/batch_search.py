@@ -0,0 +1,147 @@
+"""
+Batch search: evaluate many constraint sets against the inventory in one pass
+
+Each constraint set is a dict with any of:
+    min_budget, max_budget, vehicle_types, fuel_types, features, match ("any"/"all")
+and selects in-stock vehicles the same way the corresponding search tools do.
+Type and fuel constraints of all queries are evaluated together as one
+(queries x vehicle groups) matrix and budgets as vectorized binary searches,
+so per-query work is limited to gathering the matching row ranges.
+
+Run a file of constraint sets (JSON list) from the repository root:
+    uv run app/batch_search.py queries.json --output results.json
+"""
+import argparse
+import json
+import time
+import numpy as np
+from inventory_cache import inventory_cache
+from inventory_index import bits_at
+from result_cache import normalize_argument
+
+# Budgets are clamped to the int32 price column; the offset makes prices non-negative for key packing
+PRICE_MIN, PRICE_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+PRICE_OFFSET = -PRICE_MIN
+
+
+def batch_search(constraint_sets, index=None):
+    """
+    Matching vehicle ids for every constraint set, plus throughput
+
+    Returns {"results": [[id, ...], ...], "queries", "unique_queries",
+    "seconds", "queries_per_second"}; results are in input order and ids
+    in row order.
+    """
+    start = time.perf_counter()
+    if index is None:
+        index = inventory_cache.get_index()
+
+    # Identical constraint sets (after normalization) are evaluated once
+    keys = [normalize_argument(c) for c in constraint_sets]
+    unique = {}
+    for key, constraints in zip(keys, constraint_sets):
+        unique.setdefault(key, constraints)
+    queries = list(unique.values())
+
+    matches = _evaluate(index, queries) if len(index.in_stock_positions) else [np.array([], dtype=np.int64)] * len(queries)
+    ids = index.inventory.strings['id']
+    by_key = {key: ids.values(rows) for key, rows in zip(unique, matches)}
+
+    seconds = time.perf_counter() - start
+    qps = len(constraint_sets) / seconds if seconds > 0 else float('inf')
+    print(f"Batch search: {len(constraint_sets)} queries ({len(queries)} unique) "
+          f"in {seconds:.3f}s ({qps:,.0f} queries/s)")
+    return {
+        "results": [by_key[key] for key in keys],
+        "queries": len(constraint_sets),
+        "unique_queries": len(queries),
+        "seconds": seconds,
+        "queries_per_second": qps,
+    }
+
+
+def _evaluate(index, queries):
+    """
+    Row positions matching each query
+
+    In-stock rows are grouped by their (type, category, fuel_type) combination
+    and sorted by (group, price). The type/fuel constraints of all queries
+    become one (queries x groups) acceptance matrix, and the budget range of
+    every accepted (query, group) pair is two vectorized binary searches.
+    """
+    positions = index.in_stock_positions
+    in_stock = index.in_stock
+    wanted_types = [q.get('vehicle_types') for q in queries]
+    type_ok, type_codes = _category_tables(in_stock['type'], wanted_types)
+    category_ok, category_codes = _category_tables(in_stock['category'], wanted_types)
+    fuel_ok, fuel_codes = _category_tables(in_stock['fuel_type'], [q.get('fuel_types') for q in queries])
+
+    combos, groups = np.unique(np.column_stack([type_codes, category_codes, fuel_codes]),
+                               axis=0, return_inverse=True)
+    accepted = (type_ok[:, combos[:, 0]] | category_ok[:, combos[:, 1]]) & fuel_ok[:, combos[:, 2]]
+
+    # Sort key (group, price) packed into one int64: group in the high bits, offset price in the low bits
+    prices = in_stock['price'].to_numpy().astype(np.int64) + PRICE_OFFSET
+    keys = (groups.reshape(-1).astype(np.int64) << 32) | prices
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    sorted_positions = positions[order]
+
+    lows = np.array([q.get('min_budget') or 0 for q in queries], dtype=np.int64)
+    highs = np.array([PRICE_MAX if q.get('max_budget') is None else q['max_budget'] for q in queries],
+                     dtype=np.int64)
+    lows = np.clip(lows, PRICE_MIN, PRICE_MAX) + PRICE_OFFSET
+    highs = np.clip(highs, PRICE_MIN, PRICE_MAX) + PRICE_OFFSET
+    query_ids, group_ids = np.nonzero(accepted)
+    starts = np.searchsorted(keys, (group_ids.astype(np.int64) << 32) | lows[query_ids], side='left')
+    ends = np.searchsorted(keys, (group_ids.astype(np.int64) << 32) | highs[query_ids], side='right')
+    # Pairs come out grouped by query; bounds[q]:bounds[q + 1] are the pairs of query q
+    bounds = np.searchsorted(query_ids, np.arange(len(queries) + 1))
+
+    # Feature bitmaps are built once per distinct (features, mode) pair
+    feature_bits = {}
+    results = []
+    for q, constraints in enumerate(queries):
+        slices = [sorted_positions[starts[p]:ends[p]] for p in range(bounds[q], bounds[q + 1])]
+        rows = np.sort(np.concatenate(slices)) if slices else positions[:0]
+        if constraints.get('features') and len(rows):
+            key = (normalize_argument(constraints['features']), (constraints.get('match') or 'any').lower())
+            if key not in feature_bits:
+                feature_bits[key] = index.feature_index.match(constraints['features'], mode=key[1])
+            rows = rows[bits_at(feature_bits[key], rows)]
+        results.append(rows)
+    return results
+
+
+def _category_tables(series, wanted_lists):
+    """
+    (queries x categories) table of accepted categories, plus the row codes
+
+    The table has a trailing False column so missing values (code -1) never
+    match a constrained query; unconstrained queries accept every column.
+    """
+    categories = series.cat.categories.str.lower()
+    table = np.ones((len(wanted_lists), len(categories) + 1), dtype=bool)
+    for i, wanted in enumerate(wanted_lists):
+        if wanted:
+            table[i, :-1] = categories.isin({str(v).lower() for v in wanted})
+            table[i, -1] = False
+    return table, series.cat.codes.to_numpy().astype(np.intp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSON list of constraint sets against the inventory")
+    parser.add_argument("queries_path")
+    parser.add_argument("--output", help="Write {results, queries_per_second, ...} as JSON")
+    args = parser.parse_args()
+
+    with open(args.queries_path, 'r') as f:
+        constraint_sets = json.load(f)
+    report = batch_search(constraint_sets)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f)
+
+
+if __name__ == "__main__":
+    main()
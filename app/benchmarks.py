@@ -0,0 +1,510 @@
+"""
+Inventory performance benchmarks
+
+Run from the repository root, e.g.:
+    uv run app/benchmarks.py compact --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from batch_search import batch_search
+from inventory_cache import InventoryCache
+from inventory_index import InventoryIndex, PriceIndex
+import inventory_search
+from inventory_shards import ShardedInventory
+from inventory_schema import build_inventory, categorical_isin
+from inventory_sqlite import SqliteInventory
+from inventory_store import convert, load_snapshot, snapshot_path_for, write_snapshot
+from difflib import get_close_matches
+from text_match import AhoCorasick, TrigramIndex
+from text_search import BM25Index, tokenize
+from inventory_stream import load_inventory_streaming
+from ranking import Ranker
+
+
+def scale_inventory(rows, path='app/data/synthetic_inventory.json', seed=7):
+    """ Synthetic inventory of `rows` vehicles, cycling the sample records with jittered values """
+    with open(path, 'r') as f:
+        base = json.load(f)
+
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        record = dict(base[i % len(base)])
+        record["id"] = f"V{i:08d}"
+        record["price"] = max(5000, record["price"] + rng.randint(-5000, 5000))
+        record["stock_count"] = rng.randint(0, 20)
+        record["availability"] = "in_stock" if rng.random() < 0.8 else "sold_out"
+        records.append(record)
+    return records
+
+
+def timed(fn, repeat=5):
+    """ Best wall time of `repeat` runs, in seconds """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_compact(rows):
+    """ Memory per vehicle and filter latency: plain DataFrame vs compact typed inventory """
+    records = scale_inventory(rows)
+
+    start = time.perf_counter()
+    naive = pd.DataFrame(records)
+    naive_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compact = build_inventory(records)
+    compact_build = time.perf_counter() - start
+
+    # deep=True counts list objects but not the strings inside them, so this is a lower bound
+    naive_bytes = naive.memory_usage(deep=True, index=False).sum()
+    report = compact.memory_report()
+
+    types = ['suv', 'luxury', 'sedan']
+    naive_filter = timed(lambda: naive['type'].str.lower().isin(types))
+    compact_filter = timed(lambda: categorical_isin(compact.frame['type'], types))
+
+    print(f"Rows: {rows:,}")
+    print(f"Build time:        naive {naive_build:.3f}s | compact {compact_build:.3f}s")
+    print(f"Bytes per vehicle: naive >= {naive_bytes / rows:,.0f} | compact {report['bytes_per_vehicle']:,.0f}")
+    print(f"Type filter:       naive {naive_filter * 1000:.2f}ms | compact {compact_filter * 1000:.2f}ms")
+    for name, nbytes in sorted(report["columns"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<18} {nbytes / rows:8.1f} B/vehicle")
+
+
+def benchmark_snapshot(sizes):
+    """
+    Time until the first query can run, JSON feed vs memory-mapped snapshot, as the inventory grows
+
+    Both paths go through InventoryCache.get_index, so the totals include
+    the index build; the snapshot path is also split into load and build.
+    """
+    work_dir = tempfile.mkdtemp(prefix="inventory-bench-")
+    try:
+        for rows in sizes:
+            json_path = os.path.join(work_dir, f"inventory_{rows}.json")
+            with open(json_path, 'w') as f:
+                json.dump(scale_inventory(rows), f)
+            snapshot_dir = convert(json_path)
+
+            json_total = timed(lambda: InventoryCache(json_path, use_snapshot=False).get_index(), repeat=1)
+            snapshot_load = timed(lambda: load_snapshot(snapshot_dir), repeat=3)
+            index_build = timed(lambda: InventoryIndex(load_snapshot(snapshot_dir)), repeat=1) - snapshot_load
+            snapshot_total = timed(lambda: InventoryCache(json_path).get_index(), repeat=1)
+            print(f"Rows {rows:>10,}: json + index {json_total:8.3f}s | snapshot + index {snapshot_total:8.3f}s "
+                  f"(load {snapshot_load:.3f}s, index build {index_build:.3f}s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def traced(fn):
+    """ Wall time and peak traced allocation (bytes) of a single call """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def benchmark_stream(rows, chunk_size):
+    """ Peak memory of json.load + build vs chunked streaming, for a JSON array and JSON Lines """
+    work_dir = tempfile.mkdtemp(prefix="inventory-bench-")
+    try:
+        records = scale_inventory(rows)
+        array_path = os.path.join(work_dir, "inventory.json")
+        lines_path = os.path.join(work_dir, "inventory.jsonl")
+        with open(array_path, 'w') as f:
+            json.dump(records, f)
+        with open(lines_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        del records
+
+        def load_whole():
+            with open(array_path, 'r') as f:
+                build_inventory(json.load(f))
+
+        runs = [
+            ("json.load (array)", load_whole),
+            ("stream (array)", lambda: load_inventory_streaming(array_path, chunk_size=chunk_size)),
+            ("stream (jsonl)", lambda: load_inventory_streaming(lines_path, chunk_size=chunk_size)),
+        ]
+        print(f"Rows: {rows:,}, file size {os.path.getsize(array_path) / 1e6:,.1f} MB, chunk size {chunk_size:,}")
+        for label, fn in runs:
+            elapsed, peak = traced(fn)
+            print(f"  {label:<18} {elapsed:7.2f}s  {rows / elapsed:10,.0f} rows/s  peak {peak / 1e6:8.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_price(rows, queries):
+    """ Budget range queries: boolean masks over every row vs the sorted price index """
+    rng = np.random.default_rng(7)
+    prices = rng.integers(10_000, 120_000, size=rows, dtype=np.int32)
+    in_stock = rng.random(rows) < 0.8
+    lows = rng.integers(10_000, 100_000, size=queries)
+    highs = lows + rng.integers(1_000, 20_000, size=queries)
+
+    start = time.perf_counter()
+    price_index = PriceIndex(prices[in_stock], np.flatnonzero(in_stock))
+    build = time.perf_counter() - start
+
+    def masks():
+        for lo, hi in zip(lows, highs):
+            np.flatnonzero((prices >= lo) & (prices <= hi) & in_stock)
+
+    def indexed():
+        for lo, hi in zip(lows, highs):
+            price_index.range(lo, hi)
+
+    mask_time = timed(masks, repeat=1) / queries
+    index_time = timed(indexed, repeat=1) / queries
+    print(f"Rows: {rows:,}, index build {build:.2f}s")
+    print(f"Range query: masks {mask_time * 1000:.2f}ms | price index {index_time * 1000:.2f}ms "
+          f"({mask_time / index_time:.1f}x)")
+
+
+def benchmark_matcher(models, queries):
+    """ Make/model mention detection: substring test per distinct value vs one Aho-Corasick pass """
+    rng = random.Random(7)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    values = list({''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) + f" {rng.randint(1, 999)}"
+                   for _ in range(models)})
+    texts = [f"do you have the {rng.choice(values)} in blue under $30000?" for _ in range(queries)]
+
+    start = time.perf_counter()
+    matcher = AhoCorasick(values)
+    build = time.perf_counter() - start
+
+    loop = timed(lambda: [[v for v in values if v in t] for t in texts], repeat=1) / queries
+    automaton = timed(lambda: [matcher.find(t) for t in texts], repeat=1) / queries
+    print(f"Distinct values: {len(values):,}, automaton build {build:.2f}s")
+    print(f"Per query: substring loop {loop * 1000:.3f}ms | Aho-Corasick {automaton * 1000:.3f}ms "
+          f"({loop / automaton:.0f}x)")
+
+
+def benchmark_fuzzy(values_count, queries):
+    """ Typo-tolerant lookup: similarity against every value vs trigram shortlist """
+    rng = random.Random(7)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    values = list({''.join(rng.choice(letters) for _ in range(rng.randint(5, 10))) for _ in range(values_count)})
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + rng.choice(letters) + word[i + 1:]
+    terms = [typo(rng.choice(values)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = TrigramIndex(values)
+    build = time.perf_counter() - start
+
+    scan_hits, trigram_hits = [], []
+    scan = timed(lambda: scan_hits.extend(get_close_matches(t, values, n=1, cutoff=0.8) for t in terms),
+                 repeat=1) / queries
+    trigram = timed(lambda: trigram_hits.extend(index.search(t, limit=1) for t in terms), repeat=1) / queries
+    agree = sum(bool(a) == bool(b) and (not a or a[0] == b[0][0]) for a, b in zip(scan_hits, trigram_hits))
+    print(f"Distinct values: {len(values):,}, trigram index build {build:.2f}s")
+    print(f"Per lookup: full scan {scan * 1000:.3f}ms | trigram index {trigram * 1000:.3f}ms "
+          f"({scan / trigram:.0f}x), same answer for {agree / queries:.0%} of lookups")
+
+
+def benchmark_rank(rows, k):
+    """ Profile ranking: per-row Python scoring plus a full sort vs matrix scoring plus argpartition """
+    records = scale_inventory(rows)
+    compact = build_inventory(records)
+    positions = np.flatnonzero((compact.frame['availability'] == 'in_stock').to_numpy())
+    in_stock = [records[p] for p in positions]
+
+    start = time.perf_counter()
+    ranker = Ranker(compact.frame, positions)
+    build = time.perf_counter() - start
+
+    def python_sort():
+        lo = min(r["price"] for r in in_stock)
+        hi = max(r["price"] for r in in_stock)
+        scored = [(0.8 * (1 - (r["price"] - lo) / (hi - lo)) + 0.2 * r["safety_rating"] / 5, r["id"]) for r in in_stock]
+        return sorted(scored, reverse=True)[:k]
+
+    naive = timed(python_sort, repeat=1)
+    print(f"Ranked vehicles: {len(positions):,}, signal matrix build {build:.2f}s")
+    print(f"Per query: Python score + sort {naive * 1000:.1f}ms")
+    for profile in ("budget", "family", "luxury", "eco"):
+        ranked = timed(lambda: ranker.top(profile, k=k))
+        print(f"  {profile:<7} NumPy score + top-{k} {ranked * 1000:.2f}ms ({naive / ranked:.0f}x)")
+
+
+def benchmark_batch(rows, queries):
+    """ Many constraint sets: one tool-style filter per query vs one batched evaluation """
+    index = InventoryIndex(build_inventory(scale_inventory(rows)))
+    rng = random.Random(7)
+    types = list(index.in_stock['type'].cat.categories)
+    fuels = list(index.in_stock['fuel_type'].cat.categories)
+    constraint_sets = []
+    for _ in range(queries):
+        low = rng.randrange(10_000, 60_000, 1_000)
+        constraint_sets.append({
+            "min_budget": low,
+            "max_budget": low + rng.choice([5_000, 10_000, 20_000]),
+            "vehicle_types": rng.sample(types, 2),
+            "fuel_types": rng.sample(fuels, 2),
+        })
+
+    def one_by_one():
+        ids = index.inventory.strings['id']
+        for c in constraint_sets:
+            found = index.in_stock_by_price(c["min_budget"], c["max_budget"])
+            found = found[categorical_isin(found['type'], c["vehicle_types"]) |
+                          categorical_isin(found['category'], c["vehicle_types"])]
+            found = found[categorical_isin(found['fuel_type'], c["fuel_types"])]
+            ids.values(found.index.to_numpy())
+
+    loop = timed(one_by_one, repeat=1)
+    batched = timed(lambda: batch_search(constraint_sets, index=index), repeat=1)
+    print(f"Rows: {rows:,}, queries: {queries:,}")
+    print(f"One by one {queries / loop:,.0f} queries/s | batched {queries / batched:,.0f} queries/s "
+          f"({loop / batched:.1f}x)")
+
+
+def benchmark_shards(rows, shard_counts, queries):
+    """ Scatter-gather latency from 1 to N shard processes vs one in-process index """
+    tmp_dir = tempfile.mkdtemp()
+    json_path = os.path.join(tmp_dir, 'inventory.json')  # Never written: the snapshot is the inventory
+    try:
+        inventory = build_inventory(scale_inventory(rows))
+        write_snapshot(inventory, snapshot_path_for(json_path))
+        searches = [
+            ('by_query', ("red awd suv with 7 seats",)),
+            ('by_type', (["Family SUV", "luxury"],)),
+            ('by_features', (["heated seats", "sunroof"], "all")),
+            ('by_fuel_type', (["Hybrid", "Electric"],)),
+        ]
+        columns = ['id', 'make', 'model', 'price']
+
+        index = InventoryIndex(inventory)
+        def in_process():
+            for _ in range(queries):
+                for search, args in searches:
+                    frame = getattr(inventory_search, search)(index, *args)
+                    inventory.to_records(frame.iloc[:20], columns=columns)
+        base = timed(in_process, repeat=1) / (queries * len(searches))
+        print(f"Rows: {rows:,}, CPUs: {os.cpu_count()}")
+        print(f"In-process: {base * 1000:.2f}ms per search")
+
+        for shards in shard_counts:
+            sharded = ShardedInventory(json_path, shards=shards)
+            sharded.get_version()
+            def scatter():
+                for _ in range(queries):
+                    for search, args in searches:
+                        sharded.search(search, args, columns, window=20)
+            elapsed = timed(scatter, repeat=1) / (queries * len(searches))
+            sharded.close()
+            print(f"{shards} shard(s): {elapsed * 1000:.2f}ms per search ({base / elapsed:.2f}x in-process)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_delta(rows, batches):
+    """ Per-delta cost of single-vehicle deltas, by kind, vs reloading the whole inventory """
+    tmp_dir = tempfile.mkdtemp()
+    json_path = os.path.join(tmp_dir, 'inventory.json')  # Never written: the snapshot is the inventory
+    try:
+        records = scale_inventory(rows)
+        ids = [r["id"] for r in records]
+        write_snapshot(build_inventory(records), snapshot_path_for(json_path))
+        del records
+        cache = InventoryCache(json_path)
+        reload = timed(cache._refresh_cache, repeat=1)
+
+        rng = random.Random(7)
+        kinds = {
+            "stock_count": lambda: [{"id": rng.choice(ids), "stock_count": rng.randint(0, 20)}],
+            "price": lambda: [{"id": rng.choice(ids), "price": rng.randint(10_000, 90_000)}],
+            "availability": lambda: [{"id": rng.choice(ids), "availability": rng.choice(["in_stock", "sold_out"])}],
+            "delete": lambda: {"deletes": [rng.choice(ids)]},
+        }
+        print(f"Rows: {rows:,}, full reload (snapshot load and index build) {reload:.2f}s")
+        for kind, make in kinds.items():
+            seconds = []
+            for _ in range(batches):
+                delta = make()
+                start = time.perf_counter()
+                cache.apply_delta(**delta) if isinstance(delta, dict) else cache.apply_delta(delta)
+                seconds.append(time.perf_counter() - start)
+            median, p99 = np.median(seconds), np.percentile(seconds, 99)
+            print(f"  {kind:<12} delta median {median * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms "
+                  f"({reload / median:,.0f}x faster than a reload)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_sqlite(rows, queries):
+    """ Build time, footprint and per-search latency: in-memory index vs SQLite backend """
+    tmp_dir = tempfile.mkdtemp()
+    json_path = os.path.join(tmp_dir, 'inventory.json')
+    try:
+        records = scale_inventory(rows)
+        with open(json_path, 'w') as f:
+            json.dump(records, f)
+        del records
+
+        cache = InventoryCache(json_path, use_snapshot=False)
+        memory_build = timed(cache._refresh_cache, repeat=1)
+        index = cache.get_index()
+        sqlite_inventory = SqliteInventory(json_path)
+        sqlite_build = timed(sqlite_inventory.build, repeat=1)
+        sqlite_inventory.get_version()
+
+        print(f"Rows: {rows:,}")
+        print(f"Build:     memory {memory_build:.2f}s | sqlite {sqlite_build:.2f}s")
+        print(f"Footprint: memory {index.inventory.memory_report()['total_bytes'] / 2**20:,.0f} MiB in RAM | "
+              f"sqlite {os.path.getsize(sqlite_inventory._db_path) / 2**20:,.0f} MiB on disk")
+
+        columns = ['id', 'make', 'model', 'price', 'features']
+        searches = [
+            ('by_budget', (20_000, 30_000)),
+            ('by_type', (["SUV", "luxury"],)),
+            ('by_features', (["heated seats", "sunroof"], "all")),
+            ('by_fuel_type', (["Electric"],)),
+            ('by_query', ("red awd suv with 7 seats",)),
+            ('by_query', ("tesla model 3 under $40000",)),
+            ('ranked', ('family', 40_000, 0, ["SUV"], None, 10)),
+        ]
+        for search, args in searches:
+            def in_memory():
+                for _ in range(queries):
+                    if search == 'ranked':
+                        frame, total = inventory_search.ranked(index, *args)
+                    else:
+                        frame = getattr(inventory_search, search)(index, *args)
+                    index.inventory.to_records(frame.iloc[:20], columns=columns)
+            def in_sqlite():
+                for _ in range(queries):
+                    sqlite_inventory.search(search, args, columns, 20)
+            memory = timed(in_memory, repeat=1) / queries
+            sql = timed(in_sqlite, repeat=1) / queries
+            print(f"  {search:<12} {str(args[0])[:28]:<28} memory {memory * 1000:8.2f}ms | "
+                  f"sqlite {sql * 1000:8.2f}ms ({sql / memory:.1f}x)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_text(rows, queries):
+    """ Free-text description search: per-row term counting vs the BM25 index """
+    records = scale_inventory(rows)
+    index = InventoryIndex(build_inventory(records))
+    in_stock = [records[p] for p in index.in_stock_positions]
+    text = [tokenize(' '.join([r.get('description') or '', r.get('type') or ''] + (r.get('features') or [])))
+            for r in in_stock]
+    print(f"Vehicles: {rows:,}, BM25 index: {index.text_index.doc_count:,} distinct documents, "
+          f"{len(index.text_index.postings):,} postings")
+
+    start = time.perf_counter()
+    BM25Index(index.inventory)
+    print(f"Index build {time.perf_counter() - start:.2f}s")
+
+    for query in queries:
+        terms = set(tokenize(query))
+        naive = timed(lambda: sorted(((sum(t in terms for t in doc), i) for i, doc in enumerate(text)),
+                                     reverse=True)[:10], repeat=1)
+        indexed = timed(lambda: inventory_search.by_text(index, query, k=10))
+        _, total = inventory_search.by_text(index, query, k=10)
+        print(f"  {query!r:<26} {total:>9,} matches | term scan {naive * 1000:.0f}ms | "
+              f"BM25 index {indexed * 1000:.2f}ms ({naive / indexed:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inventory performance benchmarks")
+    subcommands = parser.add_subparsers(dest="benchmark", required=True)
+
+    compact = subcommands.add_parser("compact", help="Plain DataFrame vs compact typed inventory")
+    compact.add_argument("--rows", type=int, default=1_000_000)
+
+    snapshot = subcommands.add_parser("snapshot", help="Time to first query: JSON feed vs snapshot")
+    snapshot.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+
+    stream = subcommands.add_parser("stream", help="Peak memory of whole-file vs streaming ingestion")
+    stream.add_argument("--rows", type=int, default=1_000_000)
+    stream.add_argument("--chunk-size", type=int, default=50_000)
+
+    price = subcommands.add_parser("price", help="Mask vs sorted price index for budget queries")
+    price.add_argument("--rows", type=int, default=10_000_000)
+    price.add_argument("--queries", type=int, default=50)
+
+    matcher = subcommands.add_parser("matcher", help="Substring loop vs Aho-Corasick make/model matching")
+    matcher.add_argument("--models", type=int, default=50_000)
+    matcher.add_argument("--queries", type=int, default=200)
+
+    fuzzy = subcommands.add_parser("fuzzy", help="Full similarity scan vs trigram index for typo lookups")
+    fuzzy.add_argument("--values", type=int, default=50_000)
+    fuzzy.add_argument("--queries", type=int, default=200)
+
+    rank = subcommands.add_parser("rank", help="Python sort vs vectorized top-k profile ranking")
+    rank.add_argument("--rows", type=int, default=1_000_000)
+    rank.add_argument("--k", type=int, default=10)
+
+    batch = subcommands.add_parser("batch", help="Per-query filtering vs batched constraint evaluation")
+    batch.add_argument("--rows", type=int, default=100_000)
+    batch.add_argument("--queries", type=int, default=2_000)
+
+    shards = subcommands.add_parser("shards", help="Scatter-gather scaling across shard processes")
+    shards.add_argument("--rows", type=int, default=2_000_000)
+    shards.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    shards.add_argument("--queries", type=int, default=10)
+
+    delta = subcommands.add_parser("delta", help="Per-delta latency (median/p99) of in-place patches vs a snapshot reload")
+    delta.add_argument("--rows", type=int, default=1_000_000)
+    delta.add_argument("--batches", type=int, default=200)
+
+    sqlite = subcommands.add_parser("sqlite", help="In-memory index vs SQLite backend")
+    sqlite.add_argument("--rows", type=int, default=1_000_000)
+    sqlite.add_argument("--queries", type=int, default=5)
+
+    text = subcommands.add_parser("text", help="Per-row term scan vs BM25 index for description search")
+    text.add_argument("--rows", type=int, default=1_000_000)
+    text.add_argument("--queries", nargs="+",
+                      default=["rugged off-road", "executive commuter", "spacious family hauler", "germn engineering"])
+
+    args = parser.parse_args()
+    if args.benchmark == "compact":
+        benchmark_compact(args.rows)
+    elif args.benchmark == "snapshot":
+        benchmark_snapshot(args.sizes)
+    elif args.benchmark == "stream":
+        benchmark_stream(args.rows, args.chunk_size)
+    elif args.benchmark == "price":
+        benchmark_price(args.rows, args.queries)
+    elif args.benchmark == "matcher":
+        benchmark_matcher(args.models, args.queries)
+    elif args.benchmark == "fuzzy":
+        benchmark_fuzzy(args.values, args.queries)
+    elif args.benchmark == "rank":
+        benchmark_rank(args.rows, args.k)
+    elif args.benchmark == "batch":
+        benchmark_batch(args.rows, args.queries)
+    elif args.benchmark == "shards":
+        benchmark_shards(args.rows, args.shards, args.queries)
+    elif args.benchmark == "delta":
+        benchmark_delta(args.rows, args.batches)
+    elif args.benchmark == "sqlite":
+        benchmark_sqlite(args.rows, args.queries)
+    elif args.benchmark == "text":
+        benchmark_text(args.rows, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 from agents import Runner
 import asyncio
+import os
+import random
+import threading
+import time
 
 class AgentSystemError(Exception):
     """ Custom exception class for agent system errors """
@@ -9,58 +13,363 @@ class AgentSystemError(Exception):
         self.context = context
         super().__init__(self.message)
 
-async def robust_agent_execution(agent, query, max_retries=3, history=None):
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every session calling the model endpoint
+
+    Features:
+    - Opens after `failure_threshold` consecutive failures (timeouts, errors)
+    - While open, calls are rejected at once instead of waiting on a failing endpoint
+    - After `reset_timeout` seconds, half-open: a few probe calls decide whether to close again
+    - Thread-safe (Gradio handlers run on several threads, each with its own event loop)
+    - State and counters exposed as metrics
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._state = self.CLOSED
+        self._failures = 0          # Consecutive failures while closed
+        self._opened_at = None      # When the breaker last opened or started probing
+        self._probes = 0            # Probe calls in flight while half-open
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        """ Whether a call may go ahead now; a True in half-open state makes the caller a probe """
+        with self._lock:
+            # Also restart probing when earlier probes never reported back (e.g. the request was cancelled)
+            if self._state != self.CLOSED and time.monotonic() - self._opened_at >= self.reset_timeout:
+                if self._state == self.OPEN:
+                    print("Circuit breaker: half-open, probing the endpoint")
+                self._state, self._probes, self._opened_at = self.HALF_OPEN, 0, time.monotonic()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            if self._state != self.CLOSED:
+                self._state = self.CLOSED
+                print("Circuit breaker: closed, endpoint recovered")
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and
+                                                 self._failures >= self.failure_threshold):
+                self._state, self._opened_at = self.OPEN, time.monotonic()
+                self._counters["opened"] += 1
+                print(f"Circuit breaker: open for {self.reset_timeout:g}s after {self._failures} consecutive failures")
+
+    def retry_after(self):
+        """ Seconds until the breaker lets a probe through (0 unless open) """
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def metrics(self):
+        """ State, consecutive failures and counters """
+        retry_after = self.retry_after()
+        with self._lock:
+            metrics = dict(self._counters)
+            metrics["state"] = self._state
+            metrics["consecutive_failures"] = self._failures
+        metrics["retry_after_seconds"] = round(retry_after, 1)
+        return metrics
+
+
+class RetryBudget:
+    """
+    Global token bucket limiting retries to a share of all requests
+
+    Every first attempt deposits `ratio` tokens and every retry spends one,
+    so retries stay around `ratio` of traffic however many sessions hit a
+    failing endpoint. A slow refill keeps a few retries available when
+    traffic is low.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0, refill_per_second=0.1):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.refill_per_second = refill_per_second
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "retries_denied": 0}
+
+    def record_request(self):
+        with self._lock:
+            self._refill()
+            self._counters["requests"] += 1
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def try_spend(self):
+        """ Take one retry from the budget; False when it is exhausted """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1.0:
+                self._counters["retries_denied"] += 1
+                return False
+            self._tokens -= 1.0
+            self._counters["retries"] += 1
+            return True
+
+    def _refill(self):
+        # Called with the lock held
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self.refill_per_second, self.max_tokens)
+        self._updated = now
+
+    def metrics(self):
+        with self._lock:
+            self._refill()
+            metrics = dict(self._counters)
+            metrics["tokens"] = round(self._tokens, 2)
+        return metrics
+
+
+def backoff_delay(attempt, base=1.0, cap=8.0):
+    """ Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)] """
+    return random.uniform(0.0, min(cap, base * 2 ** attempt))
+
+
+# Shared by every session: one breaker and one retry budget per model endpoint
+agent_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('BREAKER_RESET_SECONDS', '30')),
+)
+agent_retry_budget = RetryBudget(ratio=float(os.getenv('RETRY_BUDGET_RATIO', '0.2')))
+
+
+def resilience_metrics():
+    """ Circuit breaker and retry budget metrics, for monitoring """
+    return {"breaker": agent_breaker.metrics(), "retry_budget": agent_retry_budget.metrics()}
+
+
+def agent_prompt(query, history=None):
+    """ Agent input: the user's query with the conversation history """
+    return f"""User's query: {query.strip()}\n
+            User's history: {history}
+            """
+
+
+async def robust_agent_execution(agent, query, max_retries=3, history=None, timeout=30.0,
+                                 breaker=None, retry_budget=None):
     """
     Robust agent execution with comprehensive error handling
 
     Error Recovery Strategies:
-    - Automatic retry with exponential backoff
+    - Shared circuit breaker: immediate degraded response while the endpoint is failing
+    - Retries limited by a global retry budget, with jittered exponential backoff
     - Graceful degradation to fallback responses
     - Detailed error logging and reporting
     - Context preservation for debugging
     """
+    breaker = breaker or agent_breaker
+    retry_budget = retry_budget or agent_retry_budget
+
+    # Built once: retries send the same prompt instead of wrapping it again
+    prompt = agent_prompt(query, history)
+    retry_budget.record_request()
+    last_error = "no attempt made"
 
     for attempt in range(max_retries):
+        if attempt > 0:
+            if not retry_budget.try_spend():
+                print(f"Retry budget exhausted; giving up after {attempt} attempt(s)")
+                break
+            await asyncio.sleep(backoff_delay(attempt - 1))
+        if not breaker.allow():
+            print(f"Circuit open; degraded response (retry in {breaker.retry_after():.0f}s)")
+            return generate_fallback_response(
+                query, f"The assistant service is temporarily unavailable; please try again in "
+                       f"{max(breaker.retry_after(), 1):.0f} seconds.")
+
         try:
             # Execute agent with timeout protection
-            query = f"""User's query: {query.strip()}\n
-            User's history: {history}
-            """
-            result = await asyncio.wait_for(
-                Runner.run(agent, query),
-                timeout=30.0  # 30-second timeout
-            )
+            result = await asyncio.wait_for(Runner.run(agent, prompt), timeout=timeout)
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            last_error = f"timed out after {timeout:.0f}s"
+            print(f"Timeout on attempt {attempt + 1}/{max_retries}")
+            continue
+        except Exception as e:
+            breaker.record_failure()
+            last_error = str(e)
+            error_details = {
+                "attempt": attempt + 1,
+                "agent": agent.name,
+                "query": query[:100],  # Truncated for logging
+                "error": str(e)
+            }
+            print(f"Execution error: {error_details}")
+            continue
+
+        # The endpoint answered; a weak answer is retried but does not count against the breaker
+        breaker.record_success()
+        if validate_response_quality(result):
+            return result
+        last_error = AgentSystemError(
+            "Response quality validation failed",
+            error_type="QUALITY_ERROR",
+            context={"attempt": attempt + 1, "agent": agent.name}
+        ).message
+        print(f"{last_error} on attempt {attempt + 1}/{max_retries}")
+
+    # Every attempt failed (or the retry budget ran out): return fallback response
+    return generate_fallback_response(query, last_error)
 
-            # Validate response quality
-            if validate_response_quality(result):
-                return result
-            else:
-                raise AgentSystemError(
-                    "Response quality validation failed",
-                    error_type="QUALITY_ERROR",
-                    context={"attempt": attempt + 1, "agent": agent.name}
-                )
 
+async def stream_agent_execution(agent, query, max_retries=3, history=None, timeout=30.0,
+                                 breaker=None, retry_budget=None):
+    """
+    Streaming counterpart of robust_agent_execution
+
+    Async generator of (kind, value) events:
+    - ("status", text): the agent or tool currently running
+    - ("text", text): the answer so far, growing with every model token
+    - ("reset", ""): an attempt failed after text was shown; the next one starts over
+    - ("final", text): the complete answer, after validate_response_quality
+    - ("fallback", text): degraded or fallback response; nothing better is coming
+
+    Same breaker, retry budget, backoff and timeout rules as
+    robust_agent_execution; `timeout` bounds each whole attempt.
+    """
+    breaker = breaker or agent_breaker
+    retry_budget = retry_budget or agent_retry_budget
+    prompt = agent_prompt(query, history)
+    retry_budget.record_request()
+    last_error = "no attempt made"
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first_token = None
+
+    for attempt in range(max_retries):
+        if attempt > 0:
+            if not retry_budget.try_spend():
+                print(f"Retry budget exhausted; giving up after {attempt} attempt(s)")
+                break
+            await asyncio.sleep(backoff_delay(attempt - 1))
+        if not breaker.allow():
+            print(f"Circuit open; degraded response (retry in {breaker.retry_after():.0f}s)")
+            yield "fallback", generate_fallback_response(
+                query, f"The assistant service is temporarily unavailable; please try again in "
+                       f"{max(breaker.retry_after(), 1):.0f} seconds.")
+            return
+
+        result = Runner.run_streamed(agent, prompt)
+        events = result.stream_events().__aiter__()
+        deadline = loop.time() + timeout
+        text = ""
+        try:
+            while True:
+                # The deadline is enforced per event, so it never fires while the consumer holds a yield
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if event.type == "raw_response_event" and \
+                        getattr(event.data, "type", None) == "response.output_text.delta":
+                    if first_token is None:
+                        first_token = loop.time() - start
+                        print(f"Streaming: first token after {first_token:.2f}s")
+                    text += event.data.delta
+                    yield "text", text
+                elif event.type == "agent_updated_stream_event":
+                    yield "status", f"{event.new_agent.name} is working on it..."
+                elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                    # Text before a tool call is a preamble; the answer comes after the tool results
+                    if text:
+                        text = ""
+                        yield "reset", ""
+                    yield "status", f"Running {getattr(event.item.raw_item, 'name', 'a tool')}..."
+                elif event.type == "run_item_stream_event" and event.name == "tool_output":
+                    yield "status", "Writing the answer..."
         except asyncio.TimeoutError:
+            breaker.record_failure()
+            last_error = f"timed out after {timeout:.0f}s"
             print(f"Timeout on attempt {attempt + 1}/{max_retries}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
-
         except Exception as e:
+            breaker.record_failure()
+            last_error = str(e)
             error_details = {
                 "attempt": attempt + 1,
                 "agent": agent.name,
                 "query": query[:100],  # Truncated for logging
                 "error": str(e)
             }
+            print(f"Execution error: {error_details}")
+        else:
+            # The endpoint answered; a weak answer is retried but does not count against the breaker
+            breaker.record_success()
+            if validate_response_quality(result):
+                yield "final", result.final_output
+                return
+            last_error = "Response quality validation failed"
+            print(f"{last_error} on attempt {attempt + 1}/{max_retries}")
+        finally:
+            if not result.is_complete:
+                result.cancel()
+        if text:
+            yield "reset", ""
+
+    # Every attempt failed (or the retry budget ran out): return fallback response
+    yield "fallback", generate_fallback_response(query, last_error)
+
+
+async def fan_out(calls, min_complete=None, timeout=None, deadline=None):
+    """
+    Run named coroutines concurrently under deadlines
+
+    Returns as soon as `min_complete` calls have succeeded (all of them by
+    default), every call has finished, or the overall `deadline` (seconds)
+    has passed; calls still running then are cancelled. Each call also has
+    its own `timeout`, and one call failing never fails the others.
+
+    Returns {name: {"status": "ok" | "error" | "timeout" | "cancelled",
+    "result" (ok) or "error" (error), "seconds"}} in the order of `calls`.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    min_complete = len(calls) if min_complete is None else min(min_complete, len(calls))
+    outcomes = {}
+
+    async def run(name, coroutine):
+        try:
+            result = await (asyncio.wait_for(coroutine, timeout) if timeout else coroutine)
+            outcomes[name] = {"status": "ok", "result": result}
+        except asyncio.TimeoutError:
+            outcomes[name] = {"status": "timeout"}
+        except Exception as e:
+            outcomes[name] = {"status": "error", "error": str(e)}
+        outcomes[name]["seconds"] = loop.time() - start
 
-            print(f"Execution error: {e}")
+    pending = {asyncio.ensure_future(run(name, coroutine)) for name, coroutine in calls.items()}
+    while pending and sum(o["status"] == "ok" for o in outcomes.values()) < min_complete:
+        remaining = None if deadline is None else deadline - (loop.time() - start)
+        if remaining is not None and remaining <= 0:
+            break
+        _, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
 
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)
-            else:
-                # Final attempt failed - return fallback response
-                return generate_fallback_response(query , str(e))
+    # Stragglers: cancel and wait for them to unwind, so nothing keeps running after we return
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for name in calls:
+        outcomes.setdefault(name, {"status": "cancelled", "seconds": loop.time() - start})
+    return {name: outcomes[name] for name in calls}
 
 def validate_response_quality(result):
     """
@@ -1,65 +1,464 @@
+import hashlib
 import json
+import os
+import threading
 import time
-import pandas as pd
+from inventory_index import InventoryIndex
+import numpy as np
+from inventory_schema import build_inventory, concat_inventories
+from inventory_store import load_snapshot, read_manifest, snapshot_path_for
+from inventory_stream import load_inventory_streaming
 from vehicle_inventory import generate_synthetic_inventory
 
+# Longest wait before retrying a refresh that keeps failing (seconds)
+MAX_REFRESH_BACKOFF = 300.0
+
 class InventoryCache:
     """
     Sophisticated caching system for inventory data management
 
     Features:
     - Lazy loading with automatic refresh
-    - Memory -efficient data storage
-    - Cache invalidation strategies
+    - Single-flight refresh; readers keep the previous inventory meanwhile (stale-while-revalidate)
+    - Change-aware revalidation (mtime/size, then content hash)
+    - Exponential back-off after failed refreshes
+    - Optional background file watcher
+    - Atomic swap of the cached inventory
+    - Compact typed columnar storage
+    - Memory-mapped binary snapshots shared across processes
+    - Streaming ingestion of very large feeds
+    - Derived indexes (in-stock partition) rebuilt once per refresh
+    - Id-keyed deltas (upserts/deletes) applied in memory without a reload
     - Performance monitoring
     """
 
-    def __init__(self):
-        self._cache = None
+    def __init__(self, inventory_path='data/synthetic_inventory.json', refresh_mode='ttl', check_interval=1.0,
+                 use_snapshot=True, stream_threshold_bytes=64 * 1024 * 1024, stale_while_revalidate=True):
+        self._index = None  # InventoryIndex over the current CompactInventory
+        self._version = 0  # Bumped whenever a new inventory is published
         self._last_loaded = None
         self._cache_duration = 86400 # 1 day cache lifetime
 
+        # 'ttl' reloads after _cache_duration, 'revalidate' reloads when the file changes
+        self._inventory_path = inventory_path
+        self._refresh_mode = refresh_mode
+        self._check_interval = check_interval  # Minimum seconds between file checks on access
+        self._last_checked = None
+        self._file_signature = None  # (mtime_ns, size) of the loaded file
+        self._content_hash = None
+        self._failures = 0  # Consecutive failed refreshes
+        self._failed_signature = None  # (mtime_ns, size) of the file the last failed refresh read
+        self._retry_at = 0.0  # No retry of a failed refresh before this time, unless the file changes
+        self._use_snapshot = use_snapshot  # Prefer a current .snapshot directory over parsing JSON
+        self._stream_threshold_bytes = stream_threshold_bytes  # Feeds at least this large are parsed in chunks
+
+        # Only one refresh runs at a time; with stale_while_revalidate callers are served the
+        # current inventory while it runs in the background, otherwise they wait for it
+        self._stale_while_revalidate = stale_while_revalidate
+        self._refresh_lock = threading.Lock()  # Held while loading
+        self._state_lock = threading.Lock()  # Guards _refresh_done and the served_stale counter
+        self._refresh_done = None  # Event of the refresh in flight, None when idle
+        self._request_state = threading.local()
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self._delta_listeners = []
+
+        self.stats = {
+            "reloads": 0,
+            "unchanged_checks": 0,
+            "last_reload_seconds": None,
+            "last_reload_rows_per_second": None,
+            "bytes_per_vehicle": None,
+            "last_reload_source": None,
+            "served_stale": 0,
+            "deltas": 0,
+            "last_delta_seconds": None,
+        }
+
     def get_inventory(self):
         """
         Intelligent cache management with automatic refresh
         """
+        return self.get_compact_inventory().frame
+
+    def get_compact_inventory(self):
+        """ Same refresh rules as get_inventory, returning the frame together with its string and list columns """
+        return self.get_index().inventory
+
+    def get_version(self):
+        """ Version stamp of the current inventory, for caches derived from it """
+        return self.get_index().version
+
+    def get_in_stock(self):
+        """ In-stock partition of the inventory and the row positions it was taken from """
+        index = self.get_index()
+        return index.in_stock, index.in_stock_positions
+
+    def get_index(self):
+        """ Same refresh rules as get_inventory, returning the inventory with its derived indexes """
         current_time = time.time()
 
         # Check if cache needs refresh
-        if (self._cache is None or
-            self._last_loaded is None or
-            current_time - self._last_loaded > self._cache_duration):
-            self._refresh_cache ()
+        if self._index is None or self._last_loaded is None:
+            # Nothing to serve yet: every caller waits for the same first load
+            self._request_refresh(wait=True)
+        elif self._refresh_mode == 'revalidate':
+            self._revalidate(current_time)
+        elif current_time - self._last_loaded > self._cache_duration and current_time >= self._retry_at:
+            self._request_refresh()
+
+        index = self._index
+        with self._state_lock:
+            stale = self._refresh_done is not None
+            if stale:
+                self.stats["served_stale"] += 1
+        self._request_state.served_stale = stale
+        return index
+
+    def served_stale(self):
+        """ Whether this thread's last get_* call was answered while a refresh was still running """
+        return getattr(self._request_state, "served_stale", False)
+
+    def refresh_status(self):
+        """ Refresh state for monitoring: in flight or not, current version and timings """
+        return {
+            "refreshing": self._refresh_done is not None,
+            "version": self._version,
+            "last_reload_seconds": self.stats["last_reload_seconds"],
+            "served_stale": self.stats["served_stale"],
+        }
+
+    def _revalidate(self, current_time=None, force=False, wait=False):
+        """ Reload only when the inventory file has actually changed """
+        current_time = current_time or time.time()
+        if (not force and self._last_checked is not None and
+            current_time - self._last_checked < self._check_interval):
+            return
+        self._last_checked = current_time
+
+        # A refresh in flight is already picking up the change
+        if self._refresh_done is not None:
+            return
+
+        # Readers only compare stat signatures; hashing the file and loading it happen once, in the
+        # single-flight refresh. A file that failed to load is retried when it changes or after back-off.
+        signature = self._stat_signature()
+        if signature is None or signature == self._file_signature:
+            return
+        if signature == self._failed_signature and current_time < self._retry_at:
+            return
+
+        self._request_refresh(wait=wait, revalidate=True)
+
+    def _request_refresh(self, wait=False, revalidate=False):
+        """
+        Single-flight refresh
 
-        return self._cache
+        The first caller starts the refresh; later callers join it instead of
+        loading again. Without `wait` (and with stale_while_revalidate) the
+        refresh runs in a background thread and the caller returns at once.
+        With `revalidate` the refresh first checks that the file really changed.
+        """
+        with self._state_lock:
+            done = self._refresh_done
+            leader = done is None
+            if leader:
+                done = self._refresh_done = threading.Event()
+
+        if leader:
+            if self._stale_while_revalidate and not wait:
+                threading.Thread(target=self._run_refresh, args=(done, revalidate), name="inventory-refresh",
+                                 daemon=True).start()
+            else:
+                self._run_refresh(done, revalidate)
+        elif wait or not self._stale_while_revalidate:
+            done.wait()
+
+    def _run_refresh(self, done, revalidate=False):
+        try:
+            with self._refresh_lock:
+                if not revalidate or self._has_changed():
+                    self._refresh_cache()
+        finally:
+            with self._state_lock:
+                self._refresh_done = None
+            done.set()
+
+    def _stat_signature(self):
+        """ (mtime_ns, size) of the inventory file, or None when it cannot be read """
+        try:
+            stat = os.stat(self._inventory_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _has_changed(self):
+        """ Change detection, run inside the refresh: stat first, content hash only when stat differs """
+        signature = self._stat_signature()
+        if signature is None or signature == self._file_signature:
+            return False
+
+        # Same size but a new mtime (e.g. touch or identical rewrite): compare content
+        if self._file_signature is not None and signature[1] == self._file_signature[1]:
+            if _hash_file(self._inventory_path) == self._content_hash:
+                self._file_signature = signature
+                self.stats["unchanged_checks"] += 1
+                return False
+
+        return True
 
     def _refresh_cache(self):
         """ Load and cache inventory data """
         try:
-            with open('data/synthetic_inventory.json', 'r') as f:
-                inventory_data = json.load(f)
+            start = time.perf_counter()
 
-            self._cache = pd.DataFrame(inventory_data)
-            self._last_loaded = time.time()
+            # Build the new inventory and its indexes fully before swapping them in with a single assignment
+            inventory, source, loaded_from = self._load_inventory()
+            self._publish(inventory)
+            self._file_signature = (source["mtime_ns"], source["size"]) if source else None
+            self._content_hash = source["hash"] if source else None
 
-            print(f"Cache refreshed: {len(self._cache)} vehicles loaded")
+            elapsed = time.perf_counter() - start
+            self.stats["reloads"] += 1
+            self.stats["last_reload_seconds"] = elapsed
+            self.stats["last_reload_rows_per_second"] = len(inventory) / elapsed if elapsed > 0 else None
+            self.stats["bytes_per_vehicle"] = inventory.memory_report()["bytes_per_vehicle"]
+            self.stats["last_reload_source"] = loaded_from
+            self._failures, self._failed_signature, self._retry_at = 0, None, 0.0
+
+            print(f"Cache refreshed: {len(inventory)} vehicles loaded from {loaded_from} in {elapsed:.3f}s "
+                  f"({len(inventory) / max(elapsed, 1e-9):,.0f} rows/s)")
 
         except Exception as e:
-            print(f"Cache refresh failed: {e}")
-            if self._cache is None:
+            # Back off before trying the same file again: 2s, 4s, 8s, ... up to MAX_REFRESH_BACKOFF
+            self._failures += 1
+            backoff = min(max(self._check_interval, 1.0) * 2 ** min(self._failures, 16), MAX_REFRESH_BACKOFF)
+            self._failed_signature = self._stat_signature()
+            self._retry_at = time.time() + backoff
+            print(f"Cache refresh failed: {e} (next attempt in {backoff:.0f}s unless the file changes)")
+            if self._index is None:
                 # Fallback to synthetic data generation
                 self._generate_fallback_data ()
 
+    def _publish(self, inventory):
+        """ Index a freshly loaded inventory under a new version and swap it in """
+        self._version += 1
+        self._index = InventoryIndex(inventory, version=self._version)
+        self._last_loaded = time.time()
+
+    def apply_delta(self, upserts=(), deletes=()):
+        """
+        Apply a batch of upserts and deletes keyed by vehicle id
+
+        Upserts are partial records ({"id": ..., "stock_count": 3}). Changes to
+        price, stock_count and availability of known vehicles patch a copy of
+        the index (only the changed columns and derived structures are
+        replaced); deletes leave tombstones. New vehicles and changes to other
+        fields rebuild the index from memory (no file parse), which also drops
+        accumulated tombstones. Deletes are applied after upserts. The patched
+        or rebuilt index is published with one assignment under a new
+        version, so readers see the whole batch or none of it.
+
+        Deltas live in memory only: the next reload of a changed feed replaces them.
+
+        Listeners (the SQLite or sharded backend serving the searches) get
+        every batch. While such a backend is active and nothing has loaded
+        this cache, there is nothing to patch here: the batch only goes to
+        the listeners and the first listener's summary is returned.
+        """
+        start = time.perf_counter()
+        if self._index is None and self._delta_listeners:
+            summaries = [listener(upserts, deletes) for listener in self._delta_listeners]
+            return summaries[0]
+
+        self.get_index()
+        merged = merge_upserts(upserts)
+
+        # Held for the whole batch: a refresh that loaded the feed before the delta can
+        # no longer publish after it, and a delta never patches an index being replaced
+        with self._refresh_lock:
+            index, inserts, summary = patch_index(self._index, merged, deletes)
+            if summary["rebuilt"]:
+                live = index.inventory.take(np.flatnonzero(~index.deleted))
+                self._publish(concat_inventories(live, build_inventory(inserts)) if inserts else live)
+            elif merged or summary["deleted"]:
+                self._version += 1
+                index.version = self._version
+                self._index = index
+
+        # Other holders of the inventory (SQLite, shard workers) apply the same batch
+        for listener in self._delta_listeners:
+            listener(upserts, deletes)
+
+        elapsed = time.perf_counter() - start
+        self.stats["deltas"] += 1
+        self.stats["last_delta_seconds"] = elapsed
+        summary.update(version=self._version, seconds=elapsed)
+        if summary["rebuilt"]:
+            print(f"Delta applied with rebuild: {len(self._index)} vehicles in {elapsed:.3f}s")
+        return summary
+
+    def add_delta_listener(self, listener):
+        """ Call listener(upserts, deletes) on every apply_delta, e.g. to forward deltas to SQLite or the shards """
+        self._delta_listeners.append(listener)
+
+    def _load_inventory(self):
+        """ Memory-map a current snapshot when there is one, otherwise parse the JSON feed """
+        if self._use_snapshot:
+            loaded = self._load_snapshot()
+            if loaded is not None:
+                return (*loaded, "snapshot")
+
+        stat = os.stat(self._inventory_path)
+        if stat.st_size >= self._stream_threshold_bytes:
+            inventory, source = load_inventory_streaming(self._inventory_path)
+            return inventory, source, "json-stream"
+
+        with open(self._inventory_path, 'rb') as f:
+            raw = f.read()
+        inventory = build_inventory(json.loads(raw))
+        source = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hashlib.blake2b(raw, digest_size=16).hexdigest(),
+        }
+        return inventory, source, "json"
+
+    def _load_snapshot(self):
+        """ (memory-mapped inventory, source) of a snapshot that matches the JSON feed, otherwise None """
+        snapshot_dir = snapshot_path_for(self._inventory_path)
+        manifest = read_manifest(snapshot_dir)
+        if manifest is None:
+            return None
+        source = self._snapshot_source(manifest)
+        if source is None:
+            return None
+        return load_snapshot(snapshot_dir, manifest=manifest), source
+
+    def _snapshot_source(self, manifest):
+        """ Source identity of a snapshot if it matches the JSON feed, otherwise None """
+        source = manifest.get("source") or {}
+        try:
+            stat = os.stat(self._inventory_path)
+        except OSError:
+            # No JSON feed at all: the snapshot is the inventory
+            return source
+
+        if source.get("size") != stat.st_size:
+            return None
+        if source.get("mtime_ns") != stat.st_mtime_ns:
+            if _hash_file(self._inventory_path) != source.get("hash"):
+                return None
+            source = dict(source, mtime_ns=stat.st_mtime_ns)
+        return source
+
     def _generate_fallback_data(self):
         """ Emergency fallback data generation """
         inventory_data = generate_synthetic_inventory ()
-        self._cache = pd.DataFrame(inventory_data)
-        self._last_loaded = time.time()
+        self._publish(build_inventory(inventory_data))
+
+    def start_watcher(self, interval=5.0):
+        """ Revalidate the inventory file from a background thread every `interval` seconds """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher_stop.clear()
+
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    self._revalidate(force=True, wait=True)
+                except Exception as e:
+                    print(f"Inventory watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="inventory-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """ Stop the background file watcher """
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+            self._watcher = None
+
+
+def merge_upserts(upserts):
+    """ {id: record} of a batch of partial records; later upserts of the same id extend earlier ones """
+    merged = {}
+    for record in upserts:
+        merged.setdefault(record["id"], {}).update(record)
+    return merged
+
+
+def patch_index(index, merged, deletes):
+    """
+    Apply merged upserts and deletes to a patched copy of index
+
+    Returns (patched index, inserts, summary). Inserts are the full records
+    of new and rewritten vehicles; the rewritten ones are already tombstoned
+    in the copy. summary["rebuilt"] tells the caller to rebuild from the
+    live rows plus the inserts, which happens when there are inserts or
+    tombstones pile up.
+    """
+    index = index.patched()
+    positions = index.positions_of(list(merged))
+    in_place = {}   # Tuple of changed columns -> [(position, record)]
+    rewritten = []  # (position or -1, full record) of vehicles that need a rebuild
+    for position, record in zip(positions, merged.values()):
+        columns = tuple(sorted(set(record) - {"id"}))
+        if position >= 0 and set(columns) <= set(index.UPDATABLE_COLUMNS):
+            in_place.setdefault(columns, []).append((position, record))
+        elif position >= 0:
+            current = index.inventory.to_records(index.frame.iloc[[position]])[0]
+            rewritten.append((position, dict(current, **record)))
+        else:
+            rewritten.append((-1, record))
+
+    for columns, items in in_place.items():
+        if columns:
+            index.update_rows(
+                np.array([p for p, _ in items]),
+                {c: np.array([record[c] for _, record in items]) for c in columns},
+            )
+
+    deleted = index.positions_of(deletes) if len(deletes) else np.array([], dtype=np.int64)
+    deleted = deleted[deleted >= 0]
+    replaced = np.array([p for p, _ in rewritten if p >= 0], dtype=np.int64)
+    index.delete_rows(np.union1d(deleted, replaced).astype(np.int64))
+
+    deleted_ids = set(deletes)
+    inserts = [record for _, record in rewritten if record["id"] not in deleted_ids]
+    summary = {
+        "updated": sum(len(items) for items in in_place.values()),
+        "rewritten": len(rewritten),
+        "deleted": len(deleted),
+        # Rebuild for new or rewritten vehicles, or once tombstones pile up
+        "rebuilt": bool(rewritten) or index.deleted_count > len(index) // 4,
+    }
+    return index, inserts, summary
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    """ Content hash of a file, read in chunks """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 # Global cache instance
 
-inventory_cache = InventoryCache ()
+inventory_cache = InventoryCache (refresh_mode=os.getenv('INVENTORY_REFRESH_MODE', 'ttl'))
 
 # To refresh the cache and get the inventory manually
 # inventory_cache._refresh_cache()
 # print(inventory_cache.get_inventory())
+
+# To watch the inventory file for changes in the background
+# inventory_cache.start_watcher(interval=5.0)
+
+# To check whether a request was answered from the previous inventory during a refresh
+# index = inventory_cache.get_index()
+# print(inventory_cache.served_stale(), inventory_cache.refresh_status())
+
+# To apply a feed delta without reloading the whole inventory
+# inventory_cache.apply_delta(upserts=[{"id": "V001", "stock_count": 3}], deletes=["V002"])
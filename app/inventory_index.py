@@ -0,0 +1,531 @@
+import copy
+import re
+from functools import reduce
+import numpy as np
+import pandas as pd
+from inventory_schema import CompactInventory, is_missing, missing_number
+from ranking import Ranker
+from text_match import AhoCorasick, TrigramIndex, find_mentions
+from text_search import BM25Index
+
+
+def pack_rows(mask):
+    """ Packed row bitmap (one bit per row) from a boolean mask """
+    return np.packbits(mask)
+
+
+def repack_rows(bits, mask, rows):
+    """ Copy of a packed row bitmap with the bits of the given rows re-read from mask """
+    bits = bits.copy()
+    touched = np.unique(np.asarray(rows, dtype=np.int64) >> 3)
+    # Each touched byte is repacked from its 8 rows; rows past the end pack as 0, as in pack_rows
+    rows = touched[:, None] * 8 + np.arange(8)
+    bits[touched] = np.packbits(np.where(rows < len(mask), mask[np.minimum(rows, len(mask) - 1)], False), axis=1)[:, 0]
+    return bits
+
+
+def unpack_rows(bits, rows):
+    """ Row positions whose bit is set in a packed bitmap """
+    return np.flatnonzero(np.unpackbits(bits, count=rows))
+
+
+def bits_at(bits, positions):
+    """ Boolean mask of the bits at the given row positions, without unpacking the whole bitmap """
+    return ((bits[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+
+def value_bitmaps(column, normalize):
+    """ Packed row bitmap per normalized distinct value of a ListColumn """
+    rows = len(column)
+    bitmaps = {}
+    row_ids = column.row_ids()
+    # Group item row ids by code: one argsort instead of a scan per value
+    order = np.argsort(column.codes, kind='stable')
+    bounds = np.searchsorted(column.codes[order], np.arange(len(column.vocabulary) + 1))
+    for code, value in enumerate(column.vocabulary):
+        key = normalize(value)
+        value_rows = row_ids[order[bounds[code]:bounds[code + 1]]]
+        # Values that normalize to nothing (blank, punctuation only) can never be asked for
+        if not key:
+            continue
+        # Values without rows keep an all-zero bitmap: on a shard, "no rows here" must still match the value
+        mask = np.zeros(rows, dtype=bool)
+        mask[value_rows] = True
+        bits = pack_rows(mask)
+        bitmaps[key] = bitmaps[key] | bits if key in bitmaps else bits
+    return bitmaps
+
+
+def normalize_phrase(text):
+    """ Lowercase and collapse punctuation/whitespace so "Heated/Ventilated Seats" ~ "heated ventilated seats" """
+    return re.sub(r'[^a-z0-9+]+', ' ', str(text).lower()).strip()
+
+
+class FeatureIndex:
+    """
+    Inverted index from normalized feature phrases and tokens to row bitmaps
+
+    Requested features are matched against the distinct phrases only;
+    the matching rows are then combined with bitmap OR/AND. Misspelled
+    tokens are corrected against the feature tokens with a trigram index.
+    """
+
+    def __init__(self, column):
+        self.rows = len(column)
+        self.empty = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        self.phrases = value_bitmaps(column, normalize_phrase)
+        self.tokens = {}
+        for phrase, bits in self.phrases.items():
+            for token in phrase.split():
+                self.tokens[token] = self.tokens[token] | bits if token in self.tokens else bits
+        self.token_index = TrigramIndex(self.tokens)
+
+    def lookup(self, feature):
+        """
+        Bitmap of rows matching one requested feature
+
+        A feature matches every phrase that contains it. When no phrase does,
+        rows whose features contain all of its tokens are used instead, with
+        unknown tokens replaced by the closest feature token ("adaptve" ->
+        "adaptive"). Terms joined by "and" must all match.
+        """
+        parts = [normalize_phrase(p) for p in re.split(r'\s+and\s+|\s*&\s*', feature)]
+        parts = [p for p in parts if p]
+        if len(parts) > 1:
+            return reduce(np.bitwise_and, [self.lookup(p) for p in parts])
+        if not parts:
+            return self.empty
+
+        query = parts[0]
+        hits = [bits for phrase, bits in self.phrases.items() if query in phrase]
+        if hits:
+            return reduce(np.bitwise_or, hits)
+        token_bits = [self.tokens[token] if token in self.tokens else self._closest_token(token)
+                      for token in query.split()]
+        return reduce(np.bitwise_and, token_bits)
+
+    def _closest_token(self, token):
+        # Typo fallback, only reached when the exact lookups found nothing
+        match = self.token_index.search(token, limit=1)
+        return self.tokens[match[0][0]] if match else self.empty
+
+    def match(self, features, mode="any"):
+        """ Bitmap of rows having any (OR) or all (AND) of the requested features """
+        bitmaps = [self.lookup(f) for f in features]
+        if not bitmaps:
+            return self.empty
+        return reduce(np.bitwise_and if mode == "all" else np.bitwise_or, bitmaps)
+
+
+class PriceIndex:
+    """
+    Sorted prices plus the row permutation that sorts them
+
+    Range queries are two binary searches and a slice instead of two
+    full-length comparison masks. Vehicles without a price are left out,
+    so they never match a budget.
+    """
+
+    def __init__(self, prices, positions):
+        priced = ~is_missing(prices)
+        prices, positions = prices[priced], positions[priced]
+        order = np.argsort(prices, kind='stable')
+        self.prices = prices[order]
+        self.positions = positions[order]
+
+    def __len__(self):
+        return len(self.prices)
+
+    def range(self, min_price=None, max_price=None):
+        """ Row positions (in row order) of prices within [min_price, max_price] """
+        lo, hi = self._bounds(min_price, max_price)
+        return np.sort(self.positions[lo:hi])
+
+    def count(self, min_price=None, max_price=None):
+        """ Number of prices within [min_price, max_price], without materializing the positions """
+        lo, hi = self._bounds(min_price, max_price)
+        return int(hi - lo)
+
+    def updated(self, removed, removed_prices, added_prices, added_positions):
+        """
+        New PriceIndex without the entries of `removed` row positions and with new (price, position) entries
+
+        removed_prices are the prices the removed rows were indexed under, so
+        each entry is found by binary search instead of a pass over the index.
+        The arrays of this index are never written, so readers holding it keep
+        a consistent view.
+        """
+        prices, positions = self.prices, self.positions
+        if len(removed) * 64 > len(positions):
+            # Many removals: one pass over the index beats a binary search per row
+            keep = ~np.isin(positions, removed)
+            prices, positions = prices[keep], positions[keep]
+            slots = np.array([], dtype=np.int64)
+        elif len(removed):
+            removed_prices = np.asarray(removed_prices, dtype=prices.dtype)
+            lo = np.searchsorted(prices, removed_prices, side='left')
+            hi = np.searchsorted(prices, removed_prices, side='right')
+            # Unpriced rows were never indexed: their price sentinel has an empty run
+            slots = np.sort(np.concatenate([
+                start + np.flatnonzero(positions[start:end] == position)
+                for position, start, end in zip(np.asarray(removed).tolist(), lo.tolist(), hi.tolist())
+            ]))
+        else:
+            slots = np.array([], dtype=np.int64)
+        priced = ~is_missing(np.asarray(added_prices, dtype=prices.dtype))
+        added_prices, added_positions = np.asarray(added_prices)[priced], np.asarray(added_positions)[priced]
+        # Sorted by price so entries sharing an insertion point stay in order
+        order = np.argsort(added_prices, kind='stable')
+        added_prices = np.asarray(added_prices, dtype=prices.dtype)[order]
+        at = np.searchsorted(prices, added_prices, side='right')
+        if len(slots) or len(at):
+            prices = _spliced(prices, slots, at, added_prices)
+            positions = _spliced(positions, slots, at, np.asarray(added_positions, dtype=positions.dtype)[order])
+        index = copy.copy(self)
+        # Prices and positions always come as one pair, swapped together with the index object
+        index.prices, index.positions = prices, positions
+        return index
+
+    def _bounds(self, min_price, max_price):
+        lo = 0 if min_price is None else np.searchsorted(self.prices, self._clamp(min_price), side='left')
+        hi = len(self.prices) if max_price is None else np.searchsorted(self.prices, self._clamp(max_price), side='right')
+        return lo, hi
+
+    def _clamp(self, value):
+        # Keep the probe in the column dtype so searchsorted never upcasts the whole array
+        info = np.iinfo(self.prices.dtype)
+        return self.prices.dtype.type(min(max(int(value), info.min), info.max))
+
+
+class ColorIndex:
+    """
+    Row bitmap per color present in the inventory
+
+    Colors mentioned in a query are found with one regex compiled from the
+    inventory's own color vocabulary (longest names first, so "midnight
+    blue" wins over "blue").
+    """
+
+    def __init__(self, column):
+        self.rows = len(column)
+        self.colors = value_bitmaps(column, lambda c: str(c).lower().strip())
+        self.words = frozenset(word for color in self.colors for word in color.split())
+        names = sorted(self.colors, key=len, reverse=True)
+        self.pattern = re.compile(r'\b(' + '|'.join(re.escape(n) for n in names) + r')\b') if names else None
+
+    def find(self, text):
+        """ Inventory colors mentioned in free text """
+        if self.pattern is None:
+            return []
+        return list(dict.fromkeys(self.pattern.findall(text.lower())))
+
+    def match(self, colors):
+        """ Bitmap of rows available in any of the given colors """
+        bitmaps = [self.colors[c.lower()] for c in colors if c.lower() in self.colors]
+        if not bitmaps:
+            return np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        return reduce(np.bitwise_or, bitmaps)
+
+
+class ValueMatcher:
+    """
+    Finds every make/model value mentioned in a query in one pass
+
+    An Aho-Corasick automaton over the lowercased values of the matched
+    columns, with the row positions of each value precomputed, plus a
+    trigram index for misspelled mentions.
+    """
+
+    def __init__(self, frame, columns=('make', 'model')):
+        self.columns = columns
+        self.rows = {}      # (column, lowercased value) -> sorted row positions
+        patterns = {}       # lowercased value -> columns it occurs in
+        for column in columns:
+            series = frame[column]
+            codes = series.cat.codes.to_numpy()
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(series.cat.categories) + 1))
+            for code, value in enumerate(series.cat.categories):
+                value_rows = np.sort(order[bounds[code]:bounds[code + 1]])
+                key = (column, str(value).lower())
+                self.rows[key] = np.union1d(self.rows[key], value_rows) if key in self.rows else value_rows
+                patterns.setdefault(key[1], []).append(column)
+        self.patterns = patterns
+        self.matcher = AhoCorasick(patterns)
+        self.fuzzy = TrigramIndex(patterns)
+
+    def find(self, text):
+        """ (column, value) pairs whose value occurs in text """
+        return [(column, value) for value in self.matcher.find(text.lower())
+                for column in self.patterns[value]]
+
+    def find_with_typos(self, text, skip_words=frozenset()):
+        """ (column, value) pairs whose value occurs in text, exactly or misspelled ("toyta camri") """
+        return [(column, value) for value in find_mentions(self.matcher, self.fuzzy, text, skip_words)
+                for column in self.patterns[value]]
+
+
+class ColumnStats:
+    """
+    In-stock row count per value of the columns free-text queries filter on
+
+    Gathered once per refresh so by_query can apply its most selective
+    conditions first. Deltas leave the counts slightly stale, which can
+    only change the evaluation order, never the result.
+    """
+
+    COLUMNS = ('make', 'model', 'year', 'fuel_type', 'drivetrain', 'seating_capacity', 'safety_rating')
+
+    def __init__(self, frame, lists, in_stock_mask):
+        self.rows = int(in_stock_mask.sum())
+        self.counts = {}    # column -> {lowercased value: in-stock rows}
+        for column in self.COLUMNS:
+            series = frame[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes = series.cat.codes.to_numpy()[in_stock_mask]
+                self.counts[column] = _value_counts(series.cat.categories, codes[codes >= 0])
+            else:
+                values, counts = np.unique(series.to_numpy()[in_stock_mask], return_counts=True)
+                self.counts[column] = {str(v).lower(): int(c) for v, c in zip(values, counts)}
+        colors = lists['colors_available']
+        self.counts['colors_available'] = _value_counts(colors.vocabulary, colors.codes[in_stock_mask[colors.row_ids()]])
+
+    def estimate(self, column, values):
+        """ Estimated in-stock rows whose column is any of values """
+        counts = self.counts[column]
+        return sum(counts.get(str(value).lower(), 0) for value in values)
+
+
+def _value_counts(vocabulary, codes):
+    """ {lowercased value: occurrences} of the codes into vocabulary; values differing only in case add up """
+    counts = {}
+    for value, count in zip(vocabulary, np.bincount(codes, minlength=len(vocabulary)).tolist()):
+        key = str(value).lower()
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+class InventoryIndex:
+    """
+    Derived structures built once per inventory refresh
+
+    Features:
+    - In-stock row mask, positions and bitmap; the in-stock partition is
+      materialized on first use
+    - Price-sorted index over in-stock vehicles
+    - Inverted feature index with row bitmaps
+    - Color availability bitmaps
+    - Precompiled make/model matcher
+    - Profile ranker over in-stock vehicles
+    - BM25 text index over descriptions, types and features
+    - Per-value column statistics for ordering query conditions by selectivity
+    - Copy-on-write patching for price/stock/availability updates and deletes
+      that touches only the changed rows of the derived structures
+    """
+
+    # Columns that update_rows patches; any other change means rebuilding the index
+    UPDATABLE_COLUMNS = ('price', 'stock_count', 'availability')
+
+    def __init__(self, inventory, version=0, rank_bounds=None, text_stats=None):
+        self.inventory = inventory
+        self.version = version
+        self.frame = inventory.frame
+
+        # In-stock rows: filtered frames keep their labels, which are row positions
+        self.in_stock_mask = (self.frame['availability'] == 'in_stock').to_numpy()
+        self.in_stock_positions = np.flatnonzero(self.in_stock_mask)
+        self.in_stock_bits = pack_rows(self.in_stock_mask)
+        self._in_stock = None  # Materialized in-stock partition, gathered on first use
+
+        self.price_index = PriceIndex(self.frame['price'].to_numpy()[self.in_stock_positions], self.in_stock_positions)
+        self.feature_index = FeatureIndex(inventory.lists['features'])
+        self.color_index = ColorIndex(inventory.lists['colors_available'])
+        self.value_matcher = ValueMatcher(self.frame)
+        self.ranker = Ranker(self.frame, self.in_stock_positions, bounds=rank_bounds)
+        self.text_index = BM25Index(inventory, stats=text_stats)
+        self.column_stats = ColumnStats(self.frame, inventory.lists, self.in_stock_mask)
+
+        self.deleted = np.zeros(len(self.frame), dtype=bool)  # Tombstones left by delete_rows
+        self.deleted_count = 0
+        self._id_index = None  # pd.Index over ids, built on the first lookup
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def in_stock(self):
+        """ In-stock vehicles as one contiguous frame labelled by row position, gathered once per index """
+        in_stock = self._in_stock
+        if in_stock is None:
+            # Concurrent first readers may both gather; either result is the same frame
+            in_stock = self._in_stock = self.frame.iloc[self.in_stock_positions]
+        return in_stock
+
+    def in_stock_where(self, mask):
+        """ In-stock vehicles where a boolean mask over all rows is set, without touching the partition """
+        return self.frame.iloc[np.flatnonzero(mask & self.in_stock_mask)]
+
+    def in_stock_by_price(self, min_price=None, max_price=None):
+        """ In-stock vehicles within a price range, as a frame labelled by row position """
+        return self.frame.iloc[self.price_index.range(min_price, max_price)]
+
+    def in_stock_from_bits(self, bits):
+        """ In-stock vehicles whose bit is set in a packed row bitmap """
+        return self.frame.iloc[unpack_rows(bits & self.in_stock_bits, len(self.frame))]
+
+    def positions_of(self, ids):
+        """ Row position of each id, -1 for unknown or deleted ids """
+        if self._id_index is None:
+            self._id_index = pd.Index(self.inventory.strings['id'].to_numpy())
+            if not self._id_index.is_unique:
+                raise ValueError("Vehicle ids are not unique; id lookups need unique ids")
+        positions = self._id_index.get_indexer(list(ids))
+        found = np.flatnonzero(positions >= 0)
+        positions[found[self.deleted[positions[found]]]] = -1
+        return positions
+
+    def patched(self):
+        """
+        Copy of the index for applying a delta off to the side
+
+        Every structure is shared with this index. update_rows and delete_rows
+        on the copy replace the structures they change instead of writing into
+        them, so readers of this index never see a half-applied delta; the
+        copy is published with a single assignment once complete.
+        """
+        index = copy.copy(self)
+        index.frame = self.frame.copy(deep=False)
+        index.inventory = CompactInventory(index.frame, self.inventory.lists, self.inventory.strings)
+        # A patched frame makes the materialized partition stale; it is gathered again when next used
+        index._in_stock = None
+        index.deleted = self.deleted.copy()
+        return index
+
+    def update_rows(self, positions, values):
+        """
+        Write new price/stock_count/availability values for the given rows
+
+        `values` maps each column to an array aligned with positions. Derived
+        structures are patched for the changed rows only: the changed rows
+        are rescored, and rows entering or leaving stock are inserted into or
+        removed from the in-stock positions and the price index. Changed
+        columns are replaced with patched copies, so call this on an
+        unpublished index from patched().
+        """
+        positions = np.asarray(positions)
+        old_prices = self.frame['price'].to_numpy()[positions]
+        for column, column_values in values.items():
+            if column not in self.UPDATABLE_COLUMNS:
+                raise ValueError(f"Column {column!r} cannot be updated in place")
+            _write_rows(self.frame, column, positions, column_values)
+        if 'price' in values or 'stock_count' in values:
+            # Scores are kept for out-of-stock rows too, so rows rejoining stock need no rescoring
+            self.ranker = self.ranker.updated(self.frame, positions)
+
+        if 'availability' in values:
+            self._refresh_in_stock(positions, old_prices, repriced='price' in values)
+        elif 'price' in values:
+            # Rows stay in (or out of) stock: only the price index entries of in-stock rows move
+            stocked = positions[self.in_stock_mask[positions]]
+            self.price_index = self.price_index.updated(
+                stocked, old_prices[self.in_stock_mask[positions]], self.frame['price'].to_numpy()[stocked], stocked
+            )
+
+    def delete_rows(self, positions):
+        """ Tombstone rows: they leave the in-stock partition and id lookups until the next rebuild """
+        positions = np.asarray(positions)
+        positions = positions[~self.deleted[positions]]
+        if len(positions):
+            deleted = self.deleted.copy()
+            deleted[positions] = True
+            self.deleted = deleted
+            self.deleted_count += len(positions)
+            self._refresh_in_stock(positions, self.frame['price'].to_numpy()[positions])
+
+    def _refresh_in_stock(self, positions, old_prices, repriced=False):
+        """
+        Recompute in-stock membership of the given rows and patch everything derived from it
+
+        old_prices are the prices the rows had before this change, the ones
+        the price index holds them under.
+        """
+        was = self.in_stock_mask[positions]
+        now = (self.frame['availability'].iloc[positions] == 'in_stock').to_numpy() & ~self.deleted[positions]
+        left, joined = np.sort(positions[was & ~now]), np.sort(positions[now & ~was])
+
+        if len(left) or len(joined):
+            mask = self.in_stock_mask.copy()
+            mask[left], mask[joined] = False, True
+            self.in_stock_mask = mask
+            self.in_stock_bits = repack_rows(self.in_stock_bits, mask, np.concatenate([left, joined]))
+            self.in_stock_positions = _spliced(
+                self.in_stock_positions, np.searchsorted(self.in_stock_positions, left),
+                np.searchsorted(self.in_stock_positions, joined), joined,
+            )
+            self.ranker = self.ranker.with_positions(self.frame, self.in_stock_positions)
+
+        # Price index entries of rows that left, and of rows that stayed under a new price, are replaced
+        removed = was & (~now | repriced)
+        added = positions[now & (~was | repriced)]
+        self.price_index = self.price_index.updated(
+            positions[removed], old_prices[removed], self.frame['price'].to_numpy()[added], added
+        )
+
+
+def _spliced(values, dropped, at, inserted):
+    """
+    Copy of values without the entries at indexes `dropped` and with `inserted` placed before indexes `at`
+
+    Both index arrays are sorted and refer to values as it is. The result
+    is assembled from slices in a single copy, where np.delete and
+    np.insert would each make a full pass with a mask.
+    """
+    pieces = []
+    start = 0
+    dropped_set = set(dropped.tolist())
+    for cut in sorted(dropped_set.union(at.tolist())):
+        pieces.append(values[start:cut])
+        pieces.append(inserted[np.searchsorted(at, cut, side='left'):np.searchsorted(at, cut, side='right')])
+        start = cut + 1 if cut in dropped_set else cut
+    pieces.append(values[start:])
+    return np.concatenate(pieces).astype(values.dtype, copy=False)
+
+
+def _write_rows(frame, column, rows, values):
+    """
+    Replace frame[column] with a copy that has `values` at `rows`
+
+    The current column buffer is never written: frames sharing it (the
+    published index, or a read-only memory-mapped snapshot) keep their values.
+    """
+    series = frame[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        dtype = series.dtype
+        new_values = sorted(set(v for v in values if v is not None) - set(dtype.categories))
+        if new_values:
+            dtype = pd.CategoricalDtype(dtype.categories.append(pd.Index(new_values)))
+        # Copied in the narrowest code dtype that holds every category; the codes are valid by construction
+        codes = series.cat.codes.to_numpy()
+        codes = codes.astype(np.result_type(codes.dtype, np.min_scalar_type(-len(dtype.categories))))
+        codes[rows] = dtype.categories.get_indexer(list(values))
+        frame.isetitem(frame.columns.get_loc(column), pd.Categorical.from_codes(codes, dtype=dtype, validate=False))
+        return
+
+    values = np.asarray(values)
+    if values.dtype == object:
+        # None (a price or count removed by a delta) becomes the column's missing-number sentinel
+        values = np.array([missing_number(series.dtype) if v is None else v for v in values])
+    values = values.astype(series.dtype)
+    current = series.to_numpy()
+    # isetitem stores a copy of the array it is given, so that copy is the one written: one copy per column.
+    # isetitem also swaps in the column without pandas' write-to-a-slice check on filtered frames
+    location = frame.columns.get_loc(column)
+    frame.isetitem(location, current)
+    data = frame.iloc[:, location].to_numpy()
+    if np.may_share_memory(data, current) or not data.flags.writeable:
+        # The frame kept the current buffer (or only hands out read-only views): write a private copy instead
+        data = current.copy()
+        data[rows] = values
+        frame.isetitem(location, data)
+        return
+    data[rows] = values
@@ -0,0 +1,429 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Storage layout of every inventory column. Enum-like columns become
+# categoricals, numbers use the narrowest dtype that fits realistic values
+# and list-valued columns are stored outside the frame as offset arrays.
+# String columns (the id and the mostly unique free-text description) are
+# kept outside the frame too, as UTF-8 bytes decoded only when read.
+INVENTORY_SCHEMA = {
+    "id": "string",
+    "make": "category",
+    "model": "category",
+    "year": "int16",
+    "type": "category",
+    "price": "int32",
+    "mpg_city": "int16",
+    "mpg_highway": "int16",
+    "seating_capacity": "int8",
+    "safety_rating": "int8",
+    "drivetrain": "category",
+    "fuel_type": "category",
+    "features": "list",
+    "colors_available": "list",
+    "availability": "category",
+    "stock_count": "int32",
+    "category": "category",
+    "description": "string",
+}
+
+LIST_COLUMNS = [name for name, kind in INVENTORY_SCHEMA.items() if kind == "list"]
+NUMERIC_COLUMNS = [name for name, kind in INVENTORY_SCHEMA.items() if kind not in ("string", "category", "list")]
+
+
+# Rows per chunk of a ChunkedArray: a write copies this many rows per chunk it touches
+CHUNK_ROWS = 1 << 16
+
+
+def missing_number(dtype):
+    """ Value stored for a missing number: the smallest value of the integer column dtype """
+    return np.iinfo(dtype).min
+
+
+def is_missing(values):
+    """ Boolean mask of the missing entries of an integer column """
+    return values == missing_number(values.dtype)
+
+
+class ListColumn:
+    """
+    Offset-array encoding for list-valued columns
+
+    Row i holds vocabulary[codes[offsets[i]:offsets[i + 1]]], so every
+    distinct string is stored once and each row costs a few integers.
+    """
+
+    def __init__(self, offsets, codes, vocabulary):
+        self.offsets = offsets          # int64, one entry per row plus a trailing end offset
+        self.codes = codes              # int32 codes into vocabulary
+        self.vocabulary = vocabulary    # object array of distinct strings
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row(self, position):
+        """ Materialize one row as a Python list """
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.vocabulary[self.codes[start:end]].tolist()
+
+    def rows(self, positions):
+        """ Materialize several rows as Python lists """
+        return [self.row(p) for p in positions]
+
+    def row_ids(self):
+        """ Row position of every stored item, aligned with codes """
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def rows_with_codes(self, codes):
+        """ Boolean mask of rows that contain at least one of the given vocabulary codes """
+        mask = np.zeros(len(self), dtype=bool)
+        if len(codes):
+            mask[self.row_ids()[np.isin(self.codes, codes)]] = True
+        return mask
+
+    def codes_where(self, predicate):
+        """ Vocabulary codes whose string satisfies predicate (evaluated once per distinct value) """
+        return np.array([i for i, value in enumerate(self.vocabulary) if predicate(value)], dtype=np.int32)
+
+    def take(self, positions):
+        """ New ListColumn holding the given rows, sharing the vocabulary """
+        lengths = np.diff(self.offsets)[positions]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Item index = row start in the source + offset of the item within its row
+        items = np.repeat(self.offsets[:-1][positions] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return ListColumn(offsets, self.codes[items], self.vocabulary)
+
+    def memory_usage(self):
+        """ Bytes used by the offsets, codes and vocabulary strings """
+        vocabulary_bytes = sum(len(str(v).encode()) + 49 for v in self.vocabulary)
+        return self.offsets.nbytes + self.codes.nbytes + vocabulary_bytes
+
+
+class StringColumn:
+    """
+    Offset-array encoding for string columns
+
+    Row i is data[offsets[i]:offsets[i + 1]] decoded as UTF-8. Both arrays
+    can be memory-mapped from a snapshot, so loading decodes nothing and
+    each row costs its bytes plus one offset instead of a Python string.
+    """
+
+    def __init__(self, offsets, data, missing=None):
+        self.offsets = offsets          # int64, one entry per row plus a trailing end offset
+        self.data = data                # uint8 UTF-8 bytes of all rows
+        self.missing = missing          # bool mask of rows holding None, or None when no row does
+
+    @classmethod
+    def from_values(cls, values):
+        """ Encode a sequence of strings (None for missing values) """
+        encoded = [b'' if v is None else str(v).encode() for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        missing = np.array([v is None for v in values], dtype=bool)
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8), missing if missing.any() else None)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def values(self, positions):
+        """ Decode several rows as a list of strings """
+        data = memoryview(self.data)
+        starts, ends = self.offsets[positions], self.offsets[np.asarray(positions) + 1]
+        values = [str(data[a:b], 'utf-8') for a, b in zip(starts.tolist(), ends.tolist())]
+        if self.missing is not None:
+            for i in np.flatnonzero(self.missing[positions]).tolist():
+                values[i] = None
+        return values
+
+    def to_numpy(self):
+        """ Decode every row into an object array (not cached: callers keep what they need) """
+        text = str(memoryview(self.data), 'utf-8')
+        starts, ends = self.offsets[:-1].tolist(), self.offsets[1:].tolist()
+        if len(text) == len(self.data):
+            # ASCII only: character offsets equal byte offsets, so rows are slices of one decoded string
+            values = np.array([text[a:b] for a, b in zip(starts, ends)], dtype=object)
+        else:
+            data = memoryview(self.data)
+            values = np.array([str(data[a:b], 'utf-8') for a, b in zip(starts, ends)], dtype=object)
+        if self.missing is not None:
+            values[self.missing] = None
+        return values
+
+    def take(self, positions):
+        """ New StringColumn holding the given rows """
+        lengths = np.diff(self.offsets)[positions]
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Byte index = row start in the source + offset of the byte within its row
+        items = np.repeat(self.offsets[:-1][positions] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        missing = self.missing[positions] if self.missing is not None else None
+        if missing is not None and not missing.any():
+            missing = None
+        return StringColumn(offsets, np.asarray(self.data)[items], missing)
+
+    def memory_usage(self):
+        """ Bytes used by the offsets, the UTF-8 data and the missing mask """
+        return self.offsets.nbytes + self.data.nbytes + (self.missing.nbytes if self.missing is not None else 0)
+
+
+def concat_strings(columns):
+    """ One StringColumn holding the rows of every column in turn """
+    if len(columns) == 1:
+        return columns[0]
+    ends = np.cumsum([0] + [len(c.data) for c in columns[:-1]])
+    offsets = np.concatenate([columns[0].offsets[:1]] + [c.offsets[1:] + end for c, end in zip(columns, ends)])
+    missing = None
+    if any(c.missing is not None for c in columns):
+        missing = np.concatenate([c.missing if c.missing is not None else np.zeros(len(c), dtype=bool)
+                                  for c in columns])
+    return StringColumn(offsets.astype(np.int64), np.concatenate([np.asarray(c.data) for c in columns]), missing)
+
+
+class ChunkedArray:
+    """
+    Copy-on-write array split into fixed-size row chunks
+
+    with_rows returns a new ChunkedArray that shares every chunk the write
+    does not touch, so a delta copies CHUNK_ROWS rows per changed chunk
+    instead of the whole array, and holders of the old array never see it.
+    """
+
+    def __init__(self, chunks, chunk_rows=CHUNK_ROWS):
+        self.chunks = chunks            # Arrays of chunk_rows rows each (the last may be shorter); never written
+        self.chunk_rows = chunk_rows
+
+    @classmethod
+    def from_array(cls, array, chunk_rows=CHUNK_ROWS):
+        """ Chunks viewing array, which must not be written afterwards """
+        return cls([array[start:start + chunk_rows] for start in range(0, max(len(array), 1), chunk_rows)], chunk_rows)
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def take(self, rows):
+        """ Values at the given rows, in the order given """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self.chunks) == 1:
+            return self.chunks[0][rows]
+        if len(rows) * 16 >= len(self):
+            # Most of the array: one concatenation and a gather beat a pass per chunk
+            return np.concatenate(self.chunks)[rows]
+        chunk_ids = rows // self.chunk_rows
+        values = np.empty(len(rows), dtype=self.chunks[0].dtype)
+        for chunk_id in np.unique(chunk_ids).tolist():
+            selected = np.flatnonzero(chunk_ids == chunk_id)
+            values[selected] = self.chunks[chunk_id][rows[selected] - chunk_id * self.chunk_rows]
+        return values
+
+    def with_rows(self, rows, values):
+        """ New ChunkedArray with values written at rows; only the chunks holding those rows are copied """
+        rows, values = np.asarray(rows, dtype=np.int64), np.asarray(values)
+        chunks = list(self.chunks)
+        chunk_ids = rows // self.chunk_rows
+        for chunk_id in np.unique(chunk_ids).tolist():
+            selected = np.flatnonzero(chunk_ids == chunk_id)
+            chunk = chunks[chunk_id].copy()
+            chunk[rows[selected] - chunk_id * self.chunk_rows] = values[selected]
+            chunks[chunk_id] = chunk
+        return ChunkedArray(chunks, self.chunk_rows)
+
+    def to_numpy(self):
+        """ All values as one contiguous array """
+        return np.concatenate(self.chunks)
+
+
+class CompactInventory:
+    """
+    Typed columnar inventory: a frame of scalar columns plus string and list columns
+
+    The frame keeps a RangeIndex, so index labels of any filtered frame are
+    row positions into the string and list columns.
+    """
+
+    def __init__(self, frame, lists, strings=None):
+        self.frame = frame
+        self.lists = lists
+        self.strings = strings or {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def take(self, positions):
+        """ New CompactInventory holding the given rows, renumbered from 0 """
+        frame = self.frame.iloc[positions].reset_index(drop=True)
+        return CompactInventory(frame, {name: column.take(positions) for name, column in self.lists.items()},
+                                {name: column.take(positions) for name, column in self.strings.items()})
+
+    def column_names(self, frame):
+        """ Columns a record of frame can hold: its own columns plus the string and list columns """
+        return list(frame.columns) + list(self.strings) + list(self.lists)
+
+    def ids(self, frame):
+        """ Vehicle ids of the rows of frame, in frame order """
+        return self.strings['id'].values(frame.index.to_numpy())
+
+    def to_records(self, frame, columns=None):
+        """ Equivalent of frame.to_dict('records') with the string and list columns joined back in """
+        positions = frame.index.to_numpy()
+        if columns is None:
+            columns = [c for c in INVENTORY_SCHEMA if c in self.lists or c in self.strings or c in frame.columns]
+        scalar = frame[[c for c in columns if c in frame.columns]]
+        # A frame without columns has no records, so rows projected to string/list columns start empty
+        records = scalar.to_dict('records') if len(scalar.columns) else [{} for _ in range(len(frame))]
+        # Missing numbers go back out as None instead of the stored sentinel
+        for name in scalar.columns:
+            if name in NUMERIC_COLUMNS:
+                for i in np.flatnonzero(is_missing(scalar[name].to_numpy())).tolist():
+                    records[i][name] = None
+        lists = {name: self.lists[name].rows(positions) for name in columns if name in self.lists}
+        lists.update((name, self.strings[name].values(positions)) for name in columns if name in self.strings)
+        return [
+            {c: lists[c][i] if c in lists else record[c] for c in columns}
+            for i, record in enumerate(records)
+        ]
+
+    def memory_report(self):
+        """ Bytes per column, total bytes and bytes per vehicle """
+        columns = {name: int(nbytes) for name, nbytes in
+                   self.frame.memory_usage(deep=True, index=False).items()}
+        for name, column in {**self.strings, **self.lists}.items():
+            columns[name] = int(column.memory_usage())
+        total = sum(columns.values())
+        return {
+            "rows": len(self),
+            "columns": columns,
+            "total_bytes": total,
+            "bytes_per_vehicle": total / max(len(self), 1),
+        }
+
+
+class InventoryBuilder:
+    """
+    Schema-driven loader that appends record batches into typed column buffers
+
+    Categorical codes and list vocabularies are shared across batches, so the
+    same builder can be fed the whole inventory at once or chunk by chunk.
+    """
+
+    def __init__(self, schema=INVENTORY_SCHEMA):
+        self.schema = schema
+        self.rows = 0
+        self._chunks = {name: [] for name in schema}
+        self._lookups = {name: {} for name, kind in schema.items() if kind in ("category", "list")}
+        self._offsets = {name: [np.zeros(1, dtype=np.int64)] for name, kind in schema.items() if kind == "list"}
+        self._list_sizes = {name: 0 for name in self._offsets}
+
+    def append(self, records):
+        """ Convert a batch of record dicts into typed arrays """
+        if not records:
+            return
+        for name, kind in self.schema.items():
+            values = [record.get(name) for record in records]
+            if kind == "category":
+                self._chunks[name].append(self._encode(name, values))
+            elif kind == "list":
+                self._append_list(name, values)
+            elif kind == "string":
+                self._chunks[name].append(StringColumn.from_values(values))
+            else:
+                # Missing numbers are stored as a sentinel rather than widening the column to float;
+                # storing 0 would turn a vehicle without a price into a free one
+                missing = missing_number(kind)
+                self._chunks[name].append(
+                    np.array([missing if v is None else v for v in values], dtype=kind)
+                )
+        self.rows += len(records)
+
+    def add_vocabulary(self, records):
+        """ Add the categorical and list values of records to the vocabularies without appending rows """
+        for name, kind in self.schema.items():
+            if kind == "category":
+                self._encode(name, [record.get(name) for record in records])
+            elif kind == "list":
+                self._encode(name, [item for record in records for item in record.get(name) or ()])
+
+    def _encode(self, name, values):
+        """ Factorize a batch and remap its local codes onto the column-wide vocabulary """
+        local_codes, uniques = pd.factorize(np.array(values, dtype=object))
+        lookup = self._lookups[name]
+        mapping = np.array([lookup.setdefault(u, len(lookup)) for u in uniques] + [-1], dtype=np.int32)
+        # factorize marks missing values with -1, which indexes the trailing -1 above
+        return mapping[local_codes]
+
+    def _append_list(self, name, values):
+        lengths = np.array([len(v) if v else 0 for v in values], dtype=np.int64)
+        flat = [item for v in values if v for item in v]
+        self._chunks[name].append(self._encode(name, flat))
+        self._offsets[name].append(self._list_sizes[name] + np.cumsum(lengths))
+        self._list_sizes[name] += int(lengths.sum())
+
+    def build(self):
+        """ Concatenate the buffered chunks into a CompactInventory """
+        columns = {}
+        lists = {}
+        strings = {}
+        for name, kind in self.schema.items():
+            chunks = self._chunks[name]
+            if kind == "string":
+                strings[name] = concat_strings(chunks) if chunks else StringColumn.from_values([])
+            elif kind == "list":
+                lists[name] = ListColumn(
+                    np.concatenate(self._offsets[name]),
+                    _concat(chunks, np.int32),
+                    np.array(list(self._lookups[name]), dtype=object),
+                )
+            elif kind == "category":
+                columns[name] = pd.Categorical.from_codes(
+                    _concat(chunks, np.int32), categories=list(self._lookups[name])
+                )
+            else:
+                columns[name] = _concat(chunks, kind)
+        frame = pd.DataFrame(columns, copy=False)
+        return CompactInventory(frame, lists, strings)
+
+
+def _concat(chunks, dtype):
+    if not chunks:
+        return np.array([], dtype=dtype)
+    return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+
+def build_inventory(records):
+    """ Build a CompactInventory from a list of vehicle records """
+    builder = InventoryBuilder()
+    builder.append(records)
+    return builder.build()
+
+
+def concat_inventories(first, second):
+    """ One CompactInventory holding the rows of `first` followed by those of `second` """
+    columns = {}
+    for name in first.frame.columns:
+        a, b = first.frame[name], second.frame[name]
+        if isinstance(a.dtype, pd.CategoricalDtype):
+            columns[name] = union_categoricals([a, b], ignore_order=True)
+        else:
+            columns[name] = np.concatenate([a.to_numpy(), b.to_numpy()])
+    lists = {}
+    for name, a in first.lists.items():
+        b = second.lists[name]
+        # Extend the first vocabulary with the new values and remap the second column's codes onto it
+        lookup = {value: i for i, value in enumerate(a.vocabulary)}
+        mapping = np.array([lookup.setdefault(value, len(lookup)) for value in b.vocabulary], dtype=np.int32)
+        lists[name] = ListColumn(
+            np.concatenate([a.offsets, a.offsets[-1] + b.offsets[1:]]),
+            np.concatenate([a.codes, mapping[b.codes] if len(b.codes) else b.codes]).astype(np.int32),
+            np.array(list(lookup), dtype=object),
+        )
+    strings = {name: concat_strings([a, second.strings[name]]) for name, a in first.strings.items()}
+    return CompactInventory(pd.DataFrame(columns, copy=False), lists, strings)
+
+
+def categorical_isin(series, values):
+    """ Case-insensitive isin for categorical columns, evaluated on categories then codes """
+    wanted = {str(v).lower() for v in values}
+    categories = series.cat.categories
+    hits = np.flatnonzero(categories.str.lower().isin(wanted))
+    return pd.Series(np.isin(series.cat.codes.to_numpy(), hits), index=series.index)
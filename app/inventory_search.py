@@ -0,0 +1,221 @@
+"""
+Search filters shared by the agent tools and the inventory shards
+
+Every function takes an InventoryIndex and returns the matching in-stock
+vehicles as a frame labelled by row position (so CompactInventory.to_records
+can join the list columns back in).
+"""
+import re
+import numpy as np
+import pandas as pd
+from inventory_index import bits_at, unpack_rows
+from inventory_schema import categorical_isin, is_missing
+
+
+def by_budget(index, min_budget=0, max_budget=None):
+    """ In-stock vehicles within a price range """
+    return index.in_stock_by_price(min_budget, max_budget)
+
+
+def by_type(index, vehicle_types):
+    """ In-stock vehicles whose type or category is one of vehicle_types """
+    frame = index.frame
+    return index.in_stock_where(
+        (categorical_isin(frame['type'], vehicle_types) | categorical_isin(frame['category'], vehicle_types)).to_numpy()
+    )
+
+
+def by_features(index, required_features, match="any"):
+    """ In-stock vehicles having any/all of the requested features """
+    bits = index.feature_index.match(required_features, mode=match.lower())
+    return index.in_stock_from_bits(bits)
+
+
+def by_fuel_type(index, fuel_types):
+    """ In-stock vehicles with one of the given fuel types """
+    return index.in_stock_where(categorical_isin(index.frame['fuel_type'], fuel_types).to_numpy())
+
+
+# Searches returning (frame with a score column, match count), best first
+SCORED_SEARCHES = ('ranked', 'by_text')
+
+
+def ranked(index, profile, max_budget=None, min_budget=0, vehicle_types=None, fuel_types=None, k=5):
+    """ The k best candidates for a profile with a score column, best first, and the candidate count """
+    candidates = index.in_stock_by_price(min_budget, max_budget)
+    if vehicle_types:
+        candidates = candidates[
+            categorical_isin(candidates['type'], vehicle_types) |
+            categorical_isin(candidates['category'], vehicle_types)
+        ]
+    if fuel_types:
+        candidates = candidates[categorical_isin(candidates['fuel_type'], fuel_types)]
+
+    positions, scores = index.ranker.top(profile.lower(), candidates.index.to_numpy(), k=k)
+    return index.frame.iloc[positions].assign(score=np.round(scores.astype(np.float64), 3)), len(candidates)
+
+
+# Fuel types and drivetrains recognized in free-text questions
+QUERY_FUEL_TYPES = ['electric', 'hybrid', 'gasoline', 'plug-in hybrid']
+QUERY_DRIVETRAINS = ['awd', 'fwd', 'rwd', '4wd']
+
+# Patterns of the numeric constraints parse_query understands
+PRICE_CAP_PATTERN = re.compile(r'(under|below|max)\s*\$?(\d{4,6})')                        # "under $30000"
+PRICE_SUFFIX_PATTERN = re.compile(r'\$?(\d{4,6})\s*(or less|or below|and below|and less)')  # "25000 or less"
+YEAR_PATTERN = re.compile(r'\b(20[0-4][0-9]|19[8-9][0-9])\b')
+SEAT_PATTERN = re.compile(r'(\d{1,2})\s*[- ]?(seater|seats|seat)')
+SAFETY_PATTERN = re.compile(r'(\d)\s*[- ]?star')
+
+# Words of inventory questions that never name a make or model, so typo matching skips them
+QUERY_STOPWORDS = frozenset("""
+    a all an and any anything are available availability below best between budget can car cars cheap
+    cheapest color colors colour colours come comes could do does drive economy efficient family find for
+    fuel gas have has how i in is it list looking luxury many max me miles model models mpg my need new
+    of or over please price priced rating safety seat seater seats show sports star stars stock suv suvs
+    sedan sedans that the there these this truck trucks under van vehicle vehicles want what which wheel
+    with year years you
+""".split()) | frozenset(word for value in QUERY_FUEL_TYPES + QUERY_DRIVETRAINS for word in value.split())
+
+
+def parse_query(query):
+    """
+    Constraints of a free-text inventory question that need no inventory vocabulary
+
+    Returns {"max_price", "years", "fuel_types", "drivetrains", "seats",
+    "safety_rating"}; colors and makes/models are matched against the
+    inventory's own values by each backend.
+    """
+    query_lower = query.lower()
+
+    # Price/budget (e.g., "under $30000", "below 25000", "max 40000")
+    max_price = None
+    price_match = PRICE_CAP_PATTERN.search(query_lower)
+    if price_match:
+        max_price = int(price_match.group(2))
+    else:
+        price_match = PRICE_SUFFIX_PATTERN.search(query_lower)
+        if price_match:
+            max_price = int(price_match.group(1))
+
+    # Year extraction (e.g., "2020 model")
+    years = [int(y) for y in YEAR_PATTERN.findall(query_lower)]
+
+    # Seating capacity (e.g., "7-seater", "5 seats")
+    seat_match = SEAT_PATTERN.search(query_lower)
+
+    # Safety rating (e.g., "5-star safety rating")
+    safety_match = SAFETY_PATTERN.search(query_lower)
+
+    return {
+        "max_price": max_price,
+        "years": years,
+        "fuel_types": [fuel for fuel in QUERY_FUEL_TYPES if fuel in query_lower],
+        "drivetrains": [drive for drive in QUERY_DRIVETRAINS if drive in query_lower],
+        "seats": int(seat_match.group(1)) if seat_match else None,
+        "safety_rating": int(safety_match.group(1)) if safety_match else None,
+    }
+
+
+def by_text(index, query, k=10):
+    """ The k best in-stock matches for free text (BM25 over description, type and features) and the match count """
+    positions, scores, total = index.text_index.top(query, index.in_stock_positions, k=k)
+    return index.frame.iloc[positions].assign(score=np.round(scores.astype(np.float64), 3)), total
+
+
+def by_query(index, query):
+    """
+    In-stock vehicles matching a free-text inventory question
+
+    Matches the query against make, model, year, color, fuel type,
+    drivetrain, seating, safety rating and a price cap. Conditions run most
+    selective first (estimated from index.column_stats): the first one
+    yields its matching rows from its own index, and every later one is
+    evaluated only on the rows that are still left.
+    """
+    query_lower = query.lower()
+    parsed = parse_query(query)
+    stats = index.column_stats
+    plan = []
+
+    # A price cap is a binary search on the price index, so its count is exact
+    if parsed["max_price"] is not None:
+        plan.append(_price_condition(index, parsed["max_price"]))
+
+    # Colors: any color in the inventory; several colors mean any of them ("blue or white")
+    colors = index.color_index.find(query_lower)
+    if colors:
+        plan.append(_bits_condition(index, stats.estimate('colors_available', colors), index.color_index.match(colors)))
+
+    if parsed["years"]:
+        plan.append(_column_condition(index, 'year', parsed["years"]))
+
+    # Make/model matching (example: "Toyota", "Camry"), all mentions found in one pass;
+    # misspelled mentions ("toyta camri") are then looked up by trigrams among the other words
+    for col, val in index.value_matcher.find_with_typos(query_lower, QUERY_STOPWORDS | index.color_index.words):
+        plan.append(_rows_condition(index, stats.estimate(col, [val]), index.value_matcher.rows[(col, val)]))
+
+    for fuel in parsed["fuel_types"]:
+        plan.append(_column_condition(index, 'fuel_type', [fuel]))
+
+    for drive in parsed["drivetrains"]:
+        plan.append(_column_condition(index, 'drivetrain', [drive]))
+
+    if parsed["seats"] is not None:
+        plan.append(_column_condition(index, 'seating_capacity', [parsed["seats"]]))
+
+    if parsed["safety_rating"] is not None:
+        plan.append(_column_condition(index, 'safety_rating', [parsed["safety_rating"]]))
+
+    if not plan:
+        return index.in_stock
+
+    plan.sort(key=lambda condition: condition[0])
+    positions = plan[0][1]()
+    for _, _, mask in plan[1:]:
+        if not len(positions):
+            break
+        positions = positions[mask(positions)]
+    return index.frame.iloc[positions]
+
+
+# Conditions of the by_query plan: (estimated in-stock rows, function returning the sorted
+# matching in-stock positions, function masking the given positions)
+
+def _price_condition(index, max_price):
+    prices = index.frame['price'].to_numpy()
+    return (index.price_index.count(max_price=max_price),
+            lambda: index.price_index.range(max_price=max_price),
+            lambda positions: (prices[positions] <= max_price) & ~is_missing(prices[positions]))
+
+
+def _bits_condition(index, estimate, bits):
+    return (estimate,
+            lambda: unpack_rows(bits & index.in_stock_bits, len(index.frame)),
+            lambda positions: bits_at(bits, positions))
+
+
+def _rows_condition(index, estimate, rows):
+    return (estimate,
+            lambda: rows[index.in_stock_mask[rows]],
+            lambda positions: np.isin(positions, rows, assume_unique=True))
+
+
+def _column_condition(index, column, values):
+    estimate = index.column_stats.estimate(column, values)
+    series = index.frame[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Lookup table by code: the wanted values are matched once among the categories,
+        # then one gather per row; the extra last entry is False for missing values (code -1)
+        wanted = np.append(series.cat.categories.str.lower().isin({str(v).lower() for v in values}), False)
+
+        def matches(column_series, positions=slice(None)):
+            return wanted[column_series.cat.codes.to_numpy()[positions]]
+    else:
+        def matches(column_series, positions=slice(None)):
+            column_values = column_series.to_numpy()[positions]
+            return column_values == values[0] if len(values) == 1 else np.isin(column_values, values)
+
+    # As the first condition, one scan of the whole column masked by stock beats a gather of the in-stock rows
+    return (estimate,
+            lambda: np.flatnonzero(matches(series) & index.in_stock_mask),
+            lambda positions: matches(series, positions))
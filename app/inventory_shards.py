@@ -0,0 +1,340 @@
+"""
+Sharded inventory: row partitions served by a pool of worker processes
+
+Each shard process loads only its partition: the partition's rows are
+copied out of the memory-mapped snapshot when there is one, otherwise the
+feed is streamed and only the partition's records are kept. Rank and text
+statistics of the whole inventory are merged in the parent from small
+per-shard statistics and handed back before the shards build their
+InventoryIndex. Searches are scattered to every shard and the per-shard
+heads are merged in row order (or score order for rankings), so a scan
+runs on all cores instead of one core under the GIL.
+
+Enable it for the agent tools with:
+    INVENTORY_SHARDS=4 INVENTORY_SHARD_BY=id uv run app/app.py
+"""
+import hashlib
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+import pandas as pd
+import inventory_search
+from inventory_cache import InventoryCache, inventory_cache, merge_upserts, patch_index
+from inventory_index import InventoryIndex
+from inventory_schema import InventoryBuilder, build_inventory, concat_inventories
+from inventory_stream import iter_record_chunks
+from ranking import merge_signal_bounds, signal_bounds
+from text_search import corpus_stats, merge_corpus_stats
+
+# State of a shard worker process: (InventoryIndex of the shard, source row position of each shard row)
+_shard = None
+# Partition read by _load_shard, waiting for the shared statistics: (CompactInventory, source row positions)
+_pending = None
+
+
+def shard_of(inventory, partition, shards):
+    """ Shard number of every row: crc32 of its partition value, so stable across processes and runs """
+    if partition in inventory.strings:
+        codes, uniques = pd.factorize(inventory.strings[partition].to_numpy())
+    elif isinstance(inventory.frame[partition].dtype, pd.CategoricalDtype):
+        series = inventory.frame[partition]
+        codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, uniques = pd.factorize(inventory.frame[partition].to_numpy())
+    # One hash per distinct value; the trailing 0 puts missing values (code -1) on shard 0
+    assignment = np.array([zlib.crc32(str(u).encode()) % shards for u in uniques] + [0], dtype=np.int32)
+    return assignment[codes]
+
+
+def _record_shard(value, shards):
+    """ Shard of one feed value, the same assignment shard_of makes (missing values on shard 0) """
+    return 0 if value is None else zlib.crc32(str(value).encode()) % shards
+
+
+def _read_partition(inventory_path, shard, shards, partition, use_snapshot):
+    """
+    (inventory, source row positions, source, loaded_from) of partition `shard` of `shards`
+
+    Only the partition is ever materialized: its rows are copied out of a
+    memory-mapped snapshot, or kept from the feed while it is streamed.
+    """
+    loaded = InventoryCache(inventory_path, use_snapshot=use_snapshot)._load_snapshot() if use_snapshot else None
+    if loaded is not None:
+        inventory, source = loaded
+        positions = np.flatnonzero(shard_of(inventory, partition, shards) == shard)
+        return inventory.take(positions), positions, source, "snapshot"
+
+    stat = os.stat(inventory_path)
+    digest = hashlib.blake2b(digest_size=16)
+    builder = InventoryBuilder()
+    positions = []
+    rows = 0
+    for chunk in iter_record_chunks(inventory_path, digest=digest):
+        kept = [i for i, record in enumerate(chunk) if _record_shard(record.get(partition), shards) == shard]
+        # Every value of the feed joins the vocabularies, as with a snapshot partition, so query
+        # parsing (colors, makes, models) recognizes the same words on every shard
+        builder.add_vocabulary(chunk)
+        builder.append([chunk[i] for i in kept])
+        positions.extend(rows + i for i in kept)
+        rows += len(chunk)
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": digest.hexdigest()}
+    return builder.build(), np.array(positions, dtype=np.int64), source, "json-stream"
+
+
+def _partition_stats(inventory):
+    """ Rank bounds and text statistics of one partition, merged by the parent across shards """
+    in_stock = np.flatnonzero((inventory.frame['availability'] == 'in_stock').to_numpy())
+    return {"bounds": signal_bounds(inventory.frame, in_stock), "text_stats": corpus_stats(inventory)}
+
+
+def _load_shard(inventory_path, shard, shards, partition, use_snapshot):
+    """ Worker: read partition `shard` of `shards` and return its rank bounds and text statistics """
+    global _pending
+    inventory, positions, source, loaded_from = _read_partition(inventory_path, shard, shards, partition,
+                                                                use_snapshot)
+    _pending = (inventory, positions)
+    return dict(_partition_stats(inventory), rows=len(positions), source=source, loaded_from=loaded_from)
+
+
+def _compact_shard():
+    """ Worker: stage the live rows of this shard for re-indexing and return their statistics """
+    global _pending
+    if _pending is None:
+        index, positions = _shard
+        live = np.flatnonzero(~index.deleted)
+        _pending = (index.inventory.take(live), positions[live])
+    return _partition_stats(_pending[0])
+
+
+def _index_shard(rank_bounds, text_stats):
+    """ Worker: index the partition staged by _load_shard or _compact_shard with whole-inventory statistics """
+    global _shard, _pending
+    inventory, positions = _pending
+    _shard = (InventoryIndex(inventory, rank_bounds=rank_bounds, text_stats=text_stats), positions)
+    _pending = None
+
+
+def _owned_ids(ids):
+    """ Worker: the ids among `ids` that are live vehicles of this shard """
+    index, _ = _shard
+    return [vehicle_id for vehicle_id, position in zip(ids, index.positions_of(ids)) if position >= 0]
+
+
+def _apply_shard_delta(upserts, deletes, new_positions):
+    """
+    Worker: apply the part of a delta routed to this shard (see InventoryCache.apply_delta)
+
+    new_positions maps the id of every new or rewritten vehicle to its
+    source row position, after every existing row, as a rebuild of the
+    unsharded inventory appends them.
+    """
+    global _shard, _pending
+    index, positions = _shard
+    index, inserts, summary = patch_index(index, upserts, deletes)
+    _shard = (index, positions)
+    if summary["rebuilt"]:
+        # Staged for re-indexing once the parent has merged the statistics of every shard
+        live = np.flatnonzero(~index.deleted)
+        inventory = index.inventory.take(live)
+        if inserts:
+            inventory = concat_inventories(inventory, build_inventory(inserts))
+        _pending = (inventory, np.concatenate([
+            positions[live], np.array([new_positions[record["id"]] for record in inserts], dtype=np.int64)]))
+    return summary
+
+
+def _search_shard(search, args, columns, window):
+    """ Worker: match count and the first `window` (sort key, record) pairs of one inventory_search call """
+    index, positions = _shard
+    if search in inventory_search.SCORED_SEARCHES:
+        frame, total = getattr(inventory_search, search)(index, *args)
+    else:
+        frame = getattr(inventory_search, search)(index, *args)
+        total = len(frame)
+
+    head = frame.iloc[:window]
+    records = index.inventory.to_records(head, columns=columns)
+    keys = positions[head.index.to_numpy()].tolist()
+    if search in inventory_search.SCORED_SEARCHES:
+        # Best score first, ties in row order
+        keys = list(zip((-head['score']).tolist(), keys))
+    return total, list(zip(keys, records))
+
+
+class ShardedInventory:
+    """
+    Inventory partitioned across single-process worker pools
+
+    Features:
+    - Partitioning by a stable hash of id (even) or category (locality)
+    - One worker process per shard, each with its own InventoryIndex
+    - Scatter-gather search with an ordered merge of per-shard heads
+    - Rank scores comparable across shards (shared normalization)
+    - Workers hold only their partition; whole-inventory statistics are merged from per-shard ones
+    - Id-keyed deltas routed to the shard that holds each vehicle
+    - Revalidation of the feed file; every shard reloads on change
+    """
+
+    def __init__(self, inventory_path='data/synthetic_inventory.json', shards=4, partition='id',
+                 use_snapshot=True, check_interval=1.0):
+        self._inventory_path = inventory_path
+        self._shards = shards
+        self._partition = partition
+        self._use_snapshot = use_snapshot
+        self._check_interval = check_interval
+        self._pools = None
+        self._version = 0
+        self._next_position = 0  # Source row position given to the next vehicle a delta appends
+        self._file_signature = None
+        self._last_checked = None
+        self._lock = threading.Lock()
+        self.stats = {"reloads": 0, "searches": 0, "last_reload_seconds": None, "rows_per_shard": None}
+
+    def get_version(self):
+        """ Version stamp of the sharded inventory, bumped on every reload """
+        self._ensure_current()
+        return self._version
+
+    def search(self, search, args, columns, window):
+        """
+        Run an inventory_search function on every shard and merge the results
+
+        Returns (total matches, first `window` records in row order, or in
+        score order for the scored searches ('ranked', 'by_text')).
+        """
+        self._ensure_current()
+        futures = [pool.submit(_search_shard, search, args, columns, window) for pool in self._pools]
+        results = [future.result() for future in futures]
+        self.stats["searches"] += 1
+
+        total = sum(count for count, _ in results)
+        merged = heapq.merge(*(items for _, items in results), key=lambda item: item[0])
+        return total, [record for _, record in islice(merged, window)]
+
+    def _ensure_current(self):
+        current_time = time.time()
+        if self._pools is not None and self._last_checked is not None and \
+                current_time - self._last_checked < self._check_interval:
+            return
+        with self._lock:
+            self._last_checked = current_time
+            if self._pools is None or self._has_changed():
+                self._reload()
+
+    def _has_changed(self):
+        try:
+            stat = os.stat(self._inventory_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != self._file_signature
+
+    def _reload(self):
+        """ (Re)load every shard in parallel and publish a new version """
+        start = time.perf_counter()
+        if self._pools is None:
+            # fork where available: spawned workers would re-import the entry script (e.g. the Gradio app)
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            self._pools = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(self._shards)]
+
+        futures = [
+            pool.submit(_load_shard, self._inventory_path, shard, self._shards, self._partition, self._use_snapshot)
+            for shard, pool in enumerate(self._pools)
+        ]
+        loaded = [future.result() for future in futures]
+
+        # Rank scores are normalized, and text scores weighted, over the whole inventory so shard results can be merged
+        bounds = merge_signal_bounds([shard["bounds"] for shard in loaded])
+        text_stats = merge_corpus_stats([shard["text_stats"] for shard in loaded])
+        for future in [pool.submit(_index_shard, bounds, text_stats) for pool in self._pools]:
+            future.result()
+        self._next_position = sum(shard["rows"] for shard in loaded)
+        source = loaded[0]["source"]
+        self._file_signature = (source["mtime_ns"], source["size"]) if source else None
+        self._version += 1
+
+        elapsed = time.perf_counter() - start
+        self.stats["reloads"] += 1
+        self.stats["last_reload_seconds"] = elapsed
+        self.stats["rows_per_shard"] = [shard["rows"] for shard in loaded]
+        print(f"Shards loaded: {sum(self.stats['rows_per_shard'])} vehicles in {self._shards} shards "
+              f"by {self._partition} from {loaded[0]['loaded_from']} in {elapsed:.3f}s")
+
+    def apply_delta(self, upserts=(), deletes=()):
+        """
+        Apply a batch of upserts and deletes keyed by vehicle id, with the rules of InventoryCache.apply_delta
+
+        Known ids go to the shard holding them and new vehicles to the shard
+        of their partition value. Until the next reload a vehicle stays on
+        its shard even if an upsert changes its partition value. A delta that
+        rebuilds any shard re-indexes every shard with merged statistics.
+        """
+        self._ensure_current()
+        merged = merge_upserts(upserts)
+        deletes = list(deletes)
+        with self._lock:
+            ids = list(dict.fromkeys(list(merged) + deletes))
+            owned = [future.result() for future in [pool.submit(_owned_ids, ids) for pool in self._pools]]
+            owner = {vehicle_id: shard for shard, found in enumerate(owned) for vehicle_id in found}
+
+            routed = [({}, [], {}) for _ in self._pools]  # Per shard: upserts, deletes, new positions
+            for vehicle_id, record in merged.items():
+                shard = owner.get(vehicle_id)
+                if shard is None:
+                    shard = _record_shard(record.get(self._partition), self._shards)
+                routed[shard][0][vehicle_id] = record
+                # New vehicles and changes outside the patchable columns are appended after every existing row
+                if vehicle_id not in owner or not set(record) - {"id"} <= set(InventoryIndex.UPDATABLE_COLUMNS):
+                    routed[shard][2][vehicle_id] = self._next_position
+                    self._next_position += 1
+            for vehicle_id in deletes:
+                if vehicle_id in owner:
+                    routed[owner[vehicle_id]][1].append(vehicle_id)
+
+            futures = [pool.submit(_apply_shard_delta, *parts)
+                       for pool, parts in zip(self._pools, routed) if parts[0] or parts[1]]
+            summaries = [future.result() for future in futures]
+            summary = {key: sum(s[key] for s in summaries) for key in ("updated", "rewritten", "deleted")}
+            summary["rebuilt"] = any(s["rebuilt"] for s in summaries)
+            if summary["rebuilt"]:
+                # Like a rebuild of the unsharded index: every shard drops its deleted rows and is
+                # re-indexed with statistics merged from the new rows, so scores stay comparable
+                parts = [future.result() for future in [pool.submit(_compact_shard) for pool in self._pools]]
+                bounds = merge_signal_bounds([part["bounds"] for part in parts])
+                text_stats = merge_corpus_stats([part["text_stats"] for part in parts])
+                for future in [pool.submit(_index_shard, bounds, text_stats) for pool in self._pools]:
+                    future.result()
+            if merged or summary["deleted"]:
+                self._version += 1
+            summary["version"] = self._version
+        return summary
+
+    def close(self):
+        """ Shut down the shard worker processes """
+        if self._pools is not None:
+            for pool in self._pools:
+                pool.shutdown(wait=True)
+            self._pools = None
+
+
+# Global sharded inventory, only when sharding is enabled
+_shard_count = int(os.getenv('INVENTORY_SHARDS', '0'))
+inventory_shards = (
+    ShardedInventory(shards=_shard_count, partition=os.getenv('INVENTORY_SHARD_BY', 'id'))
+    if _shard_count > 1 else None
+)
+
+if inventory_shards is not None:
+    # Deltas applied to the global inventory cache are forwarded to the shards, which serve the searches
+    inventory_cache.add_delta_listener(inventory_shards.apply_delta)
+
+# To search the shards directly
+# sharded = ShardedInventory(shards=4, partition='category')
+# total, records = sharded.search('by_type', (['SUV'],), ['id', 'make', 'model', 'price'], window=10)
+# sharded.apply_delta(upserts=[{"id": "V001", "stock_count": 3}], deletes=["V002"])
+# sharded.close()
@@ -0,0 +1,743 @@
+"""
+SQLite inventory backend for inventories that do not fit comfortably in RAM
+
+The feed is loaded once into a local database next to it
+(data/synthetic_inventory.sqlite) with indexes on the filtered columns and
+junction tables for features and colors. Searches compile to parameterized
+SQL and only the requested page of rows is read back, so memory use does not
+grow with the inventory. Results have the same shape and order as the
+in-memory backend.
+
+Enable it for the agent tools with:
+    INVENTORY_BACKEND=sqlite uv run app/app.py
+
+Build or refresh the database from the repository root:
+    uv run app/inventory_sqlite.py data/synthetic_inventory.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+import inventory_search
+from inventory_cache import _hash_file, inventory_cache, merge_upserts
+from inventory_index import InventoryIndex, normalize_phrase
+from inventory_schema import INVENTORY_SCHEMA, LIST_COLUMNS
+from inventory_stream import iter_record_chunks
+from ranking import PROFILES, Ranker, merge_signal_bounds, signal_bounds, top_k
+from result_format import DEFAULT_ROW_LIMIT
+from text_match import AhoCorasick, TrigramIndex, find_mentions
+from text_search import TEXT_FIELDS, tokenize
+from vehicle_inventory import generate_synthetic_inventory
+
+SQLITE_FORMAT_VERSION = 3
+
+SCALAR_COLUMNS = [name for name in INVENTORY_SCHEMA if name not in LIST_COLUMNS]
+
+# Enum-like columns compare case-insensitively, like categorical_isin on the in-memory backend
+_NOCASE_COLUMNS = {'make', 'model', 'type', 'drivetrain', 'fuel_type', 'category'}
+# Every search is limited to in-stock vehicles, so each index leads with availability
+_INDEXED_COLUMNS = ['price', 'make', 'model', 'fuel_type', 'type', 'category']
+
+# Junction table and vocabulary table of each list column
+_LIST_TABLES = {'features': ('vehicle_features', 'features'), 'colors_available': ('vehicle_colors', 'colors')}
+
+# Columns behind the rank signals (see ranking.raw_signals)
+_SIGNAL_COLUMNS = ['price', 'mpg_city', 'mpg_highway', 'safety_rating', 'seating_capacity', 'stock_count']
+
+_IN_STOCK = "v.availability = 'in_stock'"
+
+
+def sqlite_path_for(json_path):
+    """ SQLite database that belongs to a JSON inventory file """
+    return os.path.splitext(json_path)[0] + '.sqlite'
+
+
+def build_database(record_chunks, db_path, source=None):
+    """
+    Write the inventory records (an iterable of record lists) to a new SQLite database
+
+    Rows keep their feed order as `position`. `source` is the feed identity
+    stored with the data, or a function returning it once every chunk was
+    read. The database is assembled in a temporary file and renamed into
+    place, so readers never see a half-written database. Returns the number
+    of vehicles.
+    """
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        column_defs = ", ".join(
+            f"{name} {'TEXT' if INVENTORY_SCHEMA[name] in ('string', 'category') else 'INTEGER'}"
+            f"{' COLLATE NOCASE' if name in _NOCASE_COLUMNS else ''}"
+            for name in SCALAR_COLUMNS
+        )
+        conn.execute(f"CREATE TABLE vehicles (position INTEGER PRIMARY KEY, {column_defs})")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        for junction, vocabulary in _LIST_TABLES.values():
+            conn.execute(f"CREATE TABLE {vocabulary} (value_id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+            # One row per list item; ordinal keeps the feed's item order
+            conn.execute(f"CREATE TABLE {junction} (position INTEGER, ordinal INTEGER, value_id INTEGER, "
+                         f"PRIMARY KEY (position, ordinal)) WITHOUT ROWID")
+        # Full-text index of the terms text_search.tokenize finds in the searched fields
+        conn.execute("CREATE VIRTUAL TABLE vehicle_text USING fts5(body, content='', tokenize='unicode61')")
+        conn.execute("CREATE VIRTUAL TABLE vehicle_text_terms USING fts5vocab(vehicle_text, 'row')")
+
+        insert = f"INSERT INTO vehicles VALUES ({', '.join('?' * (len(SCALAR_COLUMNS) + 1))})"
+        vocabularies = {name: {} for name in _LIST_TABLES}
+        rows = 0
+        for chunk in record_chunks:
+            conn.executemany(insert, (
+                (rows + i, *(record.get(name) for name in SCALAR_COLUMNS)) for i, record in enumerate(chunk)
+            ))
+            for name, (junction, _) in _LIST_TABLES.items():
+                ids = vocabularies[name]
+                conn.executemany(f"INSERT INTO {junction} VALUES (?, ?, ?)", (
+                    (rows + i, ordinal, ids.setdefault(value, len(ids)))
+                    for i, record in enumerate(chunk)
+                    for ordinal, value in enumerate(record.get(name) or [])
+                ))
+            conn.executemany("INSERT INTO vehicle_text (rowid, body) VALUES (?, ?)", (
+                (rows + i, ' '.join(_text_terms(record))) for i, record in enumerate(chunk)
+            ))
+            rows += len(chunk)
+
+        for name, (junction, vocabulary) in _LIST_TABLES.items():
+            conn.executemany(f"INSERT INTO {vocabulary} VALUES (?, ?)",
+                             ((i, value) for value, i in vocabularies[name].items()))
+            conn.execute(f"CREATE INDEX {junction}_value ON {junction} (value_id, position)")
+        for name in _INDEXED_COLUMNS:
+            conn.execute(f"CREATE INDEX vehicles_{name} ON vehicles (availability, {name})")
+        # Deltas find their vehicles by id
+        conn.execute("CREATE INDEX vehicles_id ON vehicles (id)")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(SQLITE_FORMAT_VERSION)),
+            ("rows", str(rows)),
+            ("source", json.dumps(source() if callable(source) else source)),
+        ])
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return rows
+
+
+def _text_terms(record):
+    terms = []
+    for name in TEXT_FIELDS:
+        value = record.get(name)
+        for text in (value if isinstance(value, list) else [value] if value else []):
+            terms.extend(tokenize(text))
+    return terms
+
+
+def _value_id(conn, vocabulary, value):
+    """ Id of a feature or color name in its vocabulary table, added when new """
+    row = conn.execute(f"SELECT value_id FROM {vocabulary} WHERE name = ?", (value,)).fetchone()
+    if row is not None:
+        return row[0]
+    value_id = conn.execute(f"SELECT COALESCE(MAX(value_id) + 1, 0) FROM {vocabulary}").fetchone()[0]
+    conn.execute(f"INSERT INTO {vocabulary} VALUES (?, ?)", (value_id, value))
+    return value_id
+
+
+def read_meta(db_path):
+    """ Metadata of a database ({"rows", "source"}), or None when there is no usable database """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if meta.get("format") != str(SQLITE_FORMAT_VERSION):
+        return None
+    return {"rows": int(meta["rows"]), "source": json.loads(meta["source"])}
+
+
+def _in(column, values):
+    """ `column IN (?, ...)` and its parameters; an empty list matches nothing """
+    values = list(values)
+    if not values:
+        return "0", []
+    return f"{column} IN ({', '.join('?' * len(values))})", values
+
+
+class SqlVocabulary:
+    """
+    Distinct feature, color and make/model values of one database version
+
+    Free-text and feature matching runs on these small vocabularies in
+    Python with the same rules as FeatureIndex, ColorIndex and
+    ValueMatcher (typo fallbacks included); the matching value ids then
+    become SQL conditions.
+    """
+
+    def __init__(self, conn):
+        self.phrases = {}   # normalized feature phrase -> feature value ids
+        for value_id, name in conn.execute("SELECT value_id, name FROM features"):
+            phrase = normalize_phrase(name)
+            if phrase:
+                self.phrases.setdefault(phrase, []).append(value_id)
+        self.tokens = {}    # feature token -> ids of the phrases containing it
+        for phrase, ids in self.phrases.items():
+            for token in phrase.split():
+                self.tokens.setdefault(token, []).extend(ids)
+        self.token_index = TrigramIndex(self.tokens)
+
+        self.colors = {}    # lowercased color -> color value ids
+        for value_id, name in conn.execute("SELECT value_id, name FROM colors"):
+            key = str(name).lower().strip()
+            if key:
+                self.colors.setdefault(key, []).append(value_id)
+        names = sorted(self.colors, key=len, reverse=True)
+        self.color_pattern = re.compile(r'\b(' + '|'.join(re.escape(n) for n in names) + r')\b') if names else None
+        self.color_words = frozenset(word for color in self.colors for word in color.split())
+
+        self.value_columns = {}  # lowercased make/model value -> columns it occurs in
+        for column in ('make', 'model'):
+            for (value,) in conn.execute(f"SELECT DISTINCT {column} FROM vehicles WHERE {column} IS NOT NULL"):
+                columns = self.value_columns.setdefault(str(value).lower(), [])
+                if column not in columns:
+                    columns.append(column)
+        self.value_matcher = AhoCorasick(self.value_columns)
+        self.value_index = TrigramIndex(self.value_columns)
+
+        self.text_terms = {term for (term,) in conn.execute("SELECT term FROM vehicle_text_terms")}
+        self.text_index = TrigramIndex(self.text_terms)
+
+    def feature_condition(self, features, match="any"):
+        """ SQL condition (and parameters) for vehicles having any/all of the requested features """
+        conditions = [self._feature_lookup(f) for f in features]
+        if not conditions:
+            return "0", []
+        joiner = " AND " if match == "all" else " OR "
+        return "(" + joiner.join(sql for sql, _ in conditions) + ")", [p for _, params in conditions for p in params]
+
+    def _feature_lookup(self, feature):
+        # Same rules as FeatureIndex.lookup: "and"-joined terms must all match; a term matches every
+        # phrase containing it, or else every vehicle whose features contain all of its tokens
+        parts = [normalize_phrase(p) for p in re.split(r'\s+and\s+|\s*&\s*', feature)]
+        parts = [p for p in parts if p]
+        if len(parts) > 1:
+            return self._all([self._feature_lookup(p) for p in parts])
+        if not parts:
+            return "0", []
+
+        query = parts[0]
+        hits = [value_id for phrase, ids in self.phrases.items() if query in phrase for value_id in ids]
+        if hits:
+            return self._having('vehicle_features', hits)
+        return self._all([self._having('vehicle_features', self._token_ids(token)) for token in query.split()])
+
+    def _token_ids(self, token):
+        if token in self.tokens:
+            return self.tokens[token]
+        match = self.token_index.search(token, limit=1)
+        return self.tokens[match[0][0]] if match else []
+
+    def find_colors(self, text):
+        """ Inventory colors mentioned in free text """
+        if self.color_pattern is None:
+            return []
+        return list(dict.fromkeys(self.color_pattern.findall(text.lower())))
+
+    def color_condition(self, colors):
+        """ SQL condition for vehicles available in any of the given colors """
+        return self._having('vehicle_colors', [i for c in colors for i in self.colors.get(c.lower(), [])])
+
+    def find_values(self, text):
+        """ (column, value) make/model pairs whose value occurs in text, exactly or misspelled """
+        values = find_mentions(self.value_matcher, self.value_index, text,
+                               inventory_search.QUERY_STOPWORDS | self.color_words)
+        return [(column, value) for value in values for column in self.value_columns[value]]
+
+    def text_match(self, query):
+        """ FTS5 query for the terms of free text (same terms and typo fallback as BM25Index), or None """
+        terms = []
+        for term in dict.fromkeys(tokenize(query)):
+            if term not in self.text_terms and len(term) >= 4:
+                match = self.text_index.search(term, limit=1)
+                term = match[0][0] if match else term
+            if term in self.text_terms and term not in terms:
+                terms.append(term)
+        return ' OR '.join(f'"{term}"' for term in terms) or None
+
+    @staticmethod
+    def _having(junction, value_ids):
+        sql, params = _in("value_id", sorted(set(value_ids)))
+        if sql == "0":
+            return sql, params
+        return f"v.position IN (SELECT position FROM {junction} WHERE {sql})", params
+
+    @staticmethod
+    def _all(conditions):
+        return "(" + " AND ".join(sql for sql, _ in conditions) + ")", [p for _, params in conditions for p in params]
+
+
+def _where_budget(vocabulary, min_budget=0, max_budget=None):
+    conditions, params = [_IN_STOCK], []
+    if min_budget is not None:
+        conditions.append("v.price >= ?")
+        params.append(int(min_budget))
+    if max_budget is not None:
+        conditions.append("v.price <= ?")
+        params.append(int(max_budget))
+    return conditions, params
+
+
+def _where_type(vocabulary, vehicle_types):
+    type_sql, type_params = _in("v.type", map(str, vehicle_types))
+    category_sql, category_params = _in("v.category", map(str, vehicle_types))
+    return [_IN_STOCK, f"({type_sql} OR {category_sql})"], type_params + category_params
+
+
+def _where_features(vocabulary, required_features, match="any"):
+    sql, params = vocabulary.feature_condition(required_features, match.lower())
+    return [_IN_STOCK, sql], params
+
+
+def _where_fuel_type(vocabulary, fuel_types):
+    sql, params = _in("v.fuel_type", map(str, fuel_types))
+    return [_IN_STOCK, sql], params
+
+
+def _where_query(vocabulary, query):
+    """ Same constraints as inventory_search.by_query """
+    parsed = inventory_search.parse_query(query)
+    conditions, params = [_IN_STOCK], []
+
+    def add(sql, values=()):
+        conditions.append(sql)
+        params.extend(values)
+
+    if parsed["max_price"] is not None:
+        add("v.price <= ?", [parsed["max_price"]])
+    colors = vocabulary.find_colors(query)
+    if colors:
+        add(*vocabulary.color_condition(colors))
+    if parsed["years"]:
+        add(*_in("v.year", parsed["years"]))
+    for column, value in vocabulary.find_values(query):
+        add(f"v.{column} = ?", [value])
+    for fuel in parsed["fuel_types"]:
+        add("v.fuel_type = ?", [fuel])
+    for drive in parsed["drivetrains"]:
+        add("v.drivetrain = ?", [drive])
+    if parsed["seats"] is not None:
+        add("v.seating_capacity = ?", [parsed["seats"]])
+    if parsed["safety_rating"] is not None:
+        add("v.safety_rating = ?", [parsed["safety_rating"]])
+    return conditions, params
+
+
+def _where_ranked(vocabulary, max_budget=None, min_budget=0, vehicle_types=None, fuel_types=None):
+    conditions, params = _where_budget(vocabulary, min_budget, max_budget)
+    if vehicle_types:
+        type_conditions, type_params = _where_type(vocabulary, vehicle_types)
+        conditions += type_conditions[1:]
+        params += type_params
+    if fuel_types:
+        fuel_conditions, fuel_params = _where_fuel_type(vocabulary, fuel_types)
+        conditions += fuel_conditions[1:]
+        params += fuel_params
+    return conditions, params
+
+
+# inventory_search function name -> compiler of its WHERE conditions
+_SEARCHES = {
+    'by_budget': _where_budget,
+    'by_type': _where_type,
+    'by_features': _where_features,
+    'by_fuel_type': _where_fuel_type,
+    'by_query': _where_query,
+}
+
+
+class SqliteInventory:
+    """
+    Inventory searches served from a local SQLite database
+
+    Features:
+    - Database built from the feed once and reused while the feed is unchanged
+    - Indexes on price, make, model, fuel type, type and category, each led by availability
+    - Feature and color junction tables instead of list cells
+    - Searches compiled to parameterized SQL, same results and order as inventory_search
+    - Only the requested page (and its list items) is read back
+    - Ranking streamed in chunks with a running top-k
+    - FTS5 full-text index over descriptions, types and features
+    - Id-keyed deltas (upserts/deletes) written in one transaction, with the rules of InventoryCache.apply_delta
+    - One read-only connection per thread, reopened after a rebuild or delta
+    """
+
+    def __init__(self, inventory_path='data/synthetic_inventory.json', db_path=None, check_interval=1.0,
+                 chunk_size=50_000):
+        self._inventory_path = inventory_path
+        self._db_path = db_path or sqlite_path_for(inventory_path)
+        self._check_interval = check_interval
+        self._chunk_size = chunk_size
+        self._version = 0
+        self._file_signature = None
+        self._last_checked = None
+        self._vocabulary = None
+        self._rank_bounds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"builds": 0, "searches": 0, "last_build_seconds": None, "rows": None}
+
+    def get_version(self):
+        """ Version stamp of the database, bumped whenever it is (re)built or reopened """
+        self._ensure_current()
+        return self._version
+
+    def search(self, search, args, columns, limit=DEFAULT_ROW_LIMIT, offset=0):
+        """
+        Run the SQL equivalent of an inventory_search function
+
+        Returns (total matches, records of the page starting at `offset`), with
+        records in row order, or the best `limit` in score order for the scored
+        searches ('ranked', 'by_text').
+        """
+        self._ensure_current()
+        conn = self._connection()
+        vocabulary = self._vocabulary
+        self.stats["searches"] += 1
+        if search == 'ranked':
+            return self._ranked(conn, vocabulary, *args, columns=columns)
+        if search == 'by_text':
+            return self._text(conn, vocabulary, *args, columns=columns)
+
+        conditions, params = _SEARCHES[search](vocabulary, *args)
+        where = " AND ".join(conditions)
+        total = conn.execute(f"SELECT COUNT(*) FROM vehicles v WHERE {where}", params).fetchone()[0]
+        cursor = conn.execute(
+            f"SELECT position FROM vehicles v WHERE {where} ORDER BY position LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        positions = [position for (position,) in cursor]
+        return total, self._records(conn, positions, columns)
+
+    def apply_delta(self, upserts=(), deletes=()):
+        """
+        Apply a batch of upserts and deletes keyed by vehicle id to the database
+
+        Same rules as InventoryCache.apply_delta: price, stock_count and
+        availability changes of known vehicles are updated in place; new
+        vehicles and changes to other fields are written after every existing
+        row, as an in-memory rebuild appends them; deletes run after upserts.
+        Feature and color items and the full-text index follow the rows. The
+        batch commits in one transaction and is published under a new
+        version. Rank normalization is recomputed only when vehicles were
+        added or rewritten, as on an in-memory rebuild.
+
+        Deltas stay in the database until the feed changes and it is rebuilt.
+        """
+        start = time.perf_counter()
+        self._ensure_current()
+        merged = merge_upserts(upserts)
+        deletes = list(deletes)
+        with self._lock:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            try:
+                with conn:
+                    summary = self._write_delta(conn, merged, deletes)
+                vocabulary = SqlVocabulary(conn) if summary["rewritten"] else self._vocabulary
+                rows = conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+            finally:
+                conn.close()
+            if merged or summary["deleted"]:
+                # Vocabulary first, then the version: threads reopen their connection on the version change
+                self._vocabulary = vocabulary
+                if summary["rewritten"]:
+                    self._rank_bounds = None
+                self.stats["rows"] = rows
+                self._version += 1
+            summary.update(version=self._version, seconds=time.perf_counter() - start)
+        return summary
+
+    def _write_delta(self, conn, merged, deletes):
+        """ Write merged upserts and deletes in the caller's transaction; returns the summary """
+        ids = list(dict.fromkeys(list(merged) + deletes))
+        positions = {}
+        for start in range(0, len(ids), 500):
+            sql, params = _in("id", ids[start:start + 500])
+            positions.update(conn.execute(f"SELECT id, position FROM vehicles WHERE {sql}", params).fetchall())
+        next_position = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM vehicles").fetchone()[0]
+
+        summary = {"updated": 0, "rewritten": 0, "deleted": 0, "rebuilt": False}
+        deleted_ids = set(deletes)
+        removed = set()
+        for vehicle_id, record in merged.items():
+            position = positions.get(vehicle_id)
+            columns = [c for c in record if c != "id"]
+            if position is not None and set(columns) <= set(InventoryIndex.UPDATABLE_COLUMNS):
+                if columns:
+                    conn.execute(f"UPDATE vehicles SET {', '.join(f'{c} = ?' for c in columns)} WHERE position = ?",
+                                 [record[c] for c in columns] + [position])
+                summary["updated"] += 1
+                continue
+            if position is not None:
+                record = dict(self._records(conn, [position], list(INVENTORY_SCHEMA))[0], **record)
+                self._delete_position(conn, position)
+                removed.add(position)
+            summary["rewritten"] += 1
+            if vehicle_id not in deleted_ids:
+                self._insert_record(conn, next_position, record)
+                next_position += 1
+
+        for vehicle_id in dict.fromkeys(deletes):
+            position = positions.get(vehicle_id)
+            if position is None:
+                continue
+            if position not in removed:
+                self._delete_position(conn, position)
+            summary["deleted"] += 1
+        return summary
+
+    def _insert_record(self, conn, position, record):
+        conn.execute(f"INSERT INTO vehicles VALUES ({', '.join('?' * (len(SCALAR_COLUMNS) + 1))})",
+                     (position, *(record.get(name) for name in SCALAR_COLUMNS)))
+        for name, (junction, vocabulary) in _LIST_TABLES.items():
+            conn.executemany(f"INSERT INTO {junction} VALUES (?, ?, ?)", [
+                (position, ordinal, _value_id(conn, vocabulary, value))
+                for ordinal, value in enumerate(record.get(name) or [])
+            ])
+        conn.execute("INSERT INTO vehicle_text (rowid, body) VALUES (?, ?)", (position, ' '.join(_text_terms(record))))
+
+    def _delete_position(self, conn, position):
+        # The full-text table keeps no content, so removing a row needs the terms it was indexed with
+        old = self._records(conn, [position], list(TEXT_FIELDS))[0]
+        conn.execute("INSERT INTO vehicle_text (vehicle_text, rowid, body) VALUES ('delete', ?, ?)",
+                     (position, ' '.join(_text_terms(old))))
+        conn.execute("DELETE FROM vehicles WHERE position = ?", (position,))
+        for junction, _ in _LIST_TABLES.values():
+            conn.execute(f"DELETE FROM {junction} WHERE position = ?", (position,))
+
+    def _ranked(self, conn, vocabulary, profile, max_budget=None, min_budget=0, vehicle_types=None,
+                fuel_types=None, k=5, columns=None):
+        """ Candidate count and the k best candidate records with a score column """
+        profile = profile.lower()
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}; expected one of {sorted(PROFILES)}")
+        conditions, params = _where_ranked(vocabulary, max_budget, min_budget, vehicle_types, fuel_types)
+        bounds = self._bounds(conn)
+
+        # Each chunk's top k is merged with the running best; candidates are sorted by
+        # position before selection so ties resolve to the earliest row, as in memory
+        best_positions, best_scores = np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        total = 0
+        for positions, frame in self._stream(conn, " AND ".join(conditions), params):
+            total += len(positions)
+            local, scores = Ranker(frame, np.arange(len(frame)), bounds).top(profile, k=k)
+            merged = np.concatenate([best_positions, positions[local]])
+            merged_scores = np.concatenate([best_scores, scores])
+            order = np.argsort(merged, kind='stable')
+            best = order[top_k(merged_scores[order], k)]
+            best_positions, best_scores = merged[best], merged_scores[best]
+
+        return total, self._scored_records(conn, best_positions.tolist(), best_scores, columns)
+
+    def _text(self, conn, vocabulary, query, k=10, columns=None):
+        """ Match count and the k best full-text matches with a score column (FTS5's BM25) """
+        match = vocabulary.text_match(query)
+        if match is None:
+            return 0, []
+        joined = f"vehicle_text JOIN vehicles v ON v.position = vehicle_text.rowid " \
+                 f"WHERE vehicle_text MATCH ? AND {_IN_STOCK}"
+        total = conn.execute(f"SELECT COUNT(*) FROM {joined}", [match]).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT vehicle_text.rowid, -bm25(vehicle_text) AS score FROM {joined} "
+            f"ORDER BY score DESC, vehicle_text.rowid LIMIT ?", [match, k]
+        ).fetchall()
+        return total, self._scored_records(conn, [row[0] for row in rows],
+                                           np.array([row[1] for row in rows], dtype=np.float32), columns)
+
+    def _scored_records(self, conn, positions, scores, columns):
+        # Records of the given positions with their scores, rounded like inventory_search does
+        records = self._records(conn, positions, [c for c in columns if c != 'score'])
+        for record, score in zip(records, np.round(scores.astype(np.float64), 3).tolist()):
+            record['score'] = score
+        return [{c: record[c] for c in columns} for record in records]
+
+    def _bounds(self, conn):
+        """ Rank normalization bounds over every in-stock vehicle, computed once per version """
+        if self._rank_bounds is None:
+            bounds = merge_signal_bounds(
+                signal_bounds(frame, np.arange(len(frame))) for _, frame in self._stream(conn, _IN_STOCK, [])
+            )
+            # Wrapped so that "no in-stock vehicles" (None) is cached too
+            self._rank_bounds = (bounds,)
+        return self._rank_bounds[0]
+
+    def _stream(self, conn, where, params):
+        """ (positions, signal columns frame) chunks of the matching vehicles, in row order """
+        cursor = conn.execute(
+            f"SELECT position, {', '.join(_SIGNAL_COLUMNS)} FROM vehicles v WHERE {where} ORDER BY position",
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(self._chunk_size)
+            if not rows:
+                break
+            values = np.array(rows, dtype=np.float64)
+            frame = pd.DataFrame(values[:, 1:], columns=_SIGNAL_COLUMNS)
+            yield values[:, 0].astype(np.int64), frame
+
+    def _records(self, conn, positions, columns):
+        """ Records of the given row positions, in that order, with list columns joined back in """
+        if not positions:
+            return []
+        scalar = [c for c in columns if c in SCALAR_COLUMNS]
+        position_sql, params = _in("position", positions)
+        item_sql, _ = _in("j.position", positions)
+        rows = conn.execute(
+            f"SELECT position{''.join(', ' + c for c in scalar)} FROM vehicles WHERE {position_sql}", params
+        ).fetchall()
+        by_position = {row[0]: dict(zip(scalar, row[1:])) for row in rows}
+
+        for name in columns:
+            if name in _LIST_TABLES:
+                junction, vocabulary = _LIST_TABLES[name]
+                for record in by_position.values():
+                    record[name] = []
+                items = conn.execute(
+                    f"SELECT j.position, t.name FROM {junction} j JOIN {vocabulary} t ON t.value_id = j.value_id "
+                    f"WHERE {item_sql} ORDER BY j.position, j.ordinal", params
+                )
+                for position, value in items:
+                    by_position[position][name].append(value)
+        return [{c: by_position[p][c] for c in columns} for p in positions]
+
+    def _connection(self):
+        # Read-only connection of this thread, reopened when the database was rebuilt
+        local = self._local
+        if getattr(local, "version", None) != self._version:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True)
+            local.version = self._version
+        return local.conn
+
+    def _ensure_current(self):
+        current_time = time.time()
+        if self._version and self._last_checked is not None and \
+                current_time - self._last_checked < self._check_interval:
+            return
+        with self._lock:
+            self._last_checked = current_time
+            if not self._version or self._has_changed():
+                self._open()
+
+    def _has_changed(self):
+        try:
+            stat = os.stat(self._inventory_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != self._file_signature
+
+    def _open(self):
+        """ Reuse the database when it matches the feed, otherwise rebuild it; then publish a new version """
+        start = time.perf_counter()
+        meta = read_meta(self._db_path)
+        source = self._current_source(meta)
+        if source is None:
+            source = self.build()
+            built = True
+        else:
+            built = False
+
+        conn = sqlite3.connect(f"file:{self._db_path}?mode=ro", uri=True)
+        try:
+            vocabulary = SqlVocabulary(conn)
+            self.stats["rows"] = conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+        finally:
+            conn.close()
+
+        # Vocabulary first, then the version: threads reopen their connection on the version change
+        self._file_signature = (source["mtime_ns"], source["size"]) if source else None
+        self._vocabulary = vocabulary
+        self._rank_bounds = None
+        self._version += 1
+
+        elapsed = time.perf_counter() - start
+        if built:
+            self.stats["builds"] += 1
+            self.stats["last_build_seconds"] = elapsed
+        print(f"SQLite inventory {'built' if built else 'opened'}: {self.stats['rows']} vehicles "
+              f"in {elapsed:.3f}s ({self._db_path})")
+
+    def _current_source(self, meta):
+        """ Source identity stored in the database if it matches the feed, otherwise None """
+        if meta is None:
+            return None
+        source = meta["source"] or {}
+        try:
+            stat = os.stat(self._inventory_path)
+        except OSError:
+            # No JSON feed at all: the database is the inventory
+            return source
+        if source.get("size") != stat.st_size:
+            return None
+        if source.get("mtime_ns") != stat.st_mtime_ns:
+            if _hash_file(self._inventory_path) != source.get("hash"):
+                return None
+            source = dict(source, mtime_ns=stat.st_mtime_ns)
+        return source
+
+    def build(self):
+        """ (Re)build the database from the JSON feed and return the feed's source identity """
+        if not os.path.exists(self._inventory_path):
+            print("No inventory feed; building the SQLite inventory from synthetic data")
+            build_database([generate_synthetic_inventory()], self._db_path)
+            return None
+
+        stat = os.stat(self._inventory_path)
+        digest = hashlib.blake2b(digest_size=16)
+        chunks = iter_record_chunks(self._inventory_path, chunk_size=self._chunk_size, digest=digest)
+        # The content hash is complete only once every chunk was read
+        source = lambda: {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": digest.hexdigest()}
+        build_database(chunks, self._db_path, source)
+        return source()
+
+
+# Global SQLite inventory, only when the SQLite backend is selected
+inventory_sqlite = SqliteInventory() if os.getenv('INVENTORY_BACKEND', 'memory') == 'sqlite' else None
+
+if inventory_sqlite is not None:
+    # Deltas applied to the global inventory cache are written to the database, which serves the searches
+    inventory_cache.add_delta_listener(inventory_sqlite.apply_delta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite inventory database from a JSON feed")
+    parser.add_argument("inventory_path")
+    parser.add_argument("--output", help="Database path (default: next to the feed, .sqlite)")
+    args = parser.parse_args()
+
+    inventory = SqliteInventory(args.inventory_path, db_path=args.output)
+    start = time.perf_counter()
+    inventory.build()
+    print(f"Wrote {inventory._db_path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
+
+
+# To search the database directly
+# sqlite_inventory = SqliteInventory('data/synthetic_inventory.json')
+# total, records = sqlite_inventory.search('by_type', (['SUV'],), ['id', 'make', 'model', 'price'], limit=10)
+# sqlite_inventory.apply_delta(upserts=[{"id": "V001", "stock_count": 3}], deletes=["V002"])
@@ -0,0 +1,161 @@
+"""
+Binary inventory snapshots: one .npy file per column plus a JSON manifest
+
+A snapshot lives next to the JSON feed (data/synthetic_inventory.snapshot/)
+and is memory-mapped on load, so worker processes share the OS page cache
+instead of each parsing and holding its own copy of the inventory.
+
+Convert a JSON feed from the repository root:
+    uv run app/inventory_store.py data/synthetic_inventory.json
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from inventory_schema import INVENTORY_SCHEMA, CompactInventory, ListColumn, StringColumn
+from inventory_stream import load_inventory_streaming
+
+SNAPSHOT_FORMAT_VERSION = 3
+MANIFEST_NAME = 'manifest.json'
+
+
+def snapshot_path_for(json_path):
+    """ Snapshot directory that belongs to a JSON inventory file """
+    return os.path.splitext(json_path)[0] + '.snapshot'
+
+
+def write_snapshot(inventory, snapshot_dir, source=None):
+    """
+    Write a CompactInventory as .npy column files
+
+    The snapshot is assembled in a temporary directory and renamed into
+    place, so readers never see a half-written snapshot.
+    """
+    tmp_dir = f"{snapshot_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = {}
+    for name, kind in INVENTORY_SCHEMA.items():
+        if kind == "list":
+            column = inventory.lists[name]
+            np.save(os.path.join(tmp_dir, f"{name}.offsets.npy"), column.offsets)
+            np.save(os.path.join(tmp_dir, f"{name}.codes.npy"), column.codes)
+            columns[name] = {"kind": kind, "vocabulary": column.vocabulary.tolist()}
+        elif kind == "category":
+            series = inventory.frame[name]
+            # Saved with pandas' own code dtype so loading needs no cast
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), series.cat.codes.to_numpy())
+            columns[name] = {"kind": kind, "categories": series.cat.categories.tolist()}
+        elif kind == "string":
+            column = inventory.strings[name]
+            np.save(os.path.join(tmp_dir, f"{name}.offsets.npy"), column.offsets)
+            np.save(os.path.join(tmp_dir, f"{name}.data.npy"), np.asarray(column.data))
+            if column.missing is not None:
+                np.save(os.path.join(tmp_dir, f"{name}.missing.npy"), column.missing)
+            columns[name] = {"kind": kind, "missing": column.missing is not None}
+        else:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), inventory.frame[name].to_numpy())
+            columns[name] = {"kind": kind}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "rows": len(inventory),
+        "columns": columns,
+        "source": source,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f)
+
+    old_dir = f"{snapshot_dir}.old-{os.getpid()}"
+    if os.path.exists(snapshot_dir):
+        os.rename(snapshot_dir, old_dir)
+    os.rename(tmp_dir, snapshot_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_manifest(snapshot_dir):
+    """ Snapshot manifest, or None when there is no readable snapshot """
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def load_snapshot(snapshot_dir, mmap=True, manifest=None):
+    """
+    Load a snapshot as a CompactInventory
+
+    With mmap=True numeric columns, categorical codes, list offsets/codes
+    and the offsets and UTF-8 bytes of string columns are read-only views
+    of the mapped files; only the small category and list vocabularies are
+    materialized, so load time does not grow with the row count. Strings
+    are decoded when read.
+    """
+    manifest = manifest or read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No inventory snapshot in {snapshot_dir}")
+    mmap_mode = 'r' if mmap else None
+
+    def load(filename):
+        return np.load(os.path.join(snapshot_dir, filename), mmap_mode=mmap_mode)
+
+    columns = {}
+    lists = {}
+    strings = {}
+    for name, spec in manifest["columns"].items():
+        kind = spec["kind"]
+        if kind == "list":
+            lists[name] = ListColumn(
+                load(f"{name}.offsets.npy"),
+                load(f"{name}.codes.npy"),
+                np.array(spec["vocabulary"], dtype=object),
+            )
+        elif kind == "category":
+            columns[name] = pd.Categorical.from_codes(
+                load(f"{name}.npy"),
+                dtype=pd.CategoricalDtype(spec["categories"]),
+                validate=False,
+            )
+        elif kind == "string":
+            strings[name] = StringColumn(
+                load(f"{name}.offsets.npy"),
+                load(f"{name}.data.npy"),
+                load(f"{name}.missing.npy") if spec.get("missing") else None,
+            )
+        else:
+            columns[name] = load(f"{name}.npy")
+
+    frame = pd.DataFrame(columns, copy=False)
+    return CompactInventory(frame, lists, strings)
+
+
+def convert(json_path, snapshot_dir=None):
+    """ Convert a JSON inventory file into a snapshot, returning the snapshot directory """
+    snapshot_dir = snapshot_dir or snapshot_path_for(json_path)
+    start = time.perf_counter()
+    # Streamed so that converting a multi-GB feed needs little more memory than the snapshot itself
+    inventory, source = load_inventory_streaming(json_path)
+    write_snapshot(inventory, snapshot_dir, source=source)
+    elapsed = time.perf_counter() - start
+    print(f"Snapshot written: {len(inventory)} vehicles -> {snapshot_dir} in {elapsed:.3f}s")
+    return snapshot_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a JSON inventory into a memory-mappable snapshot")
+    parser.add_argument("json_path", nargs="?", default="data/synthetic_inventory.json")
+    parser.add_argument("--output", help="Snapshot directory (defaults to <json_path without .json>.snapshot)")
+    args = parser.parse_args()
+    convert(args.json_path, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Streaming ingestion of large inventory feeds
+
+Records are decoded incrementally from a JSON array or a JSON Lines file
+and appended chunk by chunk to the typed column buffers of an
+InventoryBuilder, so only one chunk of Python dicts is alive at a time.
+"""
+import codecs
+import hashlib
+import json
+import os
+import time
+from inventory_schema import InventoryBuilder
+
+# Characters allowed between records: whitespace, array commas and JSON Lines newlines
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_record_chunks(path, chunk_size=50_000, read_size=1 << 20, digest=None):
+    """
+    Yield lists of at most chunk_size records from a JSON array or JSON Lines file
+
+    The file is read read_size bytes at a time. When a digest is given it is
+    updated with every byte of the file.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    with open(path, 'rb') as f:
+        def read_more():
+            raw = f.read(read_size)
+            if digest is not None:
+                digest.update(raw)
+            return text_decoder.decode(raw, final=not raw), not raw
+
+        buf, eof = read_more()
+        pos = 0
+        started = False
+        chunk = []
+
+        while True:
+            # Skip separators, reading more input when the buffer runs out
+            while True:
+                while pos < len(buf) and buf[pos] in _SEPARATORS:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                more, eof = read_more()
+                buf, pos = buf[pos:] + more, 0
+            if pos >= len(buf):
+                break
+
+            char = buf[pos]
+            if not started:
+                started = True
+                if char == '[':
+                    pos += 1
+                    continue
+            if char == ']':
+                break
+
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Record continues past the end of the buffer
+                more, eof = read_more()
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+            # Drop consumed text so the buffer stays around read_size
+            if pos > read_size:
+                buf, pos = buf[pos:], 0
+
+        if chunk:
+            yield chunk
+
+        # Keep the digest covering the whole file even if trailing bytes were not parsed
+        if digest is not None:
+            for raw in iter(lambda: f.read(read_size), b''):
+                digest.update(raw)
+
+
+def load_inventory_streaming(path, chunk_size=50_000, report_every=1_000_000):
+    """
+    Build a CompactInventory from a large feed with bounded peak memory
+
+    Returns the inventory and the feed's source identity (mtime, size and
+    content hash) computed during the same pass. Progress and throughput
+    are printed every report_every records.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    builder = InventoryBuilder()
+    start = time.perf_counter()
+    next_report = report_every
+
+    for chunk in iter_record_chunks(path, chunk_size=chunk_size, digest=digest):
+        builder.append(chunk)
+        if builder.rows >= next_report:
+            elapsed = time.perf_counter() - start
+            print(f"Streaming inventory: {builder.rows:,} vehicles in {elapsed:.1f}s "
+                  f"({builder.rows / max(elapsed, 1e-9):,.0f} rows/s)")
+            next_report += report_every
+
+    inventory = builder.build()
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": digest.hexdigest()}
+    return inventory, source
@@ -0,0 +1,372 @@
+"""
+Deterministic answers to simple inventory questions, without the agents
+
+Count ("How many Toyota vehicles are available?"), list ("List all luxury
+SUVs you have in stock"), availability ("Do you have any red Camrys?") and
+color questions ("What colors does the Camry come in?") are parsed locally
+and answered from aggregates over the cached inventory in milliseconds. A
+question is only answered when every word of it is either a recognized
+constraint or question scaffolding; anything else returns None and goes to
+the agent as before.
+"""
+import argparse
+import os
+import re
+import threading
+import time
+import numpy as np
+import inventory_search
+from inventory_cache import inventory_cache
+from inventory_shards import inventory_shards
+from inventory_sqlite import inventory_sqlite
+from inventory_search import (PRICE_CAP_PATTERN, PRICE_SUFFIX_PATTERN, QUERY_STOPWORDS, SAFETY_PATTERN,
+                              SEAT_PATTERN, YEAR_PATTERN, parse_query)
+
+# Vehicles listed in a list/availability answer before "...and N more"
+LIST_LIMIT = 10
+
+# Question scaffolding: words that carry no constraint of their own
+FILLER_WORDS = frozenset("""
+    a all an and any are available availability can car cars carry color colors colour colours come comes
+    count currently do does got have how in inventory is list lot many me model models number of offer on
+    option options or please rating ratings right now safety sell show stock tell the there total vehicle
+    vehicles we what which with you your
+""".split())
+
+# Type/category words that are also everyday question words, so they never count as a type
+AMBIGUOUS_TYPE_WORDS = frozenset(['budget', 'work'])
+
+COUNT_PATTERN = re.compile(r'^(how many|number of|count|total number of)\b')
+LIST_PATTERN = re.compile(r'^(list|show|which|what)\b')
+AVAILABILITY_PATTERN = re.compile(r'^(do you have|do you sell|do you carry|are there|is there|is the|are the|any)\b')
+COLOR_QUESTION_PATTERN = re.compile(r'\bcolou?rs?\b')
+
+# parse_query's numeric constraints, with any word ending they are glued to ("5-stars")
+_CONSTRAINT_PATTERNS = [re.compile(p.pattern + r'[a-z]*')
+                        for p in (PRICE_CAP_PATTERN, PRICE_SUFFIX_PATTERN, YEAR_PATTERN, SEAT_PATTERN, SAFETY_PATTERN)]
+
+EXAMPLE_QUESTIONS = [
+    "How many Toyota vehicles are currently available?",
+    "Show me all electric vehicles available in your inventory.",
+    "List all luxury SUVs you have in stock.",
+    "Show me vehicles available in red color.",
+    "Which electric vehicles are available in blue or white color?",
+    "What colors does the Honda Civic come in?",
+    "Do you have any AWD SUVs under $40000?",
+    "List all 7-seater vehicles with a 5-star safety rating.",
+    "How many hybrid vehicles do you have?",
+    "I need a reliable family SUV under $40,000 with good safety ratings.",
+    "Which vehicles do you recommend for a daily city commute with great fuel efficiency?",
+    "Are there any vehicles with adaptive cruise control?",
+    "Can you summarize your current vehicle inventory?",
+]
+
+
+class InventoryAggregates:
+    """ In-stock counts, colors and type words of one inventory version """
+
+    def __init__(self, index):
+        self.version = index.version
+        frame = index.frame
+        self.total = len(index.in_stock_positions)
+
+        self.counts = {}    # column -> {lowercased value: in-stock vehicles}
+        self.names = {}     # (column, lowercased value) -> value as stored
+        for column in ('make', 'model', 'fuel_type'):
+            counts = self.counts[column] = {}
+            for value, count in frame[column].iloc[index.in_stock_positions].value_counts().items():
+                key = str(value).lower()
+                counts[key] = counts.get(key, 0) + int(count)
+                self.names.setdefault((column, key), str(value))
+
+        # Colors of in-stock vehicles per make and per model, from the (row, color) items of the list column
+        colors = index.inventory.lists['colors_available']
+        row_ids = colors.row_ids()
+        stocked = index.in_stock_mask[row_ids]
+        item_rows, item_codes = row_ids[stocked], colors.codes[stocked].astype(np.int64)
+        self.colors = {}    # (column, lowercased value) -> set of colors
+        for column in ('make', 'model'):
+            categories = frame[column].cat.categories
+            value_codes = frame[column].cat.codes.to_numpy()[item_rows].astype(np.int64)
+            known = value_codes >= 0
+            pairs = np.unique(value_codes[known] * len(colors.vocabulary) + item_codes[known])
+            for value_code, color_code in zip(*np.divmod(pairs, max(len(colors.vocabulary), 1))):
+                key = (column, str(categories[value_code]).lower())
+                self.colors.setdefault(key, set()).add(str(colors.vocabulary[color_code]))
+
+        # Words of types and categories ("suv", "luxury") -> per column, lookup table of the codes containing it
+        self.type_words = {}
+        self.type_names = {}
+        self.type_nouns = {str(value).split()[-1].lower() for value in frame['type'].cat.categories if str(value).strip()}
+        for column in ('type', 'category'):
+            categories = frame[column].cat.categories
+            for code, value in enumerate(categories):
+                for word in str(value).split():
+                    key = word.lower()
+                    if key in AMBIGUOUS_TYPE_WORDS:
+                        continue
+                    lookup = self.type_words.setdefault(key, {}).setdefault(
+                        column, np.zeros(len(categories) + 1, dtype=bool))
+                    lookup[code] = True
+                    # Acronyms keep their case mid-sentence ("SUV"), other words are lowercased
+                    self.type_names.setdefault(key, word if word.isupper() else key)
+
+    def type_word(self, word):
+        """ The type word a question word names ("suvs" -> "suv"), or None """
+        if word in self.type_words:
+            return word
+        if word.endswith('s') and word[:-1] in self.type_words:
+            return word[:-1]
+        return None
+
+    def type_mask(self, frame, words):
+        """ Rows of frame whose type or category contains every one of the type words """
+        mask = np.ones(len(frame), dtype=bool)
+        for word in words:
+            word_mask = np.zeros(len(frame), dtype=bool)
+            for column, lookup in self.type_words[word].items():
+                word_mask |= lookup[frame[column].cat.codes.to_numpy()]
+            mask &= word_mask
+        return mask
+
+
+class QuickAnswers:
+    """
+    Local answers to count, list, availability and color questions
+
+    Features:
+    - Intent and constraint parsing with no model call
+    - Confidence check: every word must be a constraint or question scaffolding
+    - Same matching rules as inventory_tools (inventory_search.by_query)
+    - Aggregates (counts, colors, type words) rebuilt once per inventory version
+    - Hit-rate counters for the share of questions answered locally
+    """
+
+    def __init__(self, cache, enabled=True):
+        self._cache = cache
+        self.enabled = enabled
+        self._aggregates = None
+        self._lock = threading.Lock()
+        self.stats = {"questions": 0, "answered": 0, "intents": {}}
+
+    def answer(self, question):
+        """ Answer text for a simple inventory question, or None when the agent should answer it """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        intent, text = None, None
+        index = self._cache.get_index()
+        if index is not None and not index.frame.empty:
+            intent, text = self._answer(index, question)
+
+        with self._lock:
+            self.stats["questions"] += 1
+            if text is not None:
+                self.stats["answered"] += 1
+                self.stats["intents"][intent] = self.stats["intents"].get(intent, 0) + 1
+        elapsed = time.perf_counter() - start
+        summary = f"hit rate {self.hit_rate():.0%} of {self.stats['questions']} questions"
+        if text is None:
+            print(f"Fast path: no confident answer, passing to the agent ({summary})")
+        else:
+            print(f"Fast path: {intent} question answered in {elapsed * 1000:.1f}ms ({summary})")
+        return text
+
+    def hit_rate(self):
+        """ Share of questions answered without the agent """
+        return self.stats["answered"] / self.stats["questions"] if self.stats["questions"] else 0.0
+
+    def _get_aggregates(self, index):
+        with self._lock:
+            if self._aggregates is None or self._aggregates.version != index.version:
+                self._aggregates = InventoryAggregates(index)
+            return self._aggregates
+
+    def _answer(self, index, question):
+        """ (intent, answer text), or (None, None) when the question is not fully understood """
+        text = re.sub(r'\s+', ' ', question.lower()).strip().rstrip('?.!').strip()
+        aggregates = self._get_aggregates(index)
+        constraints = _parse(index, aggregates, text)
+        if constraints is None:
+            return None, None
+
+        if COLOR_QUESTION_PATTERN.search(text) and not constraints["colors"]:
+            return 'colors', _colors_answer(aggregates, constraints)
+        for intent, pattern in (('count', COUNT_PATTERN), ('list', LIST_PATTERN),
+                                ('availability', AVAILABILITY_PATTERN)):
+            if pattern.match(text):
+                count, frame = _matches(index, aggregates, constraints, text, need_rows=intent != 'count')
+                label = _describe(aggregates, constraints, count)
+                if intent == 'count':
+                    if count:
+                        return intent, f"We currently have {count:,} {label} in stock."
+                    return intent, f"We don't have any {label} in stock right now."
+                if not count:
+                    prefix = "No, we" if intent == 'availability' else "We"
+                    return intent, f"{prefix} don't have any {label} in stock right now."
+                prefix = "Yes, we" if intent == 'availability' else "We"
+                return intent, f"{prefix} have {count:,} {label} in stock:\n" + _vehicle_lines(index, frame, count)
+        return None, None
+
+
+def _parse(index, aggregates, text):
+    """
+    Constraints of a question, or None unless every word is a constraint or scaffolding
+
+    Constraints that by_query would combine in a surprising way (two makes,
+    two fuel types, ...) also return None rather than a confident zero.
+    """
+    parsed = parse_query(text)
+    if len(parsed["fuel_types"]) > 1 or len(parsed["drivetrains"]) > 1 or len(parsed["years"]) > 1:
+        return None
+    rest = text
+    for pattern in _CONSTRAINT_PATTERNS:
+        rest = pattern.sub(' ', rest)
+
+    colors = index.color_index.find(text)
+    if colors:
+        rest = index.color_index.pattern.sub(' ', rest)
+
+    # Exact make/model mentions only: a misspelled one means the parser is guessing
+    mentions = index.value_matcher.find(text)
+    if set(mentions) != set(index.value_matcher.find_with_typos(text, QUERY_STOPWORDS | index.color_index.words)):
+        return None
+    for column in ('make', 'model'):
+        if len({value for col, value in mentions if col == column}) > 1:
+            return None
+    for value in {value for _, value in mentions}:
+        rest = re.sub(r'(?<![a-z0-9])' + re.escape(value) + r'(?![a-z0-9])', ' ', rest)
+
+    for value in parsed["fuel_types"] + parsed["drivetrains"]:
+        rest = rest.replace(value, ' ')
+
+    type_words = []
+    for word in re.findall(r'[a-z0-9]+', rest):
+        if word in FILLER_WORDS:
+            continue
+        type_word = aggregates.type_word(word)
+        if type_word is None:
+            return None
+        if type_word not in type_words:
+            type_words.append(type_word)
+
+    return {"parsed": parsed, "colors": colors, "mentions": mentions, "type_words": type_words}
+
+
+def _matches(index, aggregates, constraints, text, need_rows=True):
+    """ (count, frame of matching in-stock vehicles or None) """
+    parsed = constraints["parsed"]
+    only = [(column, value) for column, value in constraints["mentions"]] + \
+           [('fuel_type', fuel) for fuel in parsed["fuel_types"]]
+    others = (constraints["colors"] or constraints["type_words"] or parsed["drivetrains"] or parsed["years"] or
+              parsed["max_price"] is not None or parsed["seats"] is not None or parsed["safety_rating"] is not None)
+
+    # Counts of a single make, model or fuel type (or everything) come straight from the aggregates
+    if not need_rows and not others and len(only) <= 1:
+        if not only:
+            return aggregates.total, None
+        column, value = only[0]
+        return aggregates.counts[column].get(value.lower(), 0), None
+
+    frame = inventory_search.by_query(index, text)
+    if constraints["type_words"]:
+        frame = frame[aggregates.type_mask(frame, constraints["type_words"])]
+    return len(frame), frame
+
+
+def _describe(aggregates, constraints, count):
+    """ Readable description of the constraints ("red Toyota SUVs under $40,000") """
+    parsed = constraints["parsed"]
+    words = []
+    if constraints["colors"]:
+        words.append(' or '.join(constraints["colors"]))
+    words += [str(year) for year in parsed["years"]]
+    for column in ('make', 'model'):
+        words += [aggregates.names.get((col, value), value.title())
+                  for col, value in constraints["mentions"] if col == column]
+    words += parsed["fuel_types"]
+    words += [drive.upper() for drive in parsed["drivetrains"]]
+    words += [aggregates.type_names[word] for word in constraints["type_words"]]
+    # The noun is the type when the last type word is one ("red trucks"), else "vehicles"
+    if words and constraints["type_words"] and constraints["type_words"][-1] in aggregates.type_nouns:
+        words[-1] += '' if count == 1 else 's'
+    else:
+        words.append('vehicle' if count == 1 else 'vehicles')
+    if parsed["max_price"] is not None:
+        words.append(f"up to ${parsed['max_price']:,}")
+    features = []
+    if parsed["seats"] is not None:
+        features.append(f"{parsed['seats']} seats")
+    if parsed["safety_rating"] is not None:
+        features.append(f"a {parsed['safety_rating']}-star safety rating")
+    if features:
+        words.append('with ' + ' and '.join(features))
+    return ' '.join(words)
+
+
+def _price_text(price):
+    return "price on request" if price is None else f"${price:,}"
+
+
+def _vehicle_lines(index, frame, count):
+    """ One line per vehicle, at most LIST_LIMIT, then how many more there are """
+    columns = ['year', 'make', 'model', 'type', 'price', 'fuel_type', 'stock_count']
+    lines = [
+        f"- {r['year']} {r['make']} {r['model']} ({r['type']}), {_price_text(r['price'])}, {r['fuel_type']}, "
+        f"{r['stock_count'] or 0} in stock"
+        for r in index.inventory.to_records(frame.iloc[:LIST_LIMIT], columns=columns)
+    ]
+    if count > LIST_LIMIT:
+        lines.append(f"...and {count - LIST_LIMIT:,} more.")
+    return '\n'.join(lines)
+
+
+def _colors_answer(aggregates, constraints):
+    """ Colors of the one make or model a question names, or None """
+    parsed, mentions = constraints["parsed"], constraints["mentions"]
+    if constraints["type_words"] or parsed["fuel_types"] or parsed["drivetrains"] or parsed["years"] or \
+            parsed["max_price"] is not None or parsed["seats"] is not None or parsed["safety_rating"] is not None:
+        return None
+    models = [key for key in mentions if key[0] == 'model']
+    makes = [key for key in mentions if key[0] == 'make']
+    target = models[0] if models else makes[0] if makes else None
+    if target is None:
+        return None
+    name = ' '.join(aggregates.names.get(key, key[1].title()) for key in makes + models)
+    colors = sorted(aggregates.colors.get(target, ()))
+    if not colors:
+        return f"We don't have the {name} in stock right now."
+    if target[0] == 'make':
+        return f"{name} vehicles in stock come in {', '.join(colors)}."
+    return f"The {name} is available in {', '.join(colors)}."
+
+
+# Global fast path over the shared inventory cache; QUICK_ANSWERS=0 sends every question to the agent.
+# It is off when SQLite or the shards serve the tools: it would load the whole inventory in this
+# process, and its answers could disagree with the backend the agent searches
+quick_answers = QuickAnswers(inventory_cache, enabled=os.getenv('QUICK_ANSWERS', '1') != '0'
+                             and inventory_sqlite is None and inventory_shards is None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer inventory questions with the local fast path")
+    parser.add_argument("questions", nargs="*", default=EXAMPLE_QUESTIONS,
+                        help="Questions to answer (defaults to a set of example questions)")
+    args = parser.parse_args()
+
+    for question in args.questions:
+        print(f"\nQ: {question}")
+        answer = quick_answers.answer(question)
+        print(f"A: {answer}" if answer is not None else "A: (agent)")
+    print(f"\nFast-path hit rate: {quick_answers.hit_rate():.0%} of {quick_answers.stats['questions']} questions "
+          f"{quick_answers.stats['intents']}")
+
+
+if __name__ == "__main__":
+    main()
+
+# Usage example:
+# from quick_answers import quick_answers
+# answer = quick_answers.answer("How many Toyota vehicles are available?")
+# if answer is None:
+#     ...  # run the agent
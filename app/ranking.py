@@ -0,0 +1,184 @@
+import copy
+import numpy as np
+from inventory_schema import ChunkedArray, is_missing
+
+# Normalized per-vehicle signals, each scaled to [0, 1] across in-stock vehicles
+SIGNALS = ['affordability', 'prestige', 'efficiency', 'safety', 'space', 'availability']
+
+# Weight of each signal per recommendation profile; signals not listed weigh 0
+PROFILES = {
+    'budget': {'affordability': 0.50, 'efficiency': 0.20, 'safety': 0.15, 'availability': 0.15},
+    'family': {'safety': 0.40, 'space': 0.35, 'affordability': 0.10, 'efficiency': 0.10, 'availability': 0.05},
+    'luxury': {'prestige': 0.60, 'safety': 0.25, 'availability': 0.15},
+    'eco': {'efficiency': 0.60, 'affordability': 0.20, 'safety': 0.10, 'availability': 0.10},
+}
+
+
+def raw_signals(frame, positions):
+    """ Unscaled per-vehicle measurements behind the signals, for the given row positions; missing values are NaN """
+    def column(name):
+        values = frame[name].to_numpy()[positions]
+        measured = values.astype(np.float32)
+        if values.dtype.kind == 'i':
+            measured[is_missing(values)] = np.nan
+        return measured
+
+    return {
+        'price': column('price'),
+        'mpg': 0.55 * column('mpg_city') + 0.45 * column('mpg_highway'),
+        'safety': column('safety_rating'),
+        'seating': column('seating_capacity'),
+        # Stock counts have a long tail; log keeps a few huge lots from dominating
+        'stock': np.log1p(column('stock_count')),
+    }
+
+
+def signal_bounds(frame, positions):
+    """ (min, max) of each raw measurement; shards share these so their scores are comparable """
+    if not len(positions):
+        return None
+    bounds = {}
+    for name, values in raw_signals(frame, positions).items():
+        known = values[~np.isnan(values)]
+        # (inf, -inf) when nothing is known, so merging bounds with min/max still works
+        bounds[name] = (float(known.min()), float(known.max())) if len(known) else (np.inf, -np.inf)
+    return bounds
+
+
+def merge_signal_bounds(parts):
+    """ Bounds over the union of several row sets, from the bounds of each (None for an empty set) """
+    parts = [bounds for bounds in parts if bounds is not None]
+    if not parts:
+        return None
+    return {name: (min(bounds[name][0] for bounds in parts), max(bounds[name][1] for bounds in parts))
+            for name in parts[0]}
+
+
+def _scaled(values, bounds):
+    """ Min-max scale to [0, 1]; a constant column scores 0.5 everywhere; missing values stay NaN """
+    lo, hi = bounds
+    if not hi > lo:
+        return np.where(np.isnan(values), np.nan, 0.5).astype(np.float32)
+    return np.clip((values - lo) / (hi - lo), 0.0, 1.0).astype(np.float32)
+
+
+def top_k(scores, k):
+    """ Indices of the k highest scores, best first, via partial selection instead of a full sort """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        # Everything above the k-th best score, then the earliest rows tied with it, so
+        # the result does not depend on how the partition breaks ties
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        candidates = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    else:
+        candidates = np.arange(len(scores))
+    # Only the k winners are sorted; ties keep row order
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class Ranker:
+    """
+    Profile scores for in-stock vehicles
+
+    Features:
+    - Signals normalized once per inventory refresh and combined into one
+      score per profile for every vehicle, in stock or not
+    - Optional shared normalization bounds, so shard scores can be merged
+    - Scores held in copy-on-write chunks: a delta rescores the changed
+      vehicles and copies only their chunks, and a stock change only swaps
+      the ranked positions
+    - Top-k selection with argpartition, so only the shortlist is sorted
+    """
+
+    def __init__(self, frame, positions, bounds=None):
+        self.positions = positions  # Sorted row positions of the ranked vehicles
+        self.bounds = bounds or signal_bounds(frame, positions)
+        self.weights = {
+            name: np.array([weights.get(s, 0.0) for s in SIGNALS], dtype=np.float32)
+            for name, weights in PROFILES.items()
+        }
+        # Indexed by row position, so a vehicle keeps its scores while out of stock
+        scores = self._profile_scores(frame, np.arange(len(frame)))
+        self.profile_scores = {name: ChunkedArray.from_array(values) for name, values in scores.items()}
+
+    def scores(self, profile, positions=None):
+        """ Profile score of each vehicle (all ranked vehicles, or the given row positions) """
+        if profile not in self.profile_scores:
+            raise ValueError(f"Unknown profile {profile!r}; expected one of {sorted(self.profile_scores)}")
+        return self.profile_scores[profile].take(self.positions if positions is None else positions)
+
+    def top(self, profile, positions=None, k=5):
+        """ (row positions, scores) of the k best vehicles for a profile, best first """
+        if positions is None:
+            positions = self.positions
+        else:
+            positions = positions[self._ranked(positions)]
+        scores = self.scores(profile, positions)
+        best = top_k(scores, k)
+        return positions[best], scores[best]
+
+    def updated(self, frame, positions):
+        """ Ranker with the changed vehicles rescored, keeping the normalization bounds; self is untouched """
+        if not len(positions):
+            return self
+        ranker = copy.copy(self)
+        scores = self._profile_scores(frame, positions)
+        ranker.profile_scores = {name: column.with_rows(positions, scores[name])
+                                 for name, column in self.profile_scores.items()}
+        return ranker
+
+    def with_positions(self, frame, positions):
+        """ Ranker over another set of vehicles (sorted row positions), sharing the scores; self is untouched """
+        if self.bounds is None:
+            # Nothing was ranked, so there were no bounds to score with: normalize over the new set
+            return Ranker(frame, positions)
+        ranker = copy.copy(self)
+        ranker.positions = positions
+        return ranker
+
+    def _profile_scores(self, frame, positions):
+        signals = self._signals(frame, positions)
+        scores = {}
+        for name, weights in self.weights.items():
+            # Summed signal by signal, so a vehicle's score does not depend on how many are scored at once
+            values = np.zeros(len(positions), dtype=np.float32)
+            for column, weight in zip(signals.T, weights):
+                if weight:
+                    values += column * weight
+            scores[name] = values
+        return scores
+
+    def _signals(self, frame, positions):
+        if not len(positions) or self.bounds is None:
+            return np.zeros((len(positions), len(SIGNALS)), dtype=np.float32)
+        raw = raw_signals(frame, positions)
+        price = _scaled(raw['price'], self.bounds['price'])
+        columns = {
+            'affordability': 1.0 - price,
+            'prestige': price,
+            'efficiency': _scaled(raw['mpg'], self.bounds['mpg']),
+            'safety': _scaled(raw['safety'], self.bounds['safety']),
+            'space': _scaled(raw['seating'], self.bounds['seating']),
+            'availability': _scaled(raw['stock'], self.bounds['stock']),
+        }
+        # A missing measurement earns nothing: an unpriced vehicle is neither affordable nor prestigious
+        return np.nan_to_num(np.column_stack([columns[s] for s in SIGNALS]), nan=0.0)
+
+    def _ranked(self, positions):
+        # Membership by binary search: O(k log n) for k positions, no pass over all ranked rows
+        rows = np.minimum(self._rows(positions), max(len(self.positions) - 1, 0))
+        return (self.positions[rows] == positions) if len(self.positions) else np.zeros(len(positions), dtype=bool)
+
+    def _rows(self, positions):
+        # Row positions -> their index in the sorted ranked positions
+        return np.searchsorted(self.positions, positions)
+
+
+# Usage example:
+# from inventory_cache import inventory_cache
+# index = inventory_cache.get_index()
+# positions, scores = index.ranker.top('family', k=5)
+# print(index.frame.iloc[positions][['make', 'model', 'safety_rating', 'seating_capacity']])
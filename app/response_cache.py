@@ -0,0 +1,239 @@
+"""
+Response cache in front of the agent for repeated and near-identical questions
+
+Questions are normalized (case, punctuation, "$40k" / "40,000" / "$40,000",
+plurals, filler words) and looked up by exact key first, then by cosine
+similarity of hashed word and character-trigram vectors. A similar question
+is only reused when it names the same constraints: numbers, makes/models,
+colors, fuel types, drivetrains, vehicle types/categories, features and
+comparison words must all match, so "Toyota under $30k" never gets the
+answer to "Toyota under $40k", nor "family sedan" the one to "family SUV".
+"""
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from inventory_index import normalize_phrase
+from inventory_search import QUERY_STOPWORDS, parse_query
+from quick_answers import InventoryAggregates
+from text_search import tokenize
+
+# Words that change nothing about the answer ("show me all ...", "list ...", "could you ...")
+CACHE_STOPWORDS = frozenset("""
+    all also available availability can could currently do does did find give got hello hey hi inventory
+    just kindly know let like list need please really right show stock tell thank thanks what which would
+""".split())
+
+# Word spellings folded together before keying
+SYNONYMS = {'car': 'vehicle', 'auto': 'vehicle', 'automobile': 'vehicle', 'colour': 'color',
+            'below': 'under', 'above': 'over', 'maximum': 'max', 'minimum': 'min'}
+
+# Words that flip or bound a constraint; two questions must agree on all of them to share an answer
+COMPARISON_WORDS = frozenset("""
+    above below between cheapest except expensive fewer highest least less lowest max maximum min minimum
+    more most no not only over under without
+""".split())
+
+NUMBER_PATTERN = re.compile(r'\$?(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k|thousand)?\b')
+
+
+def normalize_query(query):
+    """ Canonical word list of a question: numbers spelled out as plain integers, filler removed """
+    def number(match):
+        value = float(match.group(1).replace(',', '')) * (1000 if match.group(2) else 1)
+        return f" {int(value) if value.is_integer() else value} "
+
+    text = NUMBER_PATTERN.sub(number, query.lower())
+    words = [SYNONYMS.get(word, word) for word in tokenize(text) if word not in CACHE_STOPWORDS]
+    # The comparison words tokenize drops would otherwise vanish from the key
+    words += [SYNONYMS.get(word, word) for word in re.findall(r'[a-z]+', text)
+              if word in COMPARISON_WORDS and SYNONYMS.get(word, word) not in words]
+    return words
+
+
+def query_vector(words, dimensions=1024):
+    """ L2-normalized hashed bag of words and character trigrams (stable across processes) """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in words:
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(b'3' + padded[i:i + 3].encode()) % dimensions] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def query_signature(index, query, words, aggregates=None):
+    """
+    Constraints a cached answer depends on: numbers and comparison words, plus
+    the makes/models, colors, fuel types, drivetrains, type/category words
+    ("sedan", "family") and feature phrases named (given an index and its
+    InventoryAggregates), or else the whole normalized word set
+    """
+    numbers = frozenset(word for word in words if re.fullmatch(r'\d+(?:\.\d+)?', word))
+    comparisons = frozenset(word for word in words if word in COMPARISON_WORDS)
+    if index is None:
+        # Without an index no constraint can be told from other words, so every word must match
+        return numbers, comparisons, frozenset(words)
+    query_lower = query.lower()
+    parsed = parse_query(query)
+    aggregates = aggregates or InventoryAggregates(index)
+    phrase = f" {normalize_phrase(query)} "
+    return (
+        numbers,
+        comparisons,
+        frozenset(index.value_matcher.find_with_typos(query_lower, QUERY_STOPWORDS | index.color_index.words)),
+        frozenset(index.color_index.find(query_lower)),
+        frozenset(parsed["fuel_types"] + parsed["drivetrains"]),
+        frozenset(filter(None, map(aggregates.type_word, re.findall(r'[a-z0-9]+', query_lower)))),
+        frozenset(feature for feature in index.feature_index.phrases if f" {feature} " in phrase),
+    )
+
+
+class ResponseCache:
+    """
+    LRU cache of agent responses, looked up by normalized question
+
+    Features:
+    - Exact lookup on the normalized question
+    - Similarity lookup on hashed vectors, gated by a constraint signature
+    - Entries tied to an inventory version; a new version clears the cache
+    - LRU eviction by entry count and by an approximate memory cap
+    - Hit/miss counters and the agent time saved by hits
+    """
+
+    def __init__(self, version, index=None, maxsize=512, max_bytes=16 * 1024 * 1024, threshold=0.9,
+                 dimensions=1024):
+        self._version_source = version  # Callable returning the current inventory version
+        self._index_source = index      # Optional callable returning the InventoryIndex, for signatures
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._threshold = threshold
+        self._dimensions = dimensions
+        self._entries = OrderedDict()   # key -> {"slot", "signature", "response", "seconds", "bytes"}
+        self._vectors = np.zeros((maxsize, dimensions), dtype=np.float32)
+        self._slot_keys = [None] * maxsize
+        self._free_slots = list(range(maxsize - 1, -1, -1))
+        self._bytes = 0
+        self._version = None
+        self._aggregates = None         # InventoryAggregates of the index last used for a signature
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+                          "saved_seconds": 0.0}
+
+    def get(self, query):
+        """ (True, response) on a hit, (False, None) on a miss """
+        start = time.perf_counter()
+        key, vector, signature = self._describe(query)
+        version = self._version_source()
+        with self._lock:
+            self._check_version(version)
+            kind, entry_key = 'exact', key if key in self._entries else None
+            if entry_key is None:
+                kind, entry_key, similarity = 'similar', *self._most_similar(vector, signature)
+            if entry_key is None:
+                self._counters["misses"] += 1
+                kind = None
+            else:
+                entry = self._entries[entry_key]
+                self._entries.move_to_end(entry_key)
+                self._counters[f"{kind}_hits"] += 1
+                saved = max(entry["seconds"] - (time.perf_counter() - start), 0.0)
+                self._counters["saved_seconds"] += saved
+                response = entry["response"]
+        if kind is None:
+            print(f"Response cache: miss (hit rate {self.stats()['hit_rate']:.0%})")
+            return False, None
+        detail = "" if kind == 'exact' else f" ({similarity:.2f} similar)"
+        print(f"Response cache: {kind} hit{detail}, saved ~{saved:.1f}s (hit rate {self.stats()['hit_rate']:.0%})")
+        return True, response
+
+    def put(self, query, response, seconds=0.0):
+        """ Store the response to a question, with the agent time it took """
+        key, vector, signature = self._describe(query)
+        size = sys.getsizeof(response) + vector.nbytes
+        version = self._version_source()
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            if size > self._max_bytes:
+                return
+            while self._entries and (not self._free_slots or self._bytes + size > self._max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._slot_keys[slot] = key
+            self._entries[key] = {"slot": slot, "signature": signature, "response": response,
+                                  "seconds": seconds, "bytes": size}
+            self._bytes += size
+
+    def _describe(self, query):
+        words = normalize_query(query)
+        index = self._index_source() if self._index_source else None
+        aggregates = None
+        if index is not None:
+            # Type words are resolved once per inventory version
+            aggregates = self._aggregates
+            if aggregates is None or aggregates.version != index.version:
+                aggregates = self._aggregates = InventoryAggregates(index)
+        return (' '.join(words), query_vector(words, self._dimensions),
+                query_signature(index, query, words, aggregates))
+
+    def _most_similar(self, vector, signature):
+        # Called with the lock held: (key, similarity) of the best entry above the threshold with the same signature
+        if not self._entries:
+            return None, 0.0
+        similarities = self._vectors @ vector
+        for slot in np.argsort(-similarities):
+            if similarities[slot] < self._threshold:
+                break
+            key = self._slot_keys[slot]
+            if key is not None and self._entries[key]["signature"] == signature:
+                return key, float(similarities[slot])
+        return None, 0.0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._slot_keys[entry["slot"]] = None
+        self._vectors[entry["slot"]] = 0.0
+        self._free_slots.append(entry["slot"])
+        self._bytes -= entry["bytes"]
+
+    def _check_version(self, version):
+        # Called with the lock held: drop every answer given against an older inventory
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            for key in list(self._entries):
+                self._remove(key)
+            self._version = version
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """ Counters plus current size, memory and hit rate """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["version"] = self._version
+        hits = stats["exact_hits"] + stats["similar_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+
+# Usage example:
+# from inventory_cache import inventory_cache
+# cache = ResponseCache(version=inventory_cache.get_version, index=inventory_cache.get_index)
+# cache.put("Show me electric cars under $40k", "We have ...", seconds=12.5)
+# print(cache.get("show me all electric vehicles under 40,000"))
+# print(cache.stats())
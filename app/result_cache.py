@@ -0,0 +1,130 @@
+import copy
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU cache for search tool results
+
+    Features:
+    - Keys built from the call arguments; filter arguments are normalized (case, list order)
+    - Entries tied to an inventory version; a new version clears the cache
+    - Optional TTL per entry
+    - Hit/miss/eviction counters for monitoring
+    """
+
+    def __init__(self, version, maxsize=1024, ttl=None):
+        self._version_source = version  # Callable returning the current inventory version
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._version = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def cached(self, fn=None, normalized=()):
+        """
+        Decorator: serve repeated calls with equivalent arguments from the cache
+
+        Arguments named in `normalized` are filters matched case-insensitively
+        and as sets (["SUV", "sedan"] ~ ["Sedan", "suv"]); every other argument,
+        such as columns, must be equal for two calls to share an entry.
+        """
+        if fn is None:
+            return functools.partial(self.cached, normalized=normalized)
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (fn.__qualname__,) + tuple(
+                (name, normalize_argument(value) if name in normalized else freeze_argument(value))
+                for name, value in bound.arguments.items()
+            )
+            found, result = self.get(key)
+            if found:
+                return result
+            result = fn(*args, **kwargs)
+            self.put(key, result)
+            return result
+
+        return wrapper
+
+    def get(self, key):
+        """ (True, result) on a hit, (False, None) on a miss """
+        version = self._version_source()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self._ttl is not None and time.monotonic() - entry[0] > self._ttl:
+                del self._entries[key]
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            result = entry[1]
+        # Every caller gets its own copy, so changing a returned result never changes the cached one
+        return True, copy.deepcopy(result)
+
+    def put(self, key, result):
+        version = self._version_source()
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _check_version(self, version):
+        # Called with the lock held: drop everything computed against an older inventory
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._entries.clear()
+            self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ Counters plus current size and hit rate """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            stats["version"] = self._version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def freeze_argument(value):
+    """ Hashable form of a tool argument that keeps its case and list order """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_argument(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze_argument(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze_argument(v)) for k, v in value.items()))
+    return value
+
+
+def normalize_argument(value):
+    """ Canonical, hashable form of a filter argument: case/whitespace-insensitive, list order ignored """
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted({normalize_argument(v) for v in value}, key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_argument(v)) for k, v in value.items()))
+    return value
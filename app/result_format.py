@@ -0,0 +1,90 @@
+import json
+import os
+
+# Columns returned when a tool call does not ask for a projection; the long
+# free-text description is left out unless requested
+DEFAULT_COLUMNS = [
+    'id', 'make', 'model', 'year', 'type', 'price', 'mpg_city', 'mpg_highway',
+    'seating_capacity', 'safety_rating', 'drivetrain', 'fuel_type', 'features',
+    'colors_available', 'stock_count', 'category',
+]
+
+# Result budget: rows per page, hard cap on requested rows, and estimated tokens per page
+DEFAULT_ROW_LIMIT = int(os.getenv('TOOL_RESULT_ROWS', '20'))
+MAX_ROW_LIMIT = 200
+DEFAULT_TOKEN_BUDGET = int(os.getenv('TOOL_RESULT_TOKENS', '2000'))
+
+
+def estimate_tokens(value):
+    """ Rough token estimate of a JSON-encoded value (about 4 characters per token) """
+    return len(json.dumps(value, separators=(',', ':'))) // 4 + 1
+
+
+def format_results(inventory, frame, columns=None, limit=DEFAULT_ROW_LIMIT, offset=0,
+                   token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Compact, size-capped tool result
+
+    Matches are returned as a table ({"columns": [...], "rows": [[...]]})
+    holding at most `limit` rows starting at `offset`, and fewer if the
+    page would exceed the estimated token budget. total_matches always
+    reports the full match count, so counts do not depend on paging.
+    """
+    columns = project_columns(columns, inventory.column_names(frame))
+    limit, offset = page_bounds(limit, offset)
+    page = frame.iloc[offset:offset + limit]
+    return format_table(inventory.to_records(page, columns=columns), columns, len(frame), offset, token_budget)
+
+
+def project_columns(columns, available):
+    """ Requested columns that exist (the default projection when none are given), id always first """
+    columns = [c for c in (columns or DEFAULT_COLUMNS) if c in available]
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    return columns
+
+
+def page_bounds(limit, offset):
+    """ (limit, offset) clamped to 1..MAX_ROW_LIMIT rows and a non-negative offset """
+    return max(1, min(int(limit or DEFAULT_ROW_LIMIT), MAX_ROW_LIMIT)), max(0, int(offset or 0))
+
+
+def format_table(records, columns, total, offset=0, token_budget=DEFAULT_TOKEN_BUDGET):
+    """ Result table for one page of records, cut short when it would exceed the token budget """
+    rows = []
+    tokens = estimate_tokens(columns)
+    for record in records:
+        row = [_compact(record[c]) for c in columns]
+        tokens += estimate_tokens(row)
+        if rows and tokens > token_budget:
+            break
+        rows.append(row)
+
+    result = {
+        "columns": columns,
+        "rows": rows,
+        "total_matches": total,
+        "offset": offset,
+        "returned": len(rows),
+        "truncated": offset + len(rows) < total,
+    }
+    if result["truncated"]:
+        result["next_offset"] = offset + len(rows)
+    return result
+
+
+def _compact(value):
+    # List cells are joined into one string, which is noticeably cheaper in tokens
+    return '; '.join(value) if isinstance(value, list) else value
+
+
+def empty_result(columns=None):
+    """ Result for an unavailable inventory, same shape as format_results """
+    return {
+        "columns": list(columns or DEFAULT_COLUMNS),
+        "rows": [],
+        "total_matches": 0,
+        "offset": 0,
+        "returned": 0,
+        "truncated": False,
+    }
@@ -0,0 +1,147 @@
+import re
+from collections import Counter, deque
+from difflib import SequenceMatcher
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher
+
+    Compiled once from a set of patterns, it reports every pattern that
+    occurs in a text (including overlapping ones) in a single pass over
+    the text, independent of how many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self.patterns = []
+        for pattern in dict.fromkeys(patterns):
+            if pattern:
+                self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """ Patterns occurring anywhere in text, in order of first occurrence """
+        found = {}
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern_id in self._out[node]:
+                found.setdefault(pattern_id, None)
+        return [self.patterns[i] for i in found]
+
+
+def fuzzy_key(text):
+    """ Lowercased text with hyphens/slashes as spaces, so "F-150" ~ "f150" and "Mercedes-Benz" ~ "mercedes benz" """
+    return ' '.join(re.sub(r'[-_/]+', ' ', str(text).lower()).split())
+
+
+def trigrams(text):
+    """ Character trigrams of text, padded so word starts and ends count ("  t", " to", ..., "ta ") """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Typo-tolerant lookup over a vocabulary of strings
+
+    An inverted index from character trigrams to the values containing
+    them. A lookup only visits values sharing trigrams with the term,
+    shortlists those sharing the most and scores the shortlist by edit
+    similarity, so it stays fast as the vocabulary grows.
+    """
+
+    def __init__(self, values, min_similarity=0.8):
+        self.values = [v for v in dict.fromkeys(values) if v]
+        self.keys = [fuzzy_key(v) for v in self.values]
+        self.min_similarity = min_similarity
+        self.postings = {}
+        for value_id, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, []).append(value_id)
+        self.max_words = max((len(k.split()) for k in self.keys), default=0)
+
+    def search(self, term, limit=3):
+        """ Up to `limit` (value, similarity) pairs at least min_similarity close to term, best first """
+        term = fuzzy_key(term)
+        shared = Counter()
+        for gram in trigrams(term):
+            shared.update(self.postings.get(gram, ()))
+        scored = []
+        for value_id, _ in shared.most_common(limit * 10):
+            similarity = SequenceMatcher(None, term, self.keys[value_id]).ratio()
+            if similarity >= self.min_similarity:
+                scored.append((self.values[value_id], similarity))
+        scored.sort(key=lambda item: -item[1])
+        return scored[:limit]
+
+    def find(self, text, skip_words=frozenset(), min_length=4):
+        """
+        Values mentioned in free text, typos allowed ("toyta camri" -> toyota, camry)
+
+        Every run of up to max_words words is looked up; the best matches
+        are kept without overlapping. Runs made only of skip_words, or
+        shorter than min_length characters, are never looked up.
+        """
+        words = re.findall(r"[a-z0-9]+(?:[.+'][a-z0-9]+)*", fuzzy_key(text))
+        candidates = []
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + self.max_words, len(words)) + 1):
+                span = words[start:end]
+                term = ' '.join(span)
+                if len(term) < min_length or all(word in skip_words for word in span):
+                    continue
+                for value, similarity in self.search(term, limit=1):
+                    candidates.append((similarity, end - start, start, end, value))
+
+        found, taken = [], set()
+        for similarity, _, start, end, value in sorted(candidates, key=lambda c: (-c[0], -c[1], c[2])):
+            if taken.isdisjoint(range(start, end)) and value not in found:
+                taken.update(range(start, end))
+                found.append(value)
+        return found
+
+
+def find_mentions(matcher, fuzzy, text, skip_words=frozenset()):
+    """
+    Values mentioned in text: exact matches of an AhoCorasick matcher first,
+    then misspelled ones among the remaining words from its TrigramIndex
+    """
+    text = text.lower()
+    exact = matcher.find(text)
+    # Exact mentions are cut out so that only the leftover words are matched by trigrams
+    rest = text
+    for value in exact:
+        rest = rest.replace(value, ' ')
+    return exact + [value for value in fuzzy.find(rest, skip_words) if value not in exact]
@@ -0,0 +1,210 @@
+"""
+Offline BM25 retrieval over vehicle descriptions, types and features
+
+Queries like "rugged off-road" or "executive commuter" are answered from
+the text of the inventory itself, with no network or model dependency.
+Rows sharing the same description, type and feature set are indexed once
+as one document, so the index stays small for feeds with many copies of
+the same vehicle.
+"""
+import re
+import numpy as np
+import pandas as pd
+from ranking import top_k
+from text_match import TrigramIndex
+
+# Fields whose text is searched
+TEXT_FIELDS = ('description', 'type', 'features')
+
+# Words too common in questions and descriptions to carry meaning
+STOPWORDS = frozenset("""
+    a an and any are as at be by for from has have i in is it its looking me my of on or our something
+    that the their to us want we with you your
+""".split())
+
+
+def tokenize(text):
+    """
+    Lowercased terms of text, without stopwords and with plural "s" dropped
+
+    Hyphenated words also yield their joined form, so "off-road" matches
+    "offroad" as well as "off road".
+    """
+    terms = []
+    for word in re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", str(text).lower()):
+        parts = word.split('-')
+        if len(parts) > 1:
+            parts.append(''.join(parts))
+        for part in parts:
+            if part in STOPWORDS:
+                continue
+            if len(part) > 3 and part.endswith('s') and not part.endswith('ss'):
+                part = part[:-1]
+            terms.append(part)
+    return terms
+
+
+def _expand(offsets, values, keys):
+    """ (index into keys, value) pairs of the CSR rows `keys` of (offsets, values) """
+    starts, ends = offsets[keys], offsets[keys + 1]
+    lengths = ends - starts
+    owners = np.repeat(np.arange(len(keys)), lengths)
+    # Position of every item: its row start plus its rank within the row
+    ranks = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owners, values[np.repeat(starts, lengths) + ranks]
+
+
+def _documents(inventory, term_ids):
+    """
+    (doc, term, term frequency) triples of the distinct documents, the
+    document of every row and the number of rows per document; term ids
+    are assigned in term_ids
+    """
+    frame, features = inventory.frame, inventory.lists['features']
+    # Descriptions are mostly unique strings, so they are decoded and factorized here rather than stored as codes
+    description_codes, descriptions = pd.factorize(inventory.strings['description'].to_numpy())
+    vehicle_type = frame['type'].cat
+
+    # Rows with equal description, type and feature multiset share a document; the
+    # feature multiset is identified by two 64-bit sums of random per-feature values
+    rng = np.random.default_rng(0)
+    hashes = []
+    for _ in range(2):
+        salts = rng.integers(0, 2**63, size=len(features.vocabulary) + 1, dtype=np.uint64)
+        sums = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(salts[features.codes], dtype=np.uint64)])
+        hashes.append(sums[features.offsets[1:]] - sums[features.offsets[:-1]])
+    keys = np.column_stack([
+        description_codes.astype(np.uint64),
+        vehicle_type.codes.to_numpy().astype(np.uint64),
+        *hashes,
+    ])
+    _, first_rows, doc_of_row, row_counts = np.unique(
+        np.ascontiguousarray(keys).view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel(),
+        return_index=True, return_inverse=True, return_counts=True,
+    )
+
+    # Term lists of the distinct strings of each field, as CSR arrays
+    def encode(strings):
+        offsets, ids = [0], []
+        for value in strings:
+            ids.extend(term_ids.setdefault(term, len(term_ids)) for term in tokenize(value))
+            offsets.append(len(ids))
+        return np.array(offsets, dtype=np.int64), np.array(ids, dtype=np.int64)
+
+    pairs = []
+    for codes, categories in ((description_codes, descriptions),
+                              (vehicle_type.codes.to_numpy(), vehicle_type.categories)):
+        offsets, ids = encode(categories)
+        doc_codes = codes[first_rows].astype(np.int64)
+        present = np.flatnonzero(doc_codes >= 0)
+        owners, doc_terms = _expand(offsets, ids, doc_codes[present])
+        pairs.append((present[owners], doc_terms))
+    offsets, ids = encode(features.vocabulary)
+    item_docs, items = _expand(features.offsets, features.codes.astype(np.int64), first_rows)
+    owners, doc_terms = _expand(offsets, ids, items)
+    pairs.append((item_docs[owners], doc_terms))
+
+    docs = np.concatenate([p[0] for p in pairs]).astype(np.int64)
+    terms = np.concatenate([p[1] for p in pairs]).astype(np.int64)
+    keys, tf = np.unique(docs * max(len(term_ids), 1) + terms, return_counts=True)
+    return (keys // max(len(term_ids), 1), keys % max(len(term_ids), 1), tf.astype(np.float64),
+            doc_of_row.reshape(-1), row_counts)
+
+
+def _corpus(rows, term_ids, docs, terms, doc_length, row_counts):
+    # Corpus statistics count rows, not distinct documents
+    df = np.bincount(terms, weights=row_counts[docs], minlength=len(term_ids))
+    return {
+        "rows": rows,
+        "avgdl": float((doc_length * row_counts).sum() / max(rows, 1)),
+        "df": dict(zip(term_ids, df.tolist())),
+    }
+
+
+def corpus_stats(inventory):
+    """ BM25Index(inventory).corpus without building the postings, e.g. for one shard """
+    term_ids = {}
+    docs, terms, tf, _, row_counts = _documents(inventory, term_ids)
+    doc_length = np.bincount(docs, weights=tf, minlength=len(row_counts))
+    return _corpus(len(inventory), term_ids, docs, terms, doc_length, row_counts)
+
+
+def merge_corpus_stats(parts):
+    """ Corpus statistics of the union of disjoint inventories, from the statistics of each """
+    rows = sum(part["rows"] for part in parts)
+    df = {}
+    for part in parts:
+        for term, count in part["df"].items():
+            df[term] = df.get(term, 0) + count
+    return {
+        "rows": rows,
+        "avgdl": sum(part["avgdl"] * part["rows"] for part in parts) / max(rows, 1),
+        "df": df,
+    }
+
+
+class BM25Index:
+    """
+    BM25 over description + type + features of every vehicle
+
+    Features:
+    - Identical documents (same description, type and feature set) indexed once
+    - Term postings stored as CSR arrays with precomputed BM25 weights
+    - One scatter-add per query term, then a vectorized top-k
+    - Optional corpus statistics from a larger inventory, so shard scores are comparable
+    - Typo fallback for query terms missing from the vocabulary
+    """
+
+    def __init__(self, inventory, stats=None, k1=1.2, b=0.75):
+        self.terms = {}                         # term -> term id
+        self.stats = stats                      # Shared corpus statistics, None when this inventory's own are used
+        docs, terms, tf, self.doc_of_row, row_counts = _documents(inventory, self.terms)
+        self.doc_count = len(row_counts)
+        doc_length = np.bincount(docs, weights=tf, minlength=self.doc_count)
+        self.corpus = _corpus(len(inventory), self.terms, docs, terms, doc_length, row_counts)
+        corpus = stats or self.corpus
+        df = np.array([corpus["df"].get(term, 0) for term in self.terms], dtype=np.float64)
+        idf = np.log1p((corpus["rows"] - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_length / max(corpus["avgdl"], 1e-9))
+        weights = idf[terms] * tf * (k1 + 1) / (tf + norm[docs])
+
+        # Postings grouped by term: docs/weights of term t are postings[indptr[t]:indptr[t + 1]]
+        order = np.argsort(terms, kind='stable')
+        self.indptr = np.searchsorted(terms[order], np.arange(len(self.terms) + 1)).astype(np.int64)
+        self.postings = docs[order].astype(np.int32)
+        self.weights = weights[order].astype(np.float32)
+        self.fuzzy = TrigramIndex(self.terms)
+
+    def query_terms(self, query):
+        """ Term ids of a query; unknown terms are replaced by the closest indexed term """
+        ids = []
+        for term in dict.fromkeys(tokenize(query)):
+            if term not in self.terms and len(term) >= 4:
+                match = self.fuzzy.search(term, limit=1)
+                term = match[0][0] if match else term
+            if term in self.terms and self.terms[term] not in ids:
+                ids.append(self.terms[term])
+        return ids
+
+    def scores(self, query):
+        """ BM25 score of every distinct document """
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in self.query_terms(query):
+            start, end = self.indptr[term], self.indptr[term + 1]
+            # A term occurs at most once per document, so a plain fancy-index add is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+        return scores
+
+    def top(self, query, positions, k=10):
+        """ (row positions, scores) of the k best matches among `positions`, best first, and the match count """
+        scores = self.scores(query)[self.doc_of_row[positions]]
+        matched = np.flatnonzero(scores > 0)
+        best = matched[top_k(scores[matched], k)]
+        return positions[best], scores[best], len(matched)
+
+
+# Usage example:
+# from inventory_cache import inventory_cache
+# index = inventory_cache.get_index()
+# positions, scores, total = index.text_index.top("rugged off-road", index.in_stock_positions, k=5)
+# print(index.frame.iloc[positions][['make', 'model', 'description']])
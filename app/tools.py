@@ -1,141 +1,257 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 from agents import function_tool
 from inventory_cache import inventory_cache
+from inventory_schema import INVENTORY_SCHEMA
+from inventory_shards import inventory_shards
+from inventory_sqlite import inventory_sqlite
+import inventory_search
+from result_cache import ResultCache
+from result_format import (DEFAULT_COLUMNS, DEFAULT_ROW_LIMIT, MAX_ROW_LIMIT, empty_result, format_results,
+                           format_table, page_bounds, project_columns)
 from agents import Runner
-import asyncio
-import re
-from functools import reduce
-import operator
+from error_handling import fan_out
 
 os.makedirs('data', exist_ok=True)
 
-@function_tool
-def search_vehicles_by_budget(max_budget: int, min_budget: int = 0) -> List[Dict]:
-    """Searches Vehicles by Asked Budget Range"""
-    
-    cached_df = inventory_cache.get_inventory()
-    if cached_df is None or cached_df.empty:
+# Version of the inventory the search tools read: the SQLite database, the shards or the in-memory cache
+inventory_version = (inventory_sqlite.get_version if inventory_sqlite else
+                     inventory_shards.get_version if inventory_shards else inventory_cache.get_version)
+
+# Shared by the search tools; entries are dropped whenever the inventory version changes
+tool_result_cache = ResultCache(
+    version=inventory_version,
+    maxsize=int(os.getenv('TOOL_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('TOOL_CACHE_TTL')) if os.getenv('TOOL_CACHE_TTL') else None,
+)
+
+
+def _search(search, args, columns, limit, offset):
+    """ Run an inventory_search filter (in SQLite, or scattered to the shards, when enabled) and format one page """
+    if inventory_sqlite is not None:
+        columns = project_columns(columns, list(INVENTORY_SCHEMA))
+        limit, offset = page_bounds(limit, offset)
+        total, records = inventory_sqlite.search(search, args, columns, limit, offset)
+        return format_table(records, columns, total, offset)
+
+    if inventory_shards is not None:
+        columns = project_columns(columns, list(INVENTORY_SCHEMA))
+        limit, offset = page_bounds(limit, offset)
+        total, records = inventory_shards.search(search, args, columns, window=offset + limit)
+        return format_table(records[offset:], columns, total, offset)
+
+    index = inventory_cache.get_index()
+    if index is None or index.frame.empty:
         print("No inventory available.")
-        return []
-
-    filtered = cached_df[
-        (cached_df['price'] >= min_budget) &
-        (cached_df['price'] <= max_budget) &
-        (cached_df['availability'] == 'in_stock')
-    ]
-    return filtered.to_dict('records')
+        return empty_result(columns)
+    return format_results(index.inventory, getattr(inventory_search, search)(index, *args), columns, limit, offset)
 
 
 @function_tool
-def search_vehicles_by_type(vehicle_types: List[str]) -> List[Dict]:
-    """Searches Vehicles by Asked Vehicle Type"""
-
-    cached_df = inventory_cache.get_inventory()
-    if cached_df is None or cached_df.empty:
-        print("No inventory available.")
-        return []
+@tool_result_cache.cached
+def search_vehicles_by_budget(max_budget: int, min_budget: int = 0,
+        columns: Optional[List[str]] = None, limit: int = DEFAULT_ROW_LIMIT, offset: int = 0) -> Dict:
+    """Searches Vehicles by Asked Budget Range
+
+    Args:
+        max_budget: Highest price in dollars.
+        min_budget: Lowest price in dollars.
+        columns: Fields to return; defaults to every field except the description.
+        limit: Maximum number of vehicles to return (results are paged).
+        offset: Index of the first vehicle to return, for fetching the next page.
+
+    Returns a table {"columns", "rows"} plus total_matches, the full number of matches.
+    """
 
-    types_lower = [t.lower() for t in vehicle_types]
-    filtered = cached_df[
-        (cached_df['type'].str.lower().isin(types_lower) |
-         cached_df['category'].str.lower().isin(types_lower)) &
-        (cached_df['availability'] == 'in_stock')
-    ]
-    return filtered.to_dict('records')
+    return _search('by_budget', (min_budget, max_budget), columns, limit, offset)
 
 
 @function_tool
-def search_vehicles_by_features(required_features: List[str]) -> List[Dict]:   
-    """Searches Vehicles by Asked Features"""
+@tool_result_cache.cached(normalized=('vehicle_types',))
+def search_vehicles_by_type(vehicle_types: List[str],
+        columns: Optional[List[str]] = None, limit: int = DEFAULT_ROW_LIMIT, offset: int = 0) -> Dict:
+    """Searches Vehicles by Asked Vehicle Type
+
+    Args:
+        vehicle_types: Vehicle types or categories, e.g. ["SUV", "Sedan"].
+        columns: Fields to return; defaults to every field except the description.
+        limit: Maximum number of vehicles to return (results are paged).
+        offset: Index of the first vehicle to return, for fetching the next page.
+
+    Returns a table {"columns", "rows"} plus total_matches, the full number of matches.
+    """
 
-    cached_df = inventory_cache.get_inventory()
-    if cached_df is None or cached_df.empty:
-        print("No inventory available.")
-        return []
+    return _search('by_type', (vehicle_types,), columns, limit, offset)
 
-    def has_features(vehicle_features, required):
-        vehicle_features_lower = [f.lower() for f in vehicle_features]
-        required_lower = [f.lower() for f in required]
-        feature_text = ' '.join(vehicle_features_lower)
-        return any(req in feature_text for req in required_lower)
 
-    filtered = cached_df[
-        cached_df['features'].apply(
-            lambda x: has_features(x, required_features)
-        ) &
-        (cached_df['availability'] == 'in_stock')
-    ]
-    return filtered.to_dict('records')
+@function_tool
+@tool_result_cache.cached(normalized=('required_features', 'match'))
+def search_vehicles_by_features(required_features: List[str], match: str = "any",
+        columns: Optional[List[str]] = None, limit: int = DEFAULT_ROW_LIMIT, offset: int = 0) -> Dict:
+    """Searches Vehicles by Asked Features
+
+    Args:
+        required_features: Features to look for, e.g. ["sunroof", "leather seats"]; misspellings are
+            matched to the closest known feature.
+        match: "any" returns vehicles with at least one feature, "all" only vehicles with every feature.
+        columns: Fields to return; defaults to every field except the description.
+        limit: Maximum number of vehicles to return (results are paged).
+        offset: Index of the first vehicle to return, for fetching the next page.
+
+    Returns a table {"columns", "rows"} plus total_matches, the full number of matches.
+    """
+
+    return _search('by_features', (required_features, match), columns, limit, offset)
 
 
 @function_tool
-def search_vehicles_by_fuel_type(fuel_types: List[str]) -> List[Dict]:   
-    """Searches Vehicles by Asked Fuel Type"""
+@tool_result_cache.cached(normalized=('fuel_types',))
+def search_vehicles_by_fuel_type(fuel_types: List[str],
+        columns: Optional[List[str]] = None, limit: int = DEFAULT_ROW_LIMIT, offset: int = 0) -> Dict:
+    """Searches Vehicles by Asked Fuel Type
+
+    Args:
+        fuel_types: Fuel types, e.g. ["Electric", "Hybrid"].
+        columns: Fields to return; defaults to every field except the description.
+        limit: Maximum number of vehicles to return (results are paged).
+        offset: Index of the first vehicle to return, for fetching the next page.
+
+    Returns a table {"columns", "rows"} plus total_matches, the full number of matches.
+    """
 
-    cached_df = inventory_cache.get_inventory()
-    if cached_df is None or cached_df.empty:
-        print("No inventory available.")
-        return []
-    
-    types_lower = [t.lower() for t in fuel_types]
-    filtered = cached_df[
-        (cached_df['fuel_type'].str.lower().isin(types_lower)) &
-        (cached_df['availability'] == 'in_stock')
-    ]
-    return filtered.to_dict('records')
+    return _search('by_fuel_type', (fuel_types,), columns, limit, offset)
 
 
 @function_tool
-async def optimized_multi_agent_query(user_query: str) -> List[Dict]:
+@tool_result_cache.cached(normalized=('profile', 'vehicle_types', 'fuel_types'))
+def rank_vehicles(profile: str, max_budget: Optional[int] = None, min_budget: int = 0,
+        vehicle_types: Optional[List[str]] = None, fuel_types: Optional[List[str]] = None,
+        k: int = 5, columns: Optional[List[str]] = None) -> Dict:
+    """Ranks Vehicles for a Buyer Profile and Returns the Best Matches
+
+    Args:
+        profile: One of "budget" (value for money), "family" (safety and space),
+            "luxury" (premium vehicles) or "eco" (fuel efficiency).
+        max_budget: Optional highest price in dollars.
+        min_budget: Lowest price in dollars.
+        vehicle_types: Optional vehicle types or categories to rank within, e.g. ["SUV"].
+        fuel_types: Optional fuel types to rank within, e.g. ["Hybrid"].
+        k: Number of vehicles to return, best first.
+        columns: Fields to return; defaults to every field except the description.
+
+    Returns a table {"columns", "rows"} ordered by score, best first, with a score column.
     """
-    Optimized query processing with parallel agent execution
 
-    Performance Benefits:
-    - Concurrent specialist agent execution
-    - Reduced total response time
-    - Efficient resource utilization
-    - Improved user experience
+    k = max(1, min(k, MAX_ROW_LIMIT))
+    return _scored_search('ranked', (profile, max_budget, min_budget, vehicle_types, fuel_types, k), columns, k)
+
+
+@function_tool
+@tool_result_cache.cached
+def search_vehicles_by_description(query: str, k: int = 10, columns: Optional[List[str]] = None) -> Dict:
+    """Finds Vehicles Whose Description, Type or Features Match a Free-Text Request
+
+    Args:
+        query: What the customer is looking for in their own words, e.g. "rugged off-road"
+            or "executive commuter with advanced tech".
+        k: Number of vehicles to return, best match first.
+        columns: Fields to return; defaults to every field including the description.
+
+    Returns a table {"columns", "rows"} ordered by relevance, best first, with a score column;
+    total_matches counts every in-stock vehicle matching at least one word.
     """
 
-    from vehicle_agents import budget_specialist, family_specialist, luxury_specialist, eco_specialist    
+    k = max(1, min(k, MAX_ROW_LIMIT))
+    return _scored_search('by_text', (query, k), columns or DEFAULT_COLUMNS + ['description'], k)
 
 
-    # Analyze query to determine relevant specialists
-    relevant_specialists = analyze_query_requirements(user_query)
+def _scored_search(search, args, columns, k):
+    """ Run a scored inventory_search ('ranked', 'by_text') on the active backend: best k first, with a score column """
+    if inventory_sqlite is not None or inventory_shards is not None:
+        columns = project_columns(columns, list(INVENTORY_SCHEMA) + ['score'])
+        if 'score' not in columns:
+            columns.append('score')
+        if inventory_sqlite is not None:
+            total, records = inventory_sqlite.search(search, args, columns, limit=k)
+        else:
+            total, records = inventory_shards.search(search, args, columns, window=k)
+    else:
+        index = inventory_cache.get_index()
+        if index is None or index.frame.empty:
+            print("No inventory available.")
+            return empty_result(columns)
+        frame, total = getattr(inventory_search, search)(index, *args)
+        columns = list(columns or DEFAULT_COLUMNS)
+        columns = project_columns(columns + ['score'] * ('score' not in columns),
+                                  index.inventory.column_names(frame))
+        records = index.inventory.to_records(frame, columns=columns)
 
-    # Create concurrent tasks for relevant specialists
-    specialist_tasks = []
+    result = format_table(records, columns, len(records))
+    result["total_matches"] = total
+    return result
 
-    if 'budget' in relevant_specialists:
-        specialist_tasks.append(
-            Runner.run(budget_specialist, user_query)
-        )
 
-    if 'family' in relevant_specialists:
-        specialist_tasks.append(
-            Runner.run(family_specialist, user_query)
-        )
+# Specialist fan-out: per-specialist timeout and overall deadline. Every selected specialist is awaited
+# until the deadline; FAN_OUT_MIN_ANSWERS (unset by default) trades the remaining ones for latency
+SPECIALIST_TIMEOUT = float(os.getenv('SPECIALIST_TIMEOUT', '20'))
+FAN_OUT_DEADLINE = float(os.getenv('FAN_OUT_DEADLINE', '25'))
+_min_answers = os.getenv('FAN_OUT_MIN_ANSWERS')
+FAN_OUT_MIN_ANSWERS = int(_min_answers) if _min_answers else None
 
-    if 'luxury' in relevant_specialists:
-        specialist_tasks.append(
-            Runner.run(luxury_specialist, user_query)
-        )
 
-    if 'eco' in relevant_specialists:
-        specialist_tasks.append(
-            Runner.run(eco_specialist, user_query)
-        )
+@function_tool
+async def optimized_multi_agent_query(user_query: str) -> Dict:
+    """
+    Optimized query processing with parallel agent execution
 
-    # Execute all relevant specialists concurrently
-    specialist_results = await asyncio.gather(*specialist_tasks)    
+    Performance Benefits:
+    - Concurrent specialist agent execution
+    - Per-specialist timeouts and an overall deadline; specialists still running then are cancelled
+    - Partial results only when the deadline is reached, never while a selected specialist can still answer
+    - One failing specialist never fails the others
+
+    Returns {"answers": [{"specialist", "output", "seconds"}], "missing":
+    [{"specialist", "status", "seconds"}], "complete", "seconds"}; when
+    complete is false, only the specialists listed in answers responded.
+    When the query selects no specialist, none is asked and the result is
+    incomplete with reason "no specialist matched".
+    """
 
-    # Synthesize results from multiple specialists
-    # final_recommendation = (
-    #     specialist_results, user_query
-    # )
+    from vehicle_agents import budget_specialist, family_specialist, luxury_specialist, eco_specialist
+    specialists = {
+        'budget': budget_specialist,
+        'family': family_specialist,
+        'luxury': luxury_specialist,
+        'eco': eco_specialist,
+    }
 
-    return specialist_results
+    # Analyze query to determine relevant specialists; no match asks none of them
+    relevant_specialists = analyze_query_requirements(user_query)
+    if not relevant_specialists:
+        print("Specialists: none matched the query")
+        return {"answers": [], "missing": [], "complete": False, "reason": "no specialist matched", "seconds": 0.0}
+
+    outcomes = await fan_out(
+        {name: Runner.run(specialists[name], user_query) for name in relevant_specialists},
+        min_complete=FAN_OUT_MIN_ANSWERS, timeout=SPECIALIST_TIMEOUT, deadline=FAN_OUT_DEADLINE,
+    )
+
+    answers, missing = [], []
+    for name, outcome in outcomes.items():
+        seconds = round(outcome["seconds"], 3)
+        if outcome["status"] == "ok":
+            answers.append({"specialist": name, "output": outcome["result"].final_output, "seconds": seconds})
+        else:
+            missing.append({"specialist": name, "status": outcome["status"], "seconds": seconds,
+                            **({"error": outcome["error"]} if "error" in outcome else {})})
+    print(f"Specialists: {[a['specialist'] for a in answers]} answered, "
+          f"{[(m['specialist'], m['status']) for m in missing]} missing")
+    return {
+        "answers": answers,
+        "missing": missing,
+        "complete": not missing,
+        "seconds": round(max((outcome["seconds"] for outcome in outcomes.values()), default=0.0), 3),
+    }
 
 
 def analyze_query_requirements(query):
@@ -172,80 +288,23 @@ def analyze_query_requirements(query):
 
 
 @function_tool
-def inventory_tools(query: str) -> List[Dict]:
+@tool_result_cache.cached
+def inventory_tools(query: str,
+        columns: Optional[List[str]] = None, limit: int = DEFAULT_ROW_LIMIT, offset: int = 0) -> Dict:
     """
     General inventory tool to handle a wide range of inventory-related questions.
 
     Attempts to match the query to inventory attributes such as make, model, year,
-    color, transmission, mileage, and more. Returns matching vehicles.
-    """
-    cached_df = inventory_cache.get_inventory()
-    if cached_df is None or cached_df.empty:
-        print("No inventory available.")
-        return []
+    color, transmission, mileage, and more. Misspelled makes and models are
+    matched to the closest ones in the inventory. Returns matching vehicles.
 
-    query_lower = query.lower()
-    filters = []
-
-    # Example: simple keyword-based matching for common attributes
-    if any(word in query_lower for word in ['red', 'blue', 'black', 'white', 'silver']):
-        for color in ['red', 'blue', 'black', 'white', 'silver']:
-            if color in query_lower:
-                filters.append(cached_df['colors_available'].apply(lambda x: color in [c.lower() for c in x]))
-
-    # Price/budget (e.g., "under $30000", "below 25000", "max 40000")
-    price_match = re.search(r'(under|below|max)\s*\$?(\d{4,6})', query_lower)
-    if price_match:
-        max_price = int(price_match.group(2))
-        filters.append(cached_df['price'] <= max_price)
-    else:
-        price_match = re.search(r'\$?(\d{4,6})\s*(or less|or below|and below|and less)', query_lower)
-        if price_match:
-            max_price = int(price_match.group(1))
-            filters.append(cached_df['price'] <= max_price)
-
-
-    # Year extraction (e.g., "2020 model")
-    year_matches = re.findall(r'\b(20[0-4][0-9]|19[8-9][0-9])\b', query_lower)
-    if year_matches:
-        years = [int(y) for y in year_matches]
-        filters.append(cached_df['year'].isin(years))
-
-    # Make/model matching (example: "Toyota", "Camry")
-    for col in ['make', 'model']:
-        for val in cached_df[col].dropna().unique():
-            if str(val).lower() in query_lower:
-                filters.append(cached_df[col].str.lower() == str(val).lower())
-
-    # Only show in-stock vehicles
-    filters.append(cached_df['availability'] == 'in_stock')
-
-    # Fuel type
-    for fuel in ['electric', 'hybrid', 'gasoline', 'plug-in hybrid']:
-        if fuel in query_lower:
-            filters.append(cached_df['fuel_type'].str.lower() == fuel)
-
-    # Drivetrain
-    for drive in ['awd', 'fwd', 'rwd', '4wd']:
-        if drive in query_lower:
-            filters.append(cached_df['drivetrain'].str.lower() == drive)
-
-    # Seating capacity (e.g., "7-seater", "5 seats")
-    seat_match = re.search(r'(\d{1,2})\s*[- ]?(seater|seats|seat)', query_lower)
-    if seat_match:
-        seats = int(seat_match.group(1))
-        filters.append(cached_df['seating_capacity'] == seats)
-
-    # Safety rating (e.g., "5-star safety rating")
-    safety_match = re.search(r'(\d)\s*[- ]?star', query_lower)
-    if safety_match:
-        rating = int(safety_match.group(1))
-        filters.append(cached_df['safety_rating'] == rating)
-
-    if filters:
-        mask = reduce(operator.and_, filters)
-        filtered = cached_df[mask]
-    else:
-        filtered = cached_df[cached_df['availability'] == 'in_stock']
+    Args:
+        query: The customer's question in plain language.
+        columns: Fields to return; defaults to every field except the description.
+        limit: Maximum number of vehicles to return (results are paged).
+        offset: Index of the first vehicle to return, for fetching the next page.
+
+    Returns a table {"columns", "rows"} plus total_matches, the full number of matches.
+    """
 
-    return filtered.to_dict('records')
\ No newline at end of file
+    return _search('by_query', (query,), columns, limit, offset)
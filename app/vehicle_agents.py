@@ -1,11 +1,13 @@
 from agents import Agent
-from tools import search_vehicles_by_budget, search_vehicles_by_type, search_vehicles_by_features, search_vehicles_by_fuel_type, optimized_multi_agent_query, inventory_tools
+from tools import search_vehicles_by_budget, search_vehicles_by_type, search_vehicles_by_features, search_vehicles_by_fuel_type, search_vehicles_by_description, rank_vehicles, optimized_multi_agent_query, inventory_tools
 
 vehicle_tools = [
     search_vehicles_by_budget,
     search_vehicles_by_type,
     search_vehicles_by_features,
     search_vehicles_by_fuel_type,
+    search_vehicles_by_description,
+    rank_vehicles,
     optimized_multi_agent_query,
     inventory_tools
 ]
@@ -25,6 +27,7 @@ budget_specialist = Agent(
 
         Behavioral Guidelines:
         - Always use vehicle_tools to find vehicles within budget
+        - Use rank_vehicles with profile "budget" for a pre-ranked shortlist
         - Provide specific vehicle recommendations with pricing details
         - Search vehicles category and suggest a budget-friendly vehicle
         - Explain value propositions clearly and quantitatively
@@ -63,6 +66,7 @@ family_specialist = Agent(
 
         Behavioral Guidelines:
         - Always use vehicle_tools to find family oriented vehicles
+        - Use rank_vehicles with profile "family" for a pre-ranked shortlist
         - Explain value propositions clearly and quantitatively
 
         Recommendation Strategy:
@@ -95,6 +99,7 @@ eco_specialist = Agent(
 
         Behavioral Guidelines:
         - Always use vehicle_tools to find vehicles with eco-friendly fuel types
+        - Use rank_vehicles with profile "eco" for a pre-ranked shortlist
         - Provide specific vehicle recommendations with environmental benefits
         - Explain sustainability concepts clearly and accessibly
         - Consider the full lifecycle impact of vehicles, not just emissions
@@ -126,6 +131,7 @@ luxury_specialist = Agent(
 
         Behavioral Guidelines:
         - Always use vehicle_tools to find vehicles by it's luxury features
+        - Use rank_vehicles with profile "luxury" for a pre-ranked shortlist
         - Provide specific vehicle recommendations with luxury features
         - Explain luxury concepts clearly and accessibly
         - Consider the full luxury experience, not just the vehicle
@@ -154,6 +160,8 @@ inventory_specialist = Agent(
         - Any inventory-wide statistics or summaries
         - You do NOT recommend vehicles for purchase, but provide factual inventory information.
         - If asked about inventory details, always use the inventory_tools to answer.
+        - Tool results are tables (columns + rows) holding one page of matches; use total_matches
+          for counts and pass offset=next_offset to fetch more rows when needed.
 
         Communication Style:
         - Factual and concise
@@ -206,6 +214,8 @@ vehicle_recommendation_agent = Agent(
         Use this tool whenever a user query could benefit from the expertise of multiple specialists (such as budget, family, luxury, or eco requirements),
         or when you are unsure which specialist is most relevant.
         This tool will analyze the query and automatically coordinate the appropriate specialist agents in parallel, returning a synthesized result.
+        Its result lists the specialists that answered; if it is not complete, build your answer from those and do not speak for the missing ones.
+        If its reason is "no specialist matched", no specialist was asked: answer with the search tools instead.
 
         You also have access to an `inventory_specialist` tool. Use this tool whenever a user asks about inventory details, such as stock counts, available makes/models, or inventory-wide statistics.
 
@@ -221,6 +231,7 @@ vehicle_recommendation_agent = Agent(
         - Luxury/performance/technology interest Use luxury_specialist
         - Environmental/efficiency focus Use eco_specialist
         - Inventory/statistics queries Use inventory_specialist
+        - Lifestyle or usage descriptions ("rugged off-road", "executive commuter") Use search_vehicles_by_description
         - Complex queries Combine multiple specialists
 
         Quality Standards:
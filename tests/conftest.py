@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+# The app modules import each other by bare name (they run from app/), so tests do the same
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+
+@pytest.fixture(autouse=True)
+def _work_in_tmp_path(tmp_path, monkeypatch):
+    # generate_synthetic_inventory writes data/synthetic_inventory.json relative to the working directory
+    monkeypatch.chdir(tmp_path)
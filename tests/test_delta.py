@@ -0,0 +1,133 @@
+import json
+import numpy as np
+import pytest
+import inventory_search
+from inventory_cache import InventoryCache
+from inventory_index import InventoryIndex
+from inventory_schema import build_inventory
+from vehicle_inventory import generate_synthetic_inventory
+
+
+@pytest.fixture
+def records():
+    return generate_synthetic_inventory()
+
+
+@pytest.fixture
+def cache(tmp_path, records):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(records), encoding="utf-8")
+    cache = InventoryCache(str(path), refresh_mode='revalidate', use_snapshot=False)
+    cache.get_index()
+    return cache
+
+
+def _apply(records, upserts=(), deletes=()):
+    """ The inventory records a full reload would see after the delta """
+    by_id = {record["id"]: dict(record) for record in records}
+    for record in upserts:
+        by_id.setdefault(record["id"], {}).update(record)
+    for vehicle_id in deletes:
+        by_id.pop(vehicle_id, None)
+    return list(by_id.values())
+
+
+def _assert_same_results(index, expected_records):
+    expected = InventoryIndex(build_inventory(expected_records))
+
+    def ids(frame, of=index):
+        return sorted(of.inventory.ids(frame))
+
+    searches = [
+        (inventory_search.by_budget, (0, 35000)),
+        (inventory_search.by_budget, (30000, 60000)),
+        (inventory_search.by_type, (['SUV', 'family'],)),
+        (inventory_search.by_features, (['sunroof'],)),
+        (inventory_search.by_fuel_type, (['hybrid', 'electric'],)),
+        (inventory_search.by_query, ('red suv under $45000',)),
+    ]
+    for search, args in searches:
+        assert ids(search(index, *args)) == ids(search(expected, *args), expected), (search.__name__, args)
+    for profile in ('budget', 'family', 'luxury', 'eco'):
+        ranked, total = inventory_search.ranked(index, profile, k=len(expected_records))
+        expected_ranked, expected_total = inventory_search.ranked(expected, profile, k=len(expected_records))
+        assert total == expected_total
+        assert ids(ranked) == ids(expected_ranked, expected)
+    assert ids(index.in_stock) == ids(expected.in_stock, expected)
+
+
+def test_in_place_updates_match_full_reload(cache, records):
+    upserts = [
+        {"id": "V001", "stock_count": 2},
+        {"id": "V002", "price": 99000},
+        {"id": "V003", "availability": "sold_out"},
+        {"id": "V006", "price": 1000, "stock_count": 0},
+    ]
+    summary = cache.apply_delta(upserts)
+    assert not summary["rebuilt"]
+    assert summary["updated"] == 4
+    _assert_same_results(cache.get_index(), _apply(records, upserts))
+
+
+def test_delete_then_compact_matches_full_reload(cache, records):
+    deleted = [record["id"] for record in records[:4]]
+    summary = cache.apply_delta(deletes=deleted + ["unknown"])
+    assert summary["deleted"] == 4 and not summary["rebuilt"]
+    index = cache.get_index()
+    assert (index.positions_of(deleted) == -1).all()
+    _assert_same_results(index, _apply(records, deletes=deleted))
+
+    # Enough tombstones trigger a compaction that drops the deleted rows
+    more = [record["id"] for record in records[4:8]]
+    summary = cache.apply_delta(deletes=more)
+    assert summary["rebuilt"]
+    index = cache.get_index()
+    assert len(index) == len(records) - 8 and index.deleted_count == 0
+    _assert_same_results(index, _apply(records, deletes=deleted + more))
+
+
+def test_new_and_rewritten_vehicles_rebuild(cache, records):
+    new = dict(records[0], id="V999", make="Lotus", model="Eletre", price=90000, availability="in_stock")
+    upserts = [new, {"id": "V010", "features": ["Jetpack"]}]
+    summary = cache.apply_delta(upserts, deletes=["V011"])
+    assert summary["rebuilt"]
+    index = cache.get_index()
+    assert index.inventory.ids(inventory_search.by_features(index, ['jetpack'])) == ['V010']
+    _assert_same_results(index, _apply(records, upserts, deletes=["V011"]))
+
+
+def test_published_index_is_never_modified(cache):
+    before = cache.get_index()
+    prices = before.frame['price'].to_numpy().copy()
+    in_stock_ids = before.inventory.ids(before.in_stock)
+    price_positions = before.price_index.positions.copy()
+    scores = {profile: column.to_numpy().copy() for profile, column in before.ranker.profile_scores.items()}
+    ranked = before.ranker.positions.copy()
+    in_stock_bits = before.in_stock_bits.copy()
+
+    cache.apply_delta([{"id": "V001", "price": 1}, {"id": "V002", "availability": "sold_out"}], deletes=["V003"])
+    after = cache.get_index()
+
+    assert after is not before and after.version > before.version
+    assert (before.frame['price'].to_numpy() == prices).all()
+    assert before.inventory.ids(before.in_stock) == in_stock_ids
+    assert (before.price_index.positions == price_positions).all()
+    assert all((before.ranker.profile_scores[profile].to_numpy() == values).all() for profile, values in scores.items())
+    assert (before.ranker.positions == ranked).all()
+    assert (before.in_stock_bits == in_stock_bits).all()
+    assert not before.deleted.any()
+    assert after.frame['price'].iloc[0] == 1
+
+
+def test_price_removed_by_delta_leaves_budget_results(cache):
+    cache.apply_delta([{"id": "V001", "price": None}])
+    index = cache.get_index()
+    assert "V001" not in index.inventory.ids(inventory_search.by_budget(index, 0, 10 ** 9))
+    assert index.inventory.to_records(index.frame.iloc[[0]], columns=['id', 'price']) == [{"id": "V001", "price": None}]
+
+
+def test_delta_without_changes_keeps_version(cache):
+    version = cache.get_version()
+    cache.apply_delta(deletes=["unknown"])
+    assert cache.get_version() == version
+    assert np.array_equal(cache.get_index().in_stock_positions, cache.get_index().in_stock_positions)
@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+import inventory_cache as inventory_cache_module
+from inventory_cache import InventoryCache
+from vehicle_inventory import generate_synthetic_inventory
+
+
+def _cache(path, **kwargs):
+    return InventoryCache(str(path), refresh_mode='revalidate', check_interval=0, use_snapshot=False,
+                          stale_while_revalidate=False, **kwargs)
+
+
+def test_failed_refresh_backs_off_until_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "inventory.json"
+    path.write_text("[{broken", encoding="utf-8")
+    cache = _cache(path)
+    loads = []
+    load = cache._load_inventory
+    monkeypatch.setattr(cache, "_load_inventory", lambda: loads.append(1) or load())
+
+    fallback = cache.get_index()
+    assert len(fallback) > 0 and len(loads) == 1
+    for _ in range(5):
+        assert cache.get_index() is fallback
+    assert len(loads) == 1
+
+    records = generate_synthetic_inventory()[:3]
+    path.write_text(json.dumps(records), encoding="utf-8")
+    assert len(cache.get_index()) == 3 and len(loads) == 2
+
+
+def test_concurrent_readers_hash_a_touched_file_once(tmp_path, monkeypatch):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(generate_synthetic_inventory()[:5]), encoding="utf-8")
+    cache = _cache(path)
+    index = cache.get_index()
+
+    hashes = []
+    hash_file = inventory_cache_module._hash_file
+    monkeypatch.setattr(inventory_cache_module, "_hash_file", lambda p: hashes.append(p) or hash_file(p))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def read():
+        barrier.wait()
+        results.append(cache.get_index())
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Content unchanged: one hash in the single-flight refresh, no reload
+    assert len(hashes) == 1
+    assert all(result is index for result in results)
+    assert cache.stats["unchanged_checks"] == 1 and cache.stats["reloads"] == 1
+
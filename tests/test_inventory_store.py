@@ -0,0 +1,34 @@
+import numpy as np
+from inventory_schema import build_inventory, concat_inventories
+from inventory_store import load_snapshot, write_snapshot
+from vehicle_inventory import generate_synthetic_inventory
+
+
+def _records():
+    records = generate_synthetic_inventory()
+    records[1] = dict(records[1], description=None)
+    records[2] = dict(records[2], description="Škoda Enyaq — ünïcode ✓")
+    return records
+
+
+def test_snapshot_round_trip_keeps_strings(tmp_path):
+    inventory = build_inventory(_records())
+    write_snapshot(inventory, str(tmp_path / "inventory.snapshot"))
+    loaded = load_snapshot(str(tmp_path / "inventory.snapshot"))
+    assert loaded.to_records(loaded.frame) == inventory.to_records(inventory.frame)
+    # String columns stay as mapped bytes until a row is read
+    assert isinstance(loaded.strings['description'].data, np.memmap)
+    assert loaded.to_records(loaded.frame.iloc[[2, 1]], columns=['description']) == [
+        {"description": "Škoda Enyaq — ünïcode ✓"}, {"description": None}]
+
+
+def test_take_and_concat_keep_strings():
+    records = _records()
+    inventory = build_inventory(records)
+    taken = inventory.take(np.array([2, 1, 0]))
+    assert taken.ids(taken.frame) == ["V003", "V002", "V001"]
+    assert taken.strings['description'].to_numpy().tolist()[:2] == [records[2]["description"], None]
+    combined = concat_inventories(taken, build_inventory(records[3:5]))
+    assert combined.ids(combined.frame) == ["V003", "V002", "V001", "V004", "V005"]
+    expected = build_inventory([records[i] for i in (2, 1, 0, 3, 4)])
+    assert combined.to_records(combined.frame) == expected.to_records(expected.frame)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import pytest
+from inventory_schema import build_inventory
+from inventory_stream import iter_record_chunks, load_inventory_streaming
+from vehicle_inventory import generate_synthetic_inventory
+
+
+def _records(count=7):
+    records = generate_synthetic_inventory()[:count]
+    # Multi-byte characters, so small reads split them across read boundaries
+    records[0] = dict(records[0], description="Café-grade trim — naïve “quotes” 🚗 and ümlauts")
+    return records
+
+
+def _read_all(path, **kwargs):
+    return [record for chunk in iter_record_chunks(path, **kwargs) for record in chunk]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_json_array_any_read_size(tmp_path, read_size):
+    records = _records()
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding="utf-8")
+    assert _read_all(path, read_size=read_size) == records
+
+
+@pytest.mark.parametrize("read_size", [1, 5, 1 << 20])
+def test_json_lines(tmp_path, read_size):
+    records = _records()
+    path = tmp_path / "inventory.jsonl"
+    path.write_text('\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n', encoding="utf-8")
+    assert _read_all(path, read_size=read_size) == records
+
+
+def test_utf8_split_across_reads(tmp_path):
+    records = [{"id": "V1", "description": "🚗" * 50}]
+    path = tmp_path / "inventory.json"
+    path.write_bytes(json.dumps(records, ensure_ascii=False).encode("utf-8"))
+    # 4-byte characters with 3-byte reads: every character straddles a read boundary
+    assert _read_all(path, read_size=3) == records
+
+
+def test_chunk_size(tmp_path):
+    records = _records()
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(records), encoding="utf-8")
+    chunks = list(iter_record_chunks(path, chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+
+
+def test_empty_array(tmp_path):
+    path = tmp_path / "inventory.json"
+    path.write_text("[ ]", encoding="utf-8")
+    assert _read_all(path) == []
+
+
+@pytest.mark.parametrize("read_size", [4, 1 << 20])
+def test_truncated_input_raises(tmp_path, read_size):
+    text = json.dumps(_records())
+    path = tmp_path / "inventory.json"
+    # Cut inside the last record
+    path.write_text(text[:text.rindex('"make"')], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        _read_all(path, read_size=read_size)
+
+
+def test_digest_covers_whole_file(tmp_path):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(_records()) + "\n\n", encoding="utf-8")
+    digest = hashlib.blake2b(digest_size=16)
+    _read_all(path, read_size=16, digest=digest)
+    assert digest.hexdigest() == hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def test_streaming_load_matches_full_parse(tmp_path):
+    records = _records(25)
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(records), encoding="utf-8")
+    inventory, source = load_inventory_streaming(path, chunk_size=4)
+    expected = build_inventory(records)
+    assert inventory.to_records(inventory.frame) == expected.to_records(expected.frame)
+    assert source["size"] == path.stat().st_size
@@ -0,0 +1,66 @@
+import pytest
+from inventory_index import InventoryIndex
+from inventory_schema import build_inventory
+from response_cache import ResponseCache
+from vehicle_inventory import generate_synthetic_inventory
+
+QUESTION = "I need a reliable family SUV under $40,000 with good safety ratings."
+
+
+@pytest.fixture
+def index():
+    return InventoryIndex(build_inventory(generate_synthetic_inventory()))
+
+
+@pytest.fixture
+def cache(index):
+    cache = ResponseCache(version=lambda: index.version, index=lambda: index)
+    cache.put(QUESTION, "SUV answer", seconds=10.0)
+    return cache
+
+
+@pytest.mark.parametrize("question", [
+    "I need a reliable family SUV under $40,000 with good safety ratings",
+    "i need a reliable family SUVs under 40k with good safety rating",
+    "Please, I need a reliable family SUV under 40,000 with good safety ratings!",
+])
+def test_near_identical_wording_hits(cache, question):
+    assert cache.get(question) == (True, "SUV answer")
+
+
+@pytest.mark.parametrize("question", [
+    "I need a reliable family sedan under $40,000 with good safety ratings.",
+    "I need a reliable family minivan under $40,000 with good safety ratings.",
+    "I need a reliable luxury SUV under $40,000 with good safety ratings.",
+    "I need a reliable family SUV under $30,000 with good safety ratings.",
+    "I need a reliable family SUV over $40,000 with good safety ratings.",
+    "I need a reliable family Toyota SUV under $40,000 with good safety ratings.",
+    "I need a reliable red family SUV under $40,000 with good safety ratings.",
+    "I need a reliable hybrid family SUV under $40,000 with good safety ratings.",
+    "I need a reliable family SUV under $40,000 with good safety ratings and a sunroof.",
+])
+def test_different_constraints_miss(cache, question):
+    assert cache.get(question) == (False, None)
+    assert cache.stats()["misses"] == 1
+
+
+def test_new_inventory_version_drops_answers(index, cache):
+    index.version += 1
+    assert cache.get(QUESTION) == (False, None)
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["size"] == 0
+
+
+def test_without_index_numbers_and_comparisons_still_gate():
+    cache = ResponseCache(version=lambda: 1)
+    cache.put("Show me Toyota cars under $30k", "Toyota answer")
+    assert cache.get("show me toyota vehicles under 30000") == (True, "Toyota answer")
+    assert cache.get("Show me Toyota cars under $40k") == (False, None)
+    assert cache.get("Show me Toyota cars over $30k") == (False, None)
+
+
+def test_without_index_every_word_must_match():
+    cache = ResponseCache(version=lambda: 1)
+    cache.put(QUESTION, "SUV answer")
+    assert cache.get("i need a reliable family SUVs under 40k with good safety rating") == (True, "SUV answer")
+    assert cache.get("I need a reliable family sedan under $40,000 with good safety ratings.") == (False, None)
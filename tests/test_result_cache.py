@@ -0,0 +1,39 @@
+from result_cache import ResultCache
+
+
+def _counting_cache():
+    cache = ResultCache(version=lambda: 1)
+    calls = []
+
+    @cache.cached(normalized=('vehicle_types',))
+    def search(vehicle_types, columns=None):
+        calls.append((vehicle_types, columns))
+        return {"columns": list(columns or []), "rows": [[len(calls)]]}
+
+    return cache, search, calls
+
+
+def test_filters_are_normalized():
+    _, search, calls = _counting_cache()
+    first = search(['SUV', 'Sedan'], columns=['make'])
+    assert search(['sedan', ' suv ', 'SUV'], columns=['make']) == first
+    assert len(calls) == 1
+
+
+def test_columns_keep_their_order_and_case():
+    _, search, calls = _counting_cache()
+    assert search(['SUV'], columns=['price', 'make'])["columns"] == ['price', 'make']
+    assert search(['SUV'], columns=['make', 'price'])["columns"] == ['make', 'price']
+    search(['SUV'], columns=['Make', 'price'])
+    assert len(calls) == 3
+
+
+def test_callers_get_independent_copies():
+    cache, search, calls = _counting_cache()
+    result = search(['SUV'], columns=['make'])
+    result["rows"].append(["changed"])
+    again = search(['SUV'], columns=['make'])
+    assert again["rows"] == [[1]] and len(calls) == 1
+    again["columns"].clear()
+    assert search(['SUV'], columns=['make'])["columns"] == ['make']
+    assert cache.stats()["hits"] == 2
@@ -0,0 +1,65 @@
+import json
+import pytest
+import inventory_search
+from inventory_cache import InventoryCache
+from inventory_shards import ShardedInventory
+from inventory_store import convert
+from vehicle_inventory import generate_synthetic_inventory
+
+COLUMNS = ['id', 'make', 'model', 'price', 'stock_count']
+
+SEARCHES = [
+    ('by_budget', (0, 40000)),
+    ('by_type', (['SUV', 'luxury'],)),
+    ('by_features', (['sunroof', 'leather seats'],)),
+    ('by_query', ('red suv under $50000',)),
+    ('ranked', ('family', None, 0, None, None, 5)),
+    ('by_text', ('reliable family sedan', 5)),
+]
+
+
+def _unsharded(cache, search, args):
+    index = cache.get_index()
+    if search in inventory_search.SCORED_SEARCHES:
+        frame, total = getattr(inventory_search, search)(index, *args)
+        columns = COLUMNS + ['score']
+    else:
+        frame = getattr(inventory_search, search)(index, *args)
+        total, columns = len(frame), COLUMNS
+    return total, index.inventory.to_records(frame.iloc[:50], columns=columns)
+
+
+@pytest.fixture(params=["json", "snapshot"])
+def feed(tmp_path, request):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(generate_synthetic_inventory()), encoding="utf-8")
+    if request.param == "snapshot":
+        convert(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize("partition", ["id", "category"])
+def test_shards_match_unsharded_across_deltas(feed, partition):
+    cache = InventoryCache(feed, use_snapshot=False)
+    sharded = ShardedInventory(feed, shards=3, partition=partition, check_interval=3600)
+    cache.add_delta_listener(sharded.apply_delta)
+    new = dict(generate_synthetic_inventory()[0], id="V999", model="Corolla Cross", price=26000)
+    deltas = [
+        {},
+        {"upserts": [{"id": "V001", "price": 1000}, {"id": "V002", "availability": "sold_out"}]},
+        {"deletes": ["V003", "V004"]},
+        {"upserts": [new, {"id": "V005", "features": ["Sunroof"]}], "deletes": ["V006"]},
+    ]
+    try:
+        for delta in deltas:
+            if delta:
+                cache.apply_delta(**delta)
+            for search, args in SEARCHES:
+                expected_total, expected = _unsharded(cache, search, args)
+                scored = search in inventory_search.SCORED_SEARCHES
+                # Scored searches return the best k of every shard, so only the merged best k are compared
+                total, records = sharded.search(search, args, COLUMNS + ['score'] * scored,
+                                                window=args[-1] if scored else 50)
+                assert (total, records) == (expected_total, expected), (delta, search)
+    finally:
+        sharded.close()
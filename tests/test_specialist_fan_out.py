@@ -0,0 +1,42 @@
+import asyncio
+import json
+import pytest
+from agents.tool_context import ToolContext
+import tools
+
+
+class _Result:
+    def __init__(self, output):
+        self.final_output = output
+
+
+@pytest.fixture
+def asked(monkeypatch):
+    asked = []
+
+    async def run(agent, query):
+        asked.append(agent.name)
+        await asyncio.sleep(0.01)
+        return _Result(f"{agent.name} answer")
+
+    monkeypatch.setattr(tools.Runner, "run", run)
+    return asked
+
+
+def _query(user_query):
+    context = ToolContext(context=None, tool_call_id='1')
+    return asyncio.run(tools.optimized_multi_agent_query.on_invoke_tool(context, json.dumps({"user_query": user_query})))
+
+
+def test_every_selected_specialist_answers(asked):
+    result = _query("cheap family car with great safety")
+    assert result["complete"]
+    assert [answer["specialist"] for answer in result["answers"]] == ["budget", "family"]
+    assert len(asked) == 2
+
+
+def test_no_matching_specialist_is_not_complete(asked):
+    result = _query("a car please")
+    assert result["complete"] is False
+    assert result["reason"] == "no specialist matched"
+    assert result["answers"] == [] and asked == []
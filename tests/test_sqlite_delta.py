@@ -0,0 +1,75 @@
+import json
+import pytest
+import inventory_search
+from inventory_cache import InventoryCache
+from inventory_sqlite import SqliteInventory
+from vehicle_inventory import generate_synthetic_inventory
+
+COLUMNS = ['id', 'make', 'model', 'price', 'stock_count', 'availability', 'features', 'colors_available']
+
+SEARCHES = [
+    ('by_budget', (0, 40000)),
+    ('by_type', (['SUV', 'luxury'],)),
+    ('by_features', (['sunroof', 'jetpack'], 'any')),
+    ('by_fuel_type', (['Hybrid', 'Electric'],)),
+    ('by_query', ('red suv under $50000',)),
+    ('by_query', ('lotus in green',)),
+]
+
+
+@pytest.fixture
+def feed(tmp_path):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(generate_synthetic_inventory()), encoding="utf-8")
+    return str(path)
+
+
+def _expected(cache, search, args):
+    index = cache.get_index()
+    frame = getattr(inventory_search, search)(index, *args)
+    return len(frame), index.inventory.to_records(frame.iloc[:50], columns=COLUMNS)
+
+
+def test_deltas_reach_the_database(feed):
+    cache = InventoryCache(feed, use_snapshot=False)
+    database = SqliteInventory(feed, check_interval=3600)
+    cache.get_index()
+    cache.add_delta_listener(database.apply_delta)
+    new = dict(generate_synthetic_inventory()[0], id="V999", make="Lotus", model="Eletre", price=26000,
+               colors_available=["Green"], features=["Jetpack"], availability="in_stock")
+    deltas = [
+        {},
+        {"upserts": [{"id": "V001", "price": 1000}, {"id": "V002", "availability": "sold_out"}]},
+        {"deletes": ["V003", "V004"]},
+        {"upserts": [new, {"id": "V005", "features": ["Sunroof"]}], "deletes": ["V006"]},
+        {"upserts": [{"id": "V999", "stock_count": 0}], "deletes": ["V005", "unknown"]},
+    ]
+    for delta in deltas:
+        if delta:
+            version = database.get_version()
+            cache.apply_delta(**delta)
+            assert database.get_version() > version
+        for search, args in SEARCHES:
+            assert database.search(search, args, COLUMNS, limit=50) == _expected(cache, search, args), (delta, search)
+        index = cache.get_index()
+        for profile in ('budget', 'family'):
+            frame, total = inventory_search.ranked(index, profile, None, 0, None, None, 5)
+            expected = (total, index.inventory.to_records(frame, columns=['id', 'score']))
+            assert database.search('ranked', (profile, None, 0, None, None, 5), ['id', 'score'], limit=5) == expected
+        for query in ('jetpack', 'sunroof'):
+            frame, total = inventory_search.by_text(index, query, 50)
+            total_db, records = database.search('by_text', (query, 50), ['id', 'score'], limit=50)
+            assert (total_db, {r['id'] for r in records}) == (total, set(index.inventory.ids(frame))), (delta, query)
+
+
+def test_sqlite_backend_only_forwards_deltas_to_an_unloaded_cache(feed):
+    cache = InventoryCache(feed, use_snapshot=False)
+    database = SqliteInventory(feed, check_interval=3600)
+    cache.add_delta_listener(database.apply_delta)
+    summary = cache.apply_delta([{"id": "V001", "price": 1234}], deletes=["V002"])
+    assert summary["updated"] == 1 and summary["deleted"] == 1
+    assert cache._index is None
+    total, records = database.search('by_budget', (1234, 1234), ['id', 'price'], limit=5)
+    assert records == [{"id": "V001", "price": 1234}]
+    ids = [record["id"] for record in database.search('by_budget', (0, None), ['id'], limit=100)[1]]
+    assert "V002" not in ids and ids[:2] == ["V001", "V003"]